@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
 from pathlib import Path
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 DATA_DIR = Path("data/src/bybit_future_orderbook_rt_ss_1s")  # 数据目录，路径
 SYMBOL = "BTCUSDT"  # 交易对，字符串
@@ -14,6 +16,31 @@ def build_file_path(base_dir: Path, symbol: str, hour_str: str) -> Path:
     return base_dir / symbol / hour_str / file_name
 
 
+def columnar_part_index(path: Path, hour_str: str) -> int:
+    """返回列式快照分段序号，不带序号的首个分段为0。"""
+    part_text = path.stem.rsplit(f"-{hour_str}", 1)[-1]
+    return int(part_text[1:]) if part_text else 0
+
+
+def list_columnar_paths(base_dir: Path, symbol: str, hour_str: str) -> list[Path]:
+    """按分段序号列出单小时的列式快照分段，含同小时多个分段与待切换缓存补写的分段。"""
+    hour_dir = base_dir / symbol / hour_str
+    paths = list(hour_dir.glob("*.parquet")) + list(hour_dir.glob("*.arrow"))
+    return sorted(paths, key=lambda path: (columnar_part_index(path, hour_str), path.suffix))
+
+
+def read_columnar_hour(paths: list[Path]) -> pd.DataFrame:
+    """读取单小时列式快照分段为DataFrame。"""
+    tables = []
+    for path in paths:
+        if path.suffix == ".parquet":
+            tables.append(pq.read_table(path))
+        else:
+            with pa.memory_map(str(path), "r") as source:
+                tables.append(pa.ipc.open_file(source).read_all())
+    return pa.concat_tables(tables).to_pandas()
+
+
 def read_hour_range(symbol: str, start_hour: str, end_hour: str) -> pd.DataFrame:
     """
     读取指定小时范围的秒级订单簿快照
@@ -29,7 +56,11 @@ def read_hour_range(symbol: str, start_hour: str, end_hour: str) -> pd.DataFrame
     while current <= end:
         hour_str = current.strftime("%Y%m%d%H")
         file_path = build_file_path(DATA_DIR, symbol, hour_str)
-        if file_path.exists():
+        columnar_paths = list_columnar_paths(DATA_DIR, symbol, hour_str)
+        if columnar_paths:
+            dfs.append(read_columnar_hour(columnar_paths))
+            print(f"已读取: {hour_str}")
+        elif file_path.exists():
             dfs.append(pd.read_json(file_path, lines=True))
             print(f"已读取: {hour_str}")
         else:
@@ -44,10 +75,14 @@ def read_hour_range(symbol: str, start_hour: str, end_hour: str) -> pd.DataFrame
 
 def main() -> None:
     file_path = build_file_path(DATA_DIR, SYMBOL, HOUR)
-    if not file_path.exists():
+    columnar_paths = list_columnar_paths(DATA_DIR, SYMBOL, HOUR)
+    if columnar_paths:
+        df = read_columnar_hour(columnar_paths)
+    elif file_path.exists():
+        df = pd.read_json(file_path, lines=True)
+    else:
         print(f"文件不存在: {file_path}")
         return
-    df = pd.read_json(file_path, lines=True)
     df["datetime"] = pd.to_datetime(df["ts"], unit="ms", utc=True)
     print(f"记录数: {len(df)} (预期约3600条/小时)")
     print(f"时间范围: {df['datetime'].min()} ~ {df['datetime'].max()}")
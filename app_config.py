@@ -17,6 +17,9 @@ RETRY_TIMES = 5  # 最大重试次数，次
 RETRY_INTERVAL_SECONDS = 5  # 重试间隔，秒
 CHUNK_SIZE = 1024 * 1024  # 下载块大小，字节
 DOWNLOAD_CONCURRENCY = 4  # 下载并发数，个数
+SNAPSHOT_WORKERS = 1  # 历史订单簿快照（D10011/D10012）并行进程数，1为在主进程内顺序处理，个
+SNAPSHOT_MEMORY_LIMIT_BYTES = 8 * 1024 * 1024 * 1024  # 历史订单簿快照并行任务预估内存总上限，超出时暂缓派发新日期，字节
+SNAPSHOT_CHECKPOINT_SECONDS = 300  # 历史订单簿快照（Bybit/OKX）单日转换检查点间隔，中断后从最近检查点续跑，0为关闭，秒
 LOOP_INTERVAL_SECONDS = 4 * 60 * 60  # 循环间隔，秒
 DELIVERY_REFRESH_SECONDS = 15 * 60  # 交割合约刷新间隔，秒
 DATA_STORAGE_MODE = "local"  # 数据存储模式，可选local或s3，字符串
@@ -44,7 +47,57 @@ WS_PING_INTERVAL_SECONDS = 10  # WS心跳间隔，秒
 WS_WRITE_BUFFER_LINES = 256  # WS单文件写入缓冲行数阈值，行
 WS_WRITE_BUFFER_BYTES = 1024 * 1024  # WS单文件写入缓冲字节阈值，字节
 WS_WRITE_BUFFER_INTERVAL_SECONDS = 1  # WS单文件写入缓冲刷新间隔，秒
+WS_ENGINE = "thread"  # WS采集引擎，可选thread或asyncio，字符串
+WS_PROCESS_MODE = False  # WS按交易所多进程采集开关，开关
+WS_PROCESS_SHARDS = {
+    "bybit": 1,  # Bybit采集进程数，个
+    "binance": 1,  # Binance采集进程数，个
+    "bitget": 1,  # Bitget采集进程数，个
+    "okx": 1,  # OKX采集进程数，个
+}  # 多进程模式下每交易所按交易对分片的进程数映射，映射
+WS_SYMBOLS_PER_CONNECTION = {
+    "bybit": 1,  # Bybit单连接订阅交易对数，个
+    "binance": 1,  # Binance单连接订阅交易对数，按地址订阅仅支持1，个
+    "bitget": 1,  # Bitget单连接订阅交易对数，个
+    "okx": 1,  # OKX单连接订阅交易对数，个
+}  # WS单连接订阅交易对数映射，大于1时启用连接复用，映射
+WS_SUBSCRIBE_BATCH_SIZE = 10  # WS单条订阅请求最大参数数，个
 WS_STANDBY_BUFFER_MAX_LINES = 100000  # WS待切换缓存每文件最大行数，行
+WS_STANDBY_BUFFER_MAX_BYTES = 256 * 1024 * 1024  # WS待切换缓存每市场内存上限，超出后按目标文件溢写到本地追加文件，字节
+WS_STANDBY_KEY_INDEX_ENABLED = True  # WS分段文件去重键索引开关，开启时写入器为文本分段按刷盘批次追加每行去重键的8字节摘要，补写缓存时无需重新解析目标文件，开关
+WS_STANDBY_INDEX_DIR = "cache/ws_standby"  # WS去重键索引与待切换缓存溢写目录，相对路径按数据根目录的上级目录解析，路径
+WS_HANDOVER_SOCKET_PATH = "cache/ws_handover.sock"  # 新旧launcher落盘交接本地套接字路径，路径
+WS_HANDOVER_WARMUP_SECONDS = 30  # 新进程WS缓存预热时长，预热后再向旧进程请求交接以保证两侧消息有重叠，秒
+WS_HANDOVER_TIMEOUT_SECONDS = 60  # 落盘交接请求超时，超时后回退为等待旧进程退出，秒
+WS_WRITER_QUEUE_ENABLED = True  # WS独立写入线程开关，关闭时在接收线程内同步落盘，开关
+WS_WRITER_QUEUE_MAX_ITEMS = 20000  # WS写入队列最大积压消息数，满时阻塞接收线程形成背压，条
+WS_WRITER_BATCH_MAX_ITEMS = 1000  # WS写入线程单批最多处理消息数，条
+WS_WRITER_PUT_TIMEOUT_SECONDS = 60  # WS写入队列满时接收线程最长阻塞时长，超时后按写入阻塞断开会话并重连，秒
+WS_RT_RAW_PASSTHROUGH = False  # rt文件原始帧直写开关，开启时按{collect_ts,symbol,raw}信封原样写入交易所帧，读取用iter_rt_records还原归一化记录，开关
+WS_SEGMENT_COMPRESSION = {
+    "rt": "none",  # 原始消息分段压缩方式，可选none、gzip或zstd，字符串
+    "rt_ss": "none",  # 快照分段压缩方式，可选none、gzip或zstd，字符串
+    "rt_ss_1s": "none",  # 秒级快照分段压缩方式，可选none、gzip或zstd，字符串
+}  # WS分段文件按阶段压缩方式映射，压缩时每次刷出写入一个独立帧，映射
+WS_SEGMENT_GZIP_LEVEL = 6  # WS分段gzip压缩级别，级别
+WS_SEGMENT_ZSTD_LEVEL = 3  # WS分段zstd压缩级别，需安装zstandard，级别
+WS_SNAPSHOT_FORMAT = "json"  # rt_ss与rt_ss_1s输出格式，可选json、parquet或arrow，列式格式按批次写入并在切分时落为正式文件，字符串
+WS_COLUMNAR_BATCH_ROWS = 5000  # 列式快照单批写入行数，Parquet下即行组大小，条
+WS_RT_SS_ENCODING = "full"  # rt_ss JSON输出编码，可选full或delta，delta时写关键帧加逐条差分，字符串
+WS_RT_SS_KEYFRAME_INTERVAL = 600  # rt_ss差分编码关键帧间隔，每隔多少条差分写一次完整快照，条
+WS_RT_SS_COALESCE_MS = 0  # rt_ss快照合并窗口，大于0时每个窗口最多输出一条最新状态，跨秒前、重订阅前与会话结束时补出最终状态，无新消息时到期也会补出，rt保持逐条，毫秒
+WS_SEQUENCE_CHECK_ENABLED = False  # WS盘口序号连续性检查开关，仅覆盖Bybit、OKX与Bitget增量流（Binance部分深度流每条均为完整快照，无需检查），发现缺口时仅对该交易对同连接重订阅补快照，开关
+WS_CHECKSUM_CHECK_ENABLED = False  # OKX与Bitget盘口crc32校验和检查开关，开启时盘口额外保留每档原始价格与数量文本，这两家的盘口内存约翻倍，不一致时按缺口处理，开关
+WS_RESYNC_TIMEOUT_SECONDS = 10  # 单交易对重同步等待快照超时，超时后再次重订阅，秒
+WS_PRIMARY_BACKUP_MERGE = False  # WS主备合并落盘开关，开启时主备两路都参与输出并按序号分阶段去重，主备切换时落后超过重排窗口的一路独有序号会被判为迟到丢弃，开关
+WS_MERGE_WINDOW_SIZE = 4096  # WS主备合并去重滑动窗口大小，条
+WS_MERGE_REORDER_MS = 100  # WS主备合并重排窗口，序号先到的一路等待该时长后按序号升序输出，窗口内另一路补到的更小序号仍可排入，0为到达即输出，毫秒
+WS_SHM_PUBLISH_ENABLED = False  # 实时盘口共享内存发布开关，开启时每个交易对在槽位文件中以顺序锁维护最新前N档，开关
+WS_SHM_DIR = "/dev/shm/dlh_book"  # 实时盘口共享内存槽位目录，每个交易对一个固定大小的文件，路径
+WS_TICK_PRICES_ENABLED = False  # 实时盘口整数刻度开关，开启时OKX与Bybit按合约tickSz/lotSz小数位以整数为键并定点格式化输出，其余交易所或拉取失败时使用浮点盘口；默认关闭，开启前先在目标机器上用bench_orderbook_engine对比两种盘口，开关
+WS_PUBSUB_ENABLED = False  # 实时行情本地订阅分发开关，开启时每个采集进程在套接字目录下监听一个unix套接字，开关
+WS_PUBSUB_SOCKET_DIR = "cache/ws_pubsub"  # 实时行情本地分发套接字目录，路径
+WS_PUBSUB_CLIENT_QUEUE_MAX = 100000  # 单个订阅者待发送队列上限，满时丢弃最旧消息并向订阅者发送丢弃通知，条
 OLD_LAUNCHER_CHECK_INTERVAL_SECONDS = 0.5  # 旧版本启动器检测间隔，秒
 
 ORDERBOOK_DEPTH_FUTURE = 200  # 期货订单簿深度，档位
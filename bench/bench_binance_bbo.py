@@ -0,0 +1,94 @@
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT_DIR = Path(__file__).resolve().parents[1]  # 项目根目录，路径
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+import pyarrow.parquet as pq  # noqa: E402
+
+from bench.bench_snapshot_builder import assert_same_output  # noqa: E402
+from cex.cex_orderbook_snapshot_common import (  # noqa: E402
+    BATCH_SIZE,
+    build_schema,
+    write_binance_snapshots,
+    write_replayed_snapshots,
+)
+
+SEED = 20260116  # 合成数据随机种子，数值
+DEFAULT_ROWS = 1000000  # 合成BBO默认行数，行
+BASE_TS = 1768867200000  # 合成BBO起始时间，毫秒
+SYMBOL = "BTCUSDT"  # 合成BBO交易对，字符串
+INPUT_DATASET_ID = "D10005"  # 基准所用的Binance现货源数据集，字符串
+HEADER = "update_id,best_bid_price,best_bid_qty,best_ask_price,best_ask_qty,transaction_time,event_time"  # Binance bookTicker表头，字符串
+
+
+def parse_args(argv: list[str]) -> tuple[Path | None, int]:
+    """解析Binance bookTicker日归档路径与合成行数，未给路径时使用合成数据。"""
+    source = None
+    rows = DEFAULT_ROWS
+    for arg in argv:
+        if arg.startswith("-rows="):
+            rows = int(arg.split("=", 1)[1])
+        else:
+            source = Path(arg)
+    return source, rows
+
+
+def write_synthetic_archive(output_path: Path, rows: int) -> None:
+    """按Binance bookTicker日归档结构写出合成zip，内含单个csv。"""
+    rng = random.Random(SEED)
+    lines = [HEADER]
+    mid = 95000.0
+    for index in range(rows):
+        mid += rng.choice((-0.1, 0.0, 0.1))
+        ts_ms = BASE_TS + index * 50
+        lines.append(
+            f"{8000000000 + index},{mid - 0.05:.2f},{rng.uniform(0.001, 5):.3f},{mid + 0.05:.2f},{rng.uniform(0.001, 5):.3f},{ts_ms},{ts_ms + 1}"
+        )
+    with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr(output_path.with_suffix(".csv").name, "\n".join(lines) + "\n")
+
+
+def run_writer(name: str, source: Path, output_path: Path) -> tuple[float, int]:
+    """以指定实现写出单日快照Parquet，返回耗时与快照条数。"""
+    schema = build_schema()
+    started = time.perf_counter()
+    writer = pq.ParquetWriter(output_path, schema, compression="snappy")
+    if name == "replay":
+        total = write_replayed_snapshots(writer, schema, INPUT_DATASET_ID, "binance", source, SYMBOL, BATCH_SIZE)
+    else:
+        total = write_binance_snapshots(writer, schema, source, SYMBOL, BATCH_SIZE)
+    writer.close()
+    return time.perf_counter() - started, total
+
+
+def main() -> None:
+    """对比Binance bookTicker逐行回放与Arrow CSV列式转换的单日快照耗时，两者输出需逐行组一致。"""
+    source, rows = parse_args(sys.argv[1:])
+    with tempfile.TemporaryDirectory(prefix="bench_binance_bbo_") as tmp_dir:
+        work_dir = Path(tmp_dir)
+        if source is None:
+            source = work_dir / f"{SYMBOL}-bookTicker-2026-01-16.zip"
+            write_synthetic_archive(source, rows)
+            source_text = f"合成BBO {rows} 行"
+        else:
+            source_text = str(source)
+        replay_path = work_dir / "replay.parquet"
+        columnar_path = work_dir / "columnar.parquet"
+        replay_seconds, total = run_writer("replay", source, replay_path)
+        columnar_seconds, _total = run_writer("columnar", source, columnar_path)
+        assert_same_output(replay_path, columnar_path)
+        archive_mb = source.stat().st_size / 1024 / 1024
+    print(f"数据源: {source_text} | 归档 {archive_mb:.1f} MB | 快照数: {total} | 两种实现输出一致")
+    print(f"逐行回放: {replay_seconds:.3f} 秒 | {total / replay_seconds:.0f} 条/秒")
+    print(f"Arrow CSV列式: {columnar_seconds:.3f} 秒 | {total / columnar_seconds:.0f} 条/秒")
+    print(f"加速比: {replay_seconds / columnar_seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
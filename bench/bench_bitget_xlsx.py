@@ -0,0 +1,146 @@
+from pathlib import Path
+from io import BytesIO
+import multiprocessing
+import random
+import resource
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT_DIR = Path(__file__).resolve().parents[1]  # 项目根目录，路径
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from openpyxl import Workbook, load_workbook  # noqa: E402
+
+from bench.bench_snapshot_builder import assert_same_output  # noqa: E402
+from cex import cex_orderbook_snapshot_common as snapshot_common  # noqa: E402
+
+SEED = 20260116  # 合成数据随机种子，数值
+DEFAULT_ROWS = 200000  # 合成BBO默认行数，行
+BASE_TS = 1768867200000  # 合成BBO起始时间，毫秒
+SYMBOL = "BTCUSDT"  # 合成BBO交易对，字符串
+HEADER = ("ts", "bid_price", "bid_volume", "ask_price", "ask_volume")  # 合成BBO表头，个数
+INPUT_DATASET_ID = "D10005"  # 基准所用的Bitget现货源数据集，字符串
+OUTPUT_DATASET_ID = "D10012"  # 基准所用的Bitget现货快照数据集，字符串
+
+
+def parse_args(argv: list[str]) -> tuple[Path | None, int]:
+    """解析Bitget日归档路径（YYYYMMDD.zip）与合成行数，未给路径时使用合成数据。"""
+    source = None
+    rows = DEFAULT_ROWS
+    for arg in argv:
+        if arg.startswith("-rows="):
+            rows = int(arg.split("=", 1)[1])
+        else:
+            source = Path(arg)
+    return source, rows
+
+
+def write_synthetic_archive(output_path: Path, rows: int) -> None:
+    """按Bitget BBO日归档结构写出合成zip，内含单个xlsx。"""
+    rng = random.Random(SEED)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(HEADER)
+    mid = 95000.0
+    for index in range(rows):
+        mid += rng.choice((-0.1, 0.0, 0.1))
+        sheet.append(
+            (
+                BASE_TS + index * 100,
+                round(mid - 0.05, 2),
+                round(rng.uniform(0.001, 5), 4),
+                round(mid + 0.05, 2),
+                round(rng.uniform(0.001, 5), 4),
+            )
+        )
+    buffer = BytesIO()
+    workbook.save(buffer)
+    with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr(f"{SYMBOL}.xlsx", buffer.getvalue())
+
+
+def iter_legacy_messages(file_path: Path, symbol: str):
+    """按旧版openpyxl只读工作簿遍历Bitget原始BBO消息。"""
+    with zipfile.ZipFile(file_path, "r") as zip_file:
+        name = zip_file.namelist()[0]
+        workbook = load_workbook(BytesIO(zip_file.read(name)), read_only=True, data_only=True)
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(item) for item in next(rows)]
+        for values in rows:
+            row = {header[index]: values[index] for index in range(len(header))}
+            row["symbol"] = symbol
+            yield row
+
+
+READERS = {
+    "openpyxl": iter_legacy_messages,
+    "stream": snapshot_common.iter_bitget_messages,
+}  # 参与对比的读取实现，映射
+
+
+def archive_date(source: Path) -> str:
+    """从Bitget日归档文件名解析日期。"""
+    raw_date = source.name.removesuffix(".zip")
+    return f"{raw_date[0:4]}-{raw_date[4:6]}-{raw_date[6:8]}"
+
+
+def run_reader(reader_name: str, source: Path, work_dir: Path, result_queue) -> None:
+    """在子进程内先单独遍历一遍归档，再以该读取实现运行完整的单日快照转换。"""
+    reader = READERS[reader_name]
+    total = 0
+    started = time.perf_counter()
+    for _row in reader(source, SYMBOL):
+        total += 1
+    read_seconds = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    input_dir = work_dir / reader_name / "input"
+    output_dir = work_dir / reader_name / "output"
+    input_path = snapshot_common.build_input_path(INPUT_DATASET_ID, "bitget", input_dir, SYMBOL, archive_date(source))
+    input_path.parent.mkdir(parents=True, exist_ok=True)
+    input_path.symlink_to(source.resolve())
+    snapshot_common.iter_bitget_messages = reader
+    snapshot_common.configure_dataset_runtime(OUTPUT_DATASET_ID, True, None, None)
+    started = time.perf_counter()
+    snapshot_common.process_date(INPUT_DATASET_ID, OUTPUT_DATASET_ID, "bitget", input_dir, output_dir, SYMBOL, archive_date(source))
+    convert_seconds = time.perf_counter() - started
+    output_path = snapshot_common.build_output_path(INPUT_DATASET_ID, "bitget", output_dir, SYMBOL, archive_date(source))
+    result_queue.put((read_seconds, convert_seconds, total, peak_mb, output_path))
+
+
+def measure_reader(reader_name: str, source: Path, work_dir: Path) -> tuple[float, float, int, float, Path]:
+    """在独立的spawn进程中运行读取实现，避免峰值内存互相干扰。"""
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(target=run_reader, args=(reader_name, source, work_dir, result_queue))
+    process.start()
+    result = result_queue.get()
+    process.join()
+    return result
+
+
+def main() -> None:
+    """对比Bitget BBO xlsx旧版openpyxl读取与分块扫描读取的耗时与峰值内存，两者转换出的D10012快照需逐行组一致。"""
+    source, rows = parse_args(sys.argv[1:])
+    with tempfile.TemporaryDirectory(prefix="bench_bitget_xlsx_") as tmp_dir:
+        work_dir = Path(tmp_dir)
+        if source is None:
+            source = work_dir / "20260116.zip"
+            write_synthetic_archive(source, rows)
+            source_text = f"合成BBO {rows} 行"
+        else:
+            source_text = str(source)
+        results = {name: measure_reader(name, source, work_dir) for name in READERS}
+        assert_same_output(results["openpyxl"][4], results["stream"][4])
+        archive_mb = source.stat().st_size / 1024 / 1024
+    print(f"数据源: {source_text} | 归档 {archive_mb:.1f} MB | 两种读取转换出的快照一致")
+    for name, (read_seconds, convert_seconds, total, peak_mb, _output_path) in results.items():
+        print(f"{name}: 读取 {read_seconds:.3f} 秒 | {total} 行 | {total / read_seconds:.0f} 行/秒 | 读取峰值RSS {peak_mb:.0f} MB | 单日转换 {convert_seconds:.3f} 秒")
+    print(f"读取加速比: {results['openpyxl'][0] / results['stream'][0]:.2f}x | 单日转换加速比: {results['openpyxl'][1] / results['stream'][1]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+from pathlib import Path
+import sys
+import time
+
+ROOT_DIR = Path(__file__).resolve().parents[1]  # 项目根目录，路径
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+import launcher_wss  # noqa: E402
+
+SYMBOL = "BTCUSDT"  # 回放交易对，字符串
+DEPTH = 5  # 快照输出深度，档位
+COLLECT_TS = 1768867200500  # 回放使用的采集时间，毫秒
+BASE_TS = 1768867200000  # 回放起始交易所时间，毫秒
+REPEAT_COUNT = 20000  # 计时回放的增量条数，条
+SNAPSHOT_BIDS = [["100", "1"], ["99", "2"]]  # 初始快照买盘，档位
+SNAPSHOT_ASKS = [["101", "1"], ["102", "3"]]  # 初始快照卖盘，档位
+DELTA_BIDS = [["100", "0"], ["99.5", "4"]]  # 增量买盘，档位
+DELTA_ASKS = [["101", "2"]]  # 增量卖盘，档位
+EXPECTED_BIDS = [["99.5", "4"], ["99", "2"]]  # 应用增量后的买盘，档位
+EXPECTED_ASKS = [["101", "2"], ["102", "3"]]  # 应用增量后的卖盘，档位
+
+
+def build_bitget_message(action: str, bids: list, asks: list, seq: int) -> dict:
+    """构造Bitget books频道消息。"""
+    return {
+        "action": action,
+        "arg": {"instType": "USDT-FUTURES", "channel": "books", "instId": SYMBOL},
+        "data": [{"bids": bids, "asks": asks, "ts": str(BASE_TS + seq), "seq": seq}],
+    }
+
+
+def build_okx_message(action: str, bids: list, asks: list, seq: int) -> dict:
+    """构造OKX books频道消息，档位带OKX的附加字段。"""
+    return {
+        "action": action,
+        "arg": {"channel": "books", "instId": SYMBOL},
+        "data": [
+            {
+                "bids": [level + ["0", "1"] for level in bids],
+                "asks": [level + ["0", "1"] for level in asks],
+                "ts": str(BASE_TS + seq),
+                "seqId": seq,
+                "prevSeqId": seq - 1 if action == "update" else -1,
+            }
+        ],
+    }
+
+
+HANDLERS = {
+    "bitget": (launcher_wss.apply_bitget_message, build_bitget_message),
+    "okx": (launcher_wss.apply_okx_message, build_okx_message),
+}  # 参与校验的交易所消息处理与构造函数，映射
+
+
+def check_exchange(exchange: str) -> float:
+    """回放一条快照与一条增量并校验输出盘口，再计时回放增量，返回每秒处理条数。"""
+    apply_message, build_message = HANDLERS[exchange]
+    orderbook = launcher_wss.build_orderbook(DEPTH)
+    apply_message(orderbook, SYMBOL, build_message("snapshot", SNAPSHOT_BIDS, SNAPSHOT_ASKS, 1), COLLECT_TS, DEPTH)
+    raw_records, snapshots = apply_message(orderbook, SYMBOL, build_message("update", DELTA_BIDS, DELTA_ASKS, 2), COLLECT_TS, DEPTH)
+    if len(raw_records) != 1 or len(snapshots) != 1:
+        raise RuntimeError(f"{exchange} 增量应产出一条原始记录与一条快照: {len(raw_records)} / {len(snapshots)}")
+    snapshot = snapshots[0]
+    if snapshot["update_type"] != "delta" or snapshot["ts"] != BASE_TS + 2 or snapshot["update_id"] != 2:
+        raise RuntimeError(f"{exchange} 增量快照字段异常: {snapshot}")
+    if snapshot["bids"] != EXPECTED_BIDS or snapshot["asks"] != EXPECTED_ASKS:
+        raise RuntimeError(f"{exchange} 增量后盘口异常: {snapshot['bids']} / {snapshot['asks']}")
+    messages = [build_message("update", [[f"{99 - (index % 50) / 10:.1f}", str(index % 7)]], DELTA_ASKS, index + 3) for index in range(REPEAT_COUNT)]
+    started = time.perf_counter()
+    for message in messages:
+        apply_message(orderbook, SYMBOL, message, COLLECT_TS, DEPTH)
+    return REPEAT_COUNT / (time.perf_counter() - started)
+
+
+def main() -> None:
+    """经launcher_wss的Bitget/OKX消息处理回放快照与增量，校验增量快照正确并输出处理速度。"""
+    for exchange in HANDLERS:
+        rate = check_exchange(exchange)
+        print(f"{exchange}: 快照+增量回放校验通过 | 增量处理 {rate:.0f} 条/秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+from pathlib import Path
+import random
+import sys
+import time
+
+ROOT_DIR = Path(__file__).resolve().parents[1]  # 项目根目录，路径
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from cex.cex_orderbook_engine_common import SortedOrderBook, TickOrderBook  # noqa: E402
+from cex.cex_orderbook_engine_common import format_number  # noqa: E402
+
+KEEP_ORDERBOOK_LEVELS = 2000  # 内存保留盘口层数，档位
+DEPTH = 200  # 快照输出深度，档位
+INITIAL_LEVELS = 400  # 初始快照单侧档位，档位
+MESSAGE_COUNT = 10000  # 回放增量消息数，条
+LEVELS_PER_MESSAGE = 6  # 单条增量档位数，档位
+MID_PRICE = 65000.0  # 初始中间价，价格
+TICK_SIZE = 0.1  # 最小价格变动，价格
+PRICE_SCALE = 1  # 整数刻度盘口价格小数位，位
+SIZE_SCALE = 3  # 整数刻度盘口数量小数位，位
+SEED = 7  # 随机种子，整数
+
+
+def build_initial_levels(rng: random.Random) -> tuple[list, list]:
+    """构造初始快照档位。"""
+    bids = [[f"{MID_PRICE - TICK_SIZE * (index + 1):.1f}", f"{rng.uniform(0.001, 5):.3f}"] for index in range(INITIAL_LEVELS)]
+    asks = [[f"{MID_PRICE + TICK_SIZE * (index + 1):.1f}", f"{rng.uniform(0.001, 5):.3f}"] for index in range(INITIAL_LEVELS)]
+    return bids, asks
+
+
+def build_deltas(rng: random.Random) -> list[tuple[list, list]]:
+    """构造贴近盘口顶部分布的增量消息。"""
+    deltas = []
+    for _ in range(MESSAGE_COUNT):
+        bids = []
+        asks = []
+        for _ in range(LEVELS_PER_MESSAGE):
+            offset = int(abs(rng.gauss(0, 60))) + 1
+            size = "0" if rng.random() < 0.3 else f"{rng.uniform(0.001, 5):.3f}"
+            if rng.random() < 0.5:
+                bids.append([f"{MID_PRICE - TICK_SIZE * offset:.1f}", size])
+            else:
+                asks.append([f"{MID_PRICE + TICK_SIZE * offset:.1f}", size])
+        deltas.append((bids, asks))
+    return deltas
+
+
+def run_legacy(initial: tuple[list, list], deltas: list) -> tuple[float, list]:
+    """按旧版字典加排序实现回放。"""
+    orderbook = {
+        "bids": {float(price): float(size) for price, size in initial[0]},
+        "asks": {float(price): float(size) for price, size in initial[1]},
+    }
+    outputs = []
+    started = time.perf_counter()
+    for bids, asks in deltas:
+        for side_name, levels in (("bids", bids), ("asks", asks)):
+            side = orderbook[side_name]
+            for price_text, size_text in levels:
+                price = float(price_text)
+                size = float(size_text)
+                if size == 0:
+                    side.pop(price, None)
+                else:
+                    side[price] = size
+        if len(orderbook["bids"]) > KEEP_ORDERBOOK_LEVELS:
+            keep_prices = sorted(orderbook["bids"], reverse=True)[:KEEP_ORDERBOOK_LEVELS]
+            orderbook["bids"] = {price: orderbook["bids"][price] for price in keep_prices}
+        if len(orderbook["asks"]) > KEEP_ORDERBOOK_LEVELS:
+            keep_prices = sorted(orderbook["asks"])[:KEEP_ORDERBOOK_LEVELS]
+            orderbook["asks"] = {price: orderbook["asks"][price] for price in keep_prices}
+        bids_sorted = sorted(orderbook["bids"].items(), key=lambda item: item[0], reverse=True)[:DEPTH]
+        asks_sorted = sorted(orderbook["asks"].items(), key=lambda item: item[0])[:DEPTH]
+        outputs.append(
+            (
+                [[format_number(price), format_number(size)] for price, size in bids_sorted],
+                [[format_number(price), format_number(size)] for price, size in asks_sorted],
+            )
+        )
+    return time.perf_counter() - started, outputs
+
+
+def run_engine(initial: tuple[list, list], deltas: list, orderbook: SortedOrderBook | None = None) -> tuple[float, list]:
+    """按有序盘口引擎回放。"""
+    if orderbook is None:
+        orderbook = SortedOrderBook(DEPTH, KEEP_ORDERBOOK_LEVELS)
+    orderbook.replace(initial[0], initial[1])
+    outputs = []
+    started = time.perf_counter()
+    for bids, asks in deltas:
+        orderbook.apply_delta(bids, asks)
+        _bid_prices, bid_levels, _ask_prices, ask_levels = orderbook.top_levels(DEPTH)
+        outputs.append((bid_levels, ask_levels))
+    return time.perf_counter() - started, outputs
+
+
+def main() -> None:
+    """运行盘口引擎对比基准。"""
+    rng = random.Random(SEED)
+    initial = build_initial_levels(rng)
+    deltas = build_deltas(rng)
+    legacy_seconds, legacy_outputs = run_legacy(initial, deltas)
+    engine_seconds, engine_outputs = run_engine(initial, deltas)
+    tick_seconds, tick_outputs = run_engine(initial, deltas, TickOrderBook(DEPTH, KEEP_ORDERBOOK_LEVELS, PRICE_SCALE, SIZE_SCALE))
+    if legacy_outputs != engine_outputs:
+        raise RuntimeError("盘口引擎输出与旧实现不一致")
+    if tick_outputs != engine_outputs:
+        raise RuntimeError("整数刻度盘口输出与浮点盘口不一致")
+    print(f"消息数: {MESSAGE_COUNT} | 输出深度: {DEPTH} | 保留层数: {KEEP_ORDERBOOK_LEVELS}")
+    print(f"旧实现 dict+sorted: {legacy_seconds:.3f} 秒 | {MESSAGE_COUNT / legacy_seconds:.0f} 条/秒")
+    print(f"有序盘口引擎: {engine_seconds:.3f} 秒 | {MESSAGE_COUNT / engine_seconds:.0f} 条/秒")
+    print(f"整数刻度盘口: {tick_seconds:.3f} 秒 | {MESSAGE_COUNT / tick_seconds:.0f} 条/秒")
+    print(f"加速比: {legacy_seconds / engine_seconds:.2f}x | 整数刻度 {legacy_seconds / tick_seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+from pathlib import Path
+import json
+import random
+import sys
+import time
+
+ROOT_DIR = Path(__file__).resolve().parents[1]  # 项目根目录，路径
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from bench.bench_orderbook_engine import DEPTH, KEEP_ORDERBOOK_LEVELS, SEED, build_deltas, build_initial_levels  # noqa: E402
+from cex.cex_orderbook_delta_common import build_encoder_state, encode_snapshot_record, iter_decoded_snapshots, iter_rt_ss_snapshots  # noqa: E402
+from cex.cex_orderbook_engine_common import SortedOrderBook  # noqa: E402
+
+KEYFRAME_INTERVAL = 600  # 关键帧间隔，条
+BASE_COLLECT_TS = 1768921200000  # 合成快照起始采集时间，毫秒
+MESSAGE_INTERVAL_MS = 100  # 合成快照间隔，毫秒
+
+
+def build_synthetic_snapshots() -> list[dict]:
+    """按合成增量流回放盘口引擎生成快照。"""
+    rng = random.Random(SEED)
+    initial = build_initial_levels(rng)
+    deltas = build_deltas(rng)
+    orderbook = SortedOrderBook(DEPTH, KEEP_ORDERBOOK_LEVELS)
+    orderbook.replace(initial[0], initial[1])
+    snapshots = []
+    for index, (bids, asks) in enumerate(deltas):
+        orderbook.apply_delta(bids, asks)
+        bid_prices, bid_levels, ask_prices, ask_levels = orderbook.top_levels(DEPTH)
+        collect_ts = BASE_COLLECT_TS + index * MESSAGE_INTERVAL_MS
+        snapshots.append(
+            {
+                "symbol": "BTCUSDT",
+                "update_type": "delta",
+                "ts": collect_ts,
+                "cts": collect_ts,
+                "collect_ts": collect_ts,
+                "update_id": index + 1,
+                "seq": index + 1,
+                "best_bid": bid_prices[0] if bid_prices else None,
+                "best_ask": ask_prices[0] if ask_prices else None,
+                "bid_depth": len(bid_levels),
+                "ask_depth": len(ask_levels),
+                "bids": bid_levels,
+                "asks": ask_levels,
+            }
+        )
+    return snapshots
+
+
+def load_recorded_snapshots(file_path: Path) -> list[dict]:
+    """读取录制的rt_ss小时文件。"""
+    return list(iter_rt_ss_snapshots(file_path))
+
+
+def encode_line(payload: dict) -> str:
+    """按落盘格式编码单行JSON。"""
+    return json.dumps(payload, ensure_ascii=True, separators=(",", ":")) + "\n"
+
+
+def run_full(snapshots: list[dict]) -> tuple[float, list[str]]:
+    """按整行快照编码。"""
+    started = time.perf_counter()
+    lines = [encode_line(snapshot) for snapshot in snapshots]
+    return time.perf_counter() - started, lines
+
+
+def run_delta(snapshots: list[dict]) -> tuple[float, list[str]]:
+    """按关键帧加差分编码。"""
+    state = build_encoder_state()
+    started = time.perf_counter()
+    lines = [encode_line(encode_snapshot_record(state, snapshot, KEYFRAME_INTERVAL)) for snapshot in snapshots]
+    return time.perf_counter() - started, lines
+
+
+def main() -> None:
+    """运行rt_ss整行与差分编码的体积和耗时对比。"""
+    if len(sys.argv) > 1:
+        source = Path(sys.argv[1])
+        snapshots = load_recorded_snapshots(source)
+        source_text = str(source)
+    else:
+        snapshots = build_synthetic_snapshots()
+        source_text = "合成增量流"
+    full_seconds, full_lines = run_full(snapshots)
+    delta_seconds, delta_lines = run_delta(snapshots)
+    started = time.perf_counter()
+    decoded = list(iter_decoded_snapshots(json.loads(line) for line in delta_lines))
+    decode_seconds = time.perf_counter() - started
+    if decoded != [json.loads(line) for line in full_lines]:
+        raise RuntimeError("差分编码还原结果与整行快照不一致")
+    full_bytes = sum(len(line) for line in full_lines)
+    delta_bytes = sum(len(line) for line in delta_lines)
+    print(f"数据源: {source_text} | 快照数: {len(snapshots)} | 关键帧间隔: {KEYFRAME_INTERVAL}")
+    print(f"整行快照: {full_bytes / 1024 / 1024:.2f} MB | 编码 {full_seconds:.3f} 秒")
+    print(f"关键帧+差分: {delta_bytes / 1024 / 1024:.2f} MB | 编码 {delta_seconds:.3f} 秒 | 还原 {decode_seconds:.3f} 秒")
+    print(f"体积比: {full_bytes / delta_bytes:.2f}x | 编码加速比: {full_seconds / delta_seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
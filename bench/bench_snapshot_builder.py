@@ -0,0 +1,154 @@
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+
+ROOT_DIR = Path(__file__).resolve().parents[1]  # 项目根目录，路径
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+import pyarrow as pa  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+from sortedcontainers import SortedDict  # noqa: E402
+
+from bench.bench_orderbook_engine import SEED, build_deltas, build_initial_levels  # noqa: E402
+from cex.cex_orderbook_snapshot_common import (  # noqa: E402
+    BATCH_SIZE,
+    BYBIT_DEPTH,
+    SnapshotBatchBuilder,
+    build_schema,
+    iter_zip_messages,
+    normalize_message,
+    normalize_ts_ms,
+    parse_int_or_none,
+    update_orderbook,
+)
+
+BASE_TS = 1768867200000  # 合成消息起始时间，毫秒
+MESSAGE_INTERVAL_MS = 10  # 合成消息间隔，毫秒
+
+
+def build_synthetic_messages() -> list[dict]:
+    """按合成增量流构造Bybit ob200格式消息。"""
+    rng = random.Random(SEED)
+    bids, asks = build_initial_levels(rng)
+    messages = [{"type": "snapshot", "ts": BASE_TS, "cts": BASE_TS, "data": {"s": "BTCUSDT", "b": bids, "a": asks, "u": 1, "seq": 1}}]
+    for index, (bid_levels, ask_levels) in enumerate(build_deltas(rng)):
+        ts_ms = BASE_TS + (index + 1) * MESSAGE_INTERVAL_MS
+        messages.append({"type": "delta", "ts": ts_ms, "cts": ts_ms, "data": {"s": "BTCUSDT", "b": bid_levels, "a": ask_levels, "u": index + 2, "seq": index + 2}})
+    return messages
+
+
+def build_legacy_snapshot(orderbook: dict, msg: dict, msg_type: str, data: dict) -> dict:
+    """按旧版逐档字典构造快照。"""
+    bid_items = list(reversed(orderbook["bids"].items()))[:BYBIT_DEPTH]
+    ask_items = list(orderbook["asks"].items())[:BYBIT_DEPTH]
+    ts_value = normalize_ts_ms(msg.get("ts"))
+    cts_value = normalize_ts_ms(msg.get("cts"))
+    return {
+        "symbol": data.get("s", msg.get("symbol")),
+        "update_type": msg_type,
+        "ts": ts_value,
+        "cts": cts_value if cts_value is not None else ts_value,
+        "update_id": parse_int_or_none(data.get("u")),
+        "seq": parse_int_or_none(data.get("seq")),
+        "best_bid": bid_items[0][0] if bid_items else None,
+        "best_ask": ask_items[0][0] if ask_items else None,
+        "bid_depth": len(bid_items),
+        "ask_depth": len(ask_items),
+        "bids": [{"price": price, "qty": qty} for price, qty in bid_items],
+        "asks": [{"price": price, "qty": qty} for price, qty in ask_items],
+    }
+
+
+def iter_book_updates(messages):
+    """按历史快照任务的规则回放消息，逐条输出更新后的盘口。"""
+    orderbook = {"bids": SortedDict(), "asks": SortedDict()}
+    has_snapshot = False
+    for msg in messages:
+        msg_type, data = normalize_message("bybit", msg)
+        if msg_type == "snapshot":
+            has_snapshot = update_orderbook(orderbook, msg_type, data)
+        elif msg_type == "delta" and has_snapshot:
+            update_orderbook(orderbook, msg_type, data)
+        else:
+            continue
+        yield orderbook, msg, msg_type, data
+
+
+def run_legacy(messages, output_path: Path) -> tuple[float, int]:
+    """按旧版字典列表加from_pylist写出Parquet。"""
+    schema = build_schema()
+    started = time.perf_counter()
+    writer = pq.ParquetWriter(output_path, schema, compression="snappy")
+    batch = []
+    total = 0
+    for orderbook, msg, msg_type, data in iter_book_updates(messages):
+        batch.append(build_legacy_snapshot(orderbook, msg, msg_type, data))
+        total += 1
+        if len(batch) >= BATCH_SIZE:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            batch.clear()
+    if batch:
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    writer.close()
+    return time.perf_counter() - started, total
+
+
+def run_builder(messages, output_path: Path) -> tuple[float, int]:
+    """按列式批次构建器写出Parquet。"""
+    schema = build_schema()
+    started = time.perf_counter()
+    writer = pq.ParquetWriter(output_path, schema, compression="snappy")
+    builder = SnapshotBatchBuilder(schema, BYBIT_DEPTH, BATCH_SIZE)
+    total = 0
+    for orderbook, msg, msg_type, data in iter_book_updates(messages):
+        builder.append(orderbook, msg, msg_type, data)
+        total += 1
+        if builder.rows >= BATCH_SIZE:
+            writer.write_table(builder.take_table())
+    if builder.rows:
+        writer.write_table(builder.take_table())
+    writer.close()
+    return time.perf_counter() - started, total
+
+
+def assert_same_output(legacy_path: Path, builder_path: Path) -> None:
+    """逐行组比较两份Parquet的表结构与内容。"""
+    legacy_file = pq.ParquetFile(legacy_path)
+    builder_file = pq.ParquetFile(builder_path)
+    if legacy_file.schema_arrow.serialize() != builder_file.schema_arrow.serialize():
+        raise RuntimeError("列式构建器输出表结构与旧实现不一致")
+    if legacy_file.metadata.num_row_groups != builder_file.metadata.num_row_groups:
+        raise RuntimeError("列式构建器输出行组数与旧实现不一致")
+    for index in range(legacy_file.metadata.num_row_groups):
+        if not legacy_file.read_row_group(index).equals(builder_file.read_row_group(index)):
+            raise RuntimeError(f"列式构建器第 {index} 个行组与旧实现不一致")
+
+
+def main() -> None:
+    """对比历史快照旧版字典构建与列式批次构建的耗时，输出需逐行一致。"""
+    if len(sys.argv) > 1:
+        source = Path(sys.argv[1])
+        load_messages = lambda: iter_zip_messages(source)  # noqa: E731
+        source_text = str(source)
+    else:
+        messages = build_synthetic_messages()
+        load_messages = lambda: messages  # noqa: E731
+        source_text = "合成增量流"
+    with tempfile.TemporaryDirectory(prefix="bench_snapshot_builder_") as tmp_dir:
+        legacy_path = Path(tmp_dir) / "legacy.parquet"
+        builder_path = Path(tmp_dir) / "builder.parquet"
+        legacy_seconds, total = run_legacy(load_messages(), legacy_path)
+        builder_seconds, _total = run_builder(load_messages(), builder_path)
+        assert_same_output(legacy_path, builder_path)
+        output_bytes = builder_path.stat().st_size
+    print(f"数据源: {source_text} | 快照数: {total} | 输出深度: {BYBIT_DEPTH} | Parquet {output_bytes / 1024 / 1024:.1f} MB")
+    print(f"旧实现 字典+from_pylist: {legacy_seconds:.3f} 秒 | {total / legacy_seconds:.0f} 条/秒")
+    print(f"列式批次构建器: {builder_seconds:.3f} 秒 | {total / builder_seconds:.0f} 条/秒")
+    print(f"加速比: {legacy_seconds / builder_seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
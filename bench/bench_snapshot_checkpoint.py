@@ -0,0 +1,136 @@
+from pathlib import Path
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT_DIR = Path(__file__).resolve().parents[1]  # 项目根目录，路径
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+import orjson  # noqa: E402
+
+from bench.bench_snapshot_builder import assert_same_output, build_synthetic_messages  # noqa: E402
+from cex import cex_orderbook_snapshot_common as snapshot_common  # noqa: E402
+
+INPUT_DATASET_ID = "D10001"  # 基准所用的Bybit期货源数据集，字符串
+OUTPUT_DATASET_ID = "D10011"  # 基准所用的Bybit期货快照数据集，字符串
+SYMBOL = "BTCUSDT"  # 合成归档交易对，字符串
+DATE_STR = "2026-01-16"  # 合成归档日期，字符串
+DEFAULT_BATCH_SIZE = 500  # 基准使用的Parquet批次大小，条
+KILL_AFTER_SEGMENTS = 4  # 默认中断前至少已封口的分段数，个
+POLL_SECONDS = 0.005  # 轮询检查点文件的间隔，秒
+EVERY_BATCH_SECONDS = 1e-9  # 每个批次都落检查点时使用的间隔，秒
+
+
+def parse_args(argv: list[str]) -> tuple[Path | None, int, int]:
+    """解析Bybit ob200日归档路径、批次大小与中断前封口分段数，未给路径时使用合成数据。"""
+    source = None
+    batch_size = DEFAULT_BATCH_SIZE
+    kill_after = KILL_AFTER_SEGMENTS
+    for arg in argv:
+        if arg.startswith("-batch="):
+            batch_size = int(arg.split("=", 1)[1])
+        elif arg.startswith("-kill="):
+            kill_after = int(arg.split("=", 1)[1])
+        else:
+            source = Path(arg)
+    return source, batch_size, kill_after
+
+
+def write_synthetic_archive(output_path: Path) -> None:
+    """将合成消息拆成两个成员写入Zip，覆盖跨成员续读。"""
+    lines = [orjson.dumps(msg) for msg in build_synthetic_messages()]
+    middle = len(lines) // 2
+    with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("part-1.data", b"\n".join(lines[:middle]) + b"\n")
+        zip_file.writestr("part-2.data", b"\n".join(lines[middle:]) + b"\n")
+
+
+def run_conversion(input_dir: Path, output_dir: Path, batch_size: int, checkpoint_seconds: float) -> None:
+    """在子进程内以指定批次大小与检查点间隔运行单日快照转换。"""
+    snapshot_common.BATCH_SIZE = batch_size
+    snapshot_common.CHECKPOINT_SECONDS = checkpoint_seconds
+    snapshot_common.configure_dataset_runtime(OUTPUT_DATASET_ID, True, None, None)
+    snapshot_common.process_date(INPUT_DATASET_ID, OUTPUT_DATASET_ID, "bybit", input_dir, output_dir, SYMBOL, DATE_STR)
+
+
+def start_conversion(input_dir: Path, output_dir: Path, batch_size: int, checkpoint_seconds: float):
+    """在spawn子进程中启动单日快照转换。"""
+    process = multiprocessing.get_context("spawn").Process(target=run_conversion, args=(input_dir, output_dir, batch_size, checkpoint_seconds))
+    process.start()
+    return process
+
+
+def timed_conversion(input_dir: Path, output_dir: Path, batch_size: int, checkpoint_seconds: float) -> float:
+    """运行一次完整转换并返回耗时。"""
+    started = time.perf_counter()
+    process = start_conversion(input_dir, output_dir, batch_size, checkpoint_seconds)
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"快照转换子进程异常退出: {process.exitcode}")
+    return time.perf_counter() - started
+
+
+def read_checkpoint_segments(checkpoint_path: Path) -> int:
+    """读取检查点中已封口的分段数，文件不存在时为0。"""
+    try:
+        return orjson.loads(checkpoint_path.read_bytes())["segments"]
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return 0
+
+
+def interrupt_conversion(input_dir: Path, output_dir: Path, batch_size: int, kill_after: int) -> int:
+    """以每批落检查点运行转换，封口足够分段后强制杀掉子进程，返回中断时的分段数。"""
+    output_path = snapshot_common.build_output_path(INPUT_DATASET_ID, "bybit", output_dir, SYMBOL, DATE_STR)
+    checkpoint_path = snapshot_common.build_checkpoint_path(output_path)
+    process = start_conversion(input_dir, output_dir, batch_size, EVERY_BATCH_SECONDS)
+    while process.is_alive() and read_checkpoint_segments(checkpoint_path) < kill_after:
+        time.sleep(POLL_SECONDS)
+    if not process.is_alive():
+        raise RuntimeError("转换在中断前已完成，请减小 -batch 或 -kill")
+    os.kill(process.pid, signal.SIGKILL)
+    process.join()
+    if output_path.exists() or not checkpoint_path.exists():
+        raise RuntimeError("中断后应只留下检查点与分段文件")
+    return read_checkpoint_segments(checkpoint_path)
+
+
+def main() -> None:
+    """对比有无检查点的一次跑完耗时，并在转换中途强制杀进程后从检查点续跑，两种输出都需与无检查点的输出逐行组一致。"""
+    source, batch_size, kill_after = parse_args(sys.argv[1:])
+    with tempfile.TemporaryDirectory(prefix="bench_snapshot_checkpoint_") as tmp_dir:
+        work_dir = Path(tmp_dir)
+        input_dir = work_dir / "input"
+        input_path = snapshot_common.build_input_path(INPUT_DATASET_ID, "bybit", input_dir, SYMBOL, DATE_STR)
+        input_path.parent.mkdir(parents=True, exist_ok=True)
+        if source is None:
+            write_synthetic_archive(input_path)
+            source_text = "合成增量流（两个成员）"
+        else:
+            input_path.symlink_to(source.resolve())
+            source_text = str(source)
+        reference_dir = work_dir / "reference"
+        resumed_dir = work_dir / "resumed"
+        checkpointed_dir = work_dir / "checkpointed"
+        full_seconds = timed_conversion(input_dir, reference_dir, batch_size, 0)
+        checkpointed_seconds = timed_conversion(input_dir, checkpointed_dir, batch_size, EVERY_BATCH_SECONDS)
+        killed_segments = interrupt_conversion(input_dir, resumed_dir, batch_size, kill_after)
+        resume_seconds = timed_conversion(input_dir, resumed_dir, batch_size, snapshot_common.CHECKPOINT_SECONDS)
+        reference_path = snapshot_common.build_output_path(INPUT_DATASET_ID, "bybit", reference_dir, SYMBOL, DATE_STR)
+        resumed_path = snapshot_common.build_output_path(INPUT_DATASET_ID, "bybit", resumed_dir, SYMBOL, DATE_STR)
+        checkpointed_path = snapshot_common.build_output_path(INPUT_DATASET_ID, "bybit", checkpointed_dir, SYMBOL, DATE_STR)
+        assert_same_output(reference_path, checkpointed_path)
+        assert_same_output(reference_path, resumed_path)
+        leftovers = sorted(path.name for path in resumed_path.parent.iterdir() if path != resumed_path)
+        if leftovers:
+            raise RuntimeError(f"续跑完成后残留文件: {leftovers}")
+    print(f"数据源: {source_text} | 批次 {batch_size} 条 | 中断时已封口分段 {killed_segments} 个 | 续跑输出与一次跑完一致")
+    print(f"一次跑完: {full_seconds:.3f} 秒 | 每批落检查点一次跑完: {checkpointed_seconds:.3f} 秒 | 从检查点续跑: {resume_seconds:.3f} 秒（含子进程启动）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+from pathlib import Path
+import asyncio
+import multiprocessing
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = Path(__file__).resolve().parents[1]  # 项目根目录，路径
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+import orjson  # noqa: E402
+
+import app_config  # noqa: E402
+from cex.cex_orderbook_engine_common import decimal_places  # noqa: E402
+from cex.cex_orderbook_segment_common import iter_segment_lines  # noqa: E402
+
+RT_FILE_PATTERN = re.compile(r"^(?P<symbol>.+)-(?P<exchange>[a-z]+)_(?P<market>future|spot)_orderbook_rt-\d{10}")  # rt小时文件名解析规则，正则
+SERVER_HOST = "127.0.0.1"  # 本地替身WS服务监听地址，字符串
+CONN_ID = "bench"  # 替身服务回报的连接标识，字符串
+SUBSCRIBE_SETTLE_SECONDS = 0.5  # 收到首个订阅后等待后续批次订阅的时间，秒
+QUIET_SECONDS = 1.0  # 替身服务发送完毕后判定采集端已消费完的静默时间，秒
+READY_TIMEOUT_SECONDS = 600  # 等待替身服务加载回放文件的超时，秒
+DEFAULT_ENGINES = ("thread", "asyncio")  # 默认对比的WS采集引擎，个数
+ROLE_COUNT = 2  # 每个连接分组的主备连接数，个
+
+
+def parse_args(argv: list[str]) -> tuple[list[Path], float | None, list[str], int]:
+    """解析回放文件、倍速、引擎列表与单文件最大帧数，倍速为空表示不限速。"""
+    paths = []
+    speed = None
+    engines = list(DEFAULT_ENGINES)
+    limit = 0
+    for arg in argv:
+        if arg.startswith("-speed="):
+            value = arg.split("=", 1)[1]
+            speed = None if value == "max" else float(value)
+        elif arg.startswith("-engine="):
+            engines = [item for item in arg.split("=", 1)[1].split(",") if item]
+        elif arg.startswith("-limit="):
+            limit = int(arg.split("=", 1)[1])
+        else:
+            paths.append(Path(arg))
+    return paths, speed, engines, limit
+
+
+def list_rt_files(paths: list[Path]) -> list[Path]:
+    """展开目录并筛出rt小时文件。"""
+    files = []
+    for path in paths:
+        candidates = sorted(item for item in path.rglob("*") if item.is_file()) if path.is_dir() else [path]
+        files.extend(item for item in candidates if RT_FILE_PATTERN.match(item.name))
+    return files
+
+
+def build_exchange_frame(exchange: str, market: str, record: dict) -> dict:
+    """将归一化rt记录还原为交易所原始推送格式。"""
+    data = record["data"]
+    symbol = record["symbol"]
+    action = "snapshot" if record["type"] == "snapshot" else "update"
+    if exchange == "bybit":
+        return {key: value for key, value in record.items() if key not in {"symbol", "collect_ts"}}
+    if exchange == "binance":
+        return {"e": "depthUpdate", "E": record["ts"], "T": record["cts"], "s": symbol, "u": data["u"], "b": data["b"], "a": data["a"]}
+    if exchange == "bitget":
+        inst_type = "USDT-FUTURES" if market == "future" else "SPOT"
+        item = {"bids": data["b"], "asks": data["a"], "ts": str(record["ts"]), "seq": data["u"]}
+        return {"action": action, "arg": {"instType": inst_type, "channel": "books", "instId": symbol}, "data": [item]}
+    item = {"asks": data["a"], "bids": data["b"], "ts": str(record["ts"]), "seqId": data["u"], "prevSeqId": data["seq"]}
+    return {"arg": {"channel": "books", "instId": symbol}, "action": action, "data": [item]}
+
+
+def frame_levels(exchange: str, frame: dict) -> list:
+    """返回推送中的全部买卖档位。"""
+    if exchange == "bybit":
+        data = frame.get("data", {})
+        return data.get("b", []) + data.get("a", [])
+    if exchange == "binance":
+        return frame.get("b", []) + frame.get("a", [])
+    return [level for item in frame.get("data", []) for level in item.get("bids", []) + item.get("asks", [])]
+
+
+def load_rt_frames(file_path: Path, limit: int) -> tuple[str, str, list[tuple[int, str, bytes, dict]]]:
+    """读取单个rt小时文件，返回交易所、市场与按采集时间排列的原始推送帧。"""
+    matched = RT_FILE_PATTERN.match(file_path.name)
+    exchange = matched.group("exchange")
+    market = matched.group("market")
+    frames = []
+    for line in iter_segment_lines(file_path):
+        if not line.strip():
+            continue
+        record = orjson.loads(line)
+        if "raw" in record:
+            frame = record["raw"]
+        elif "data" in record and "type" in record:
+            frame = build_exchange_frame(exchange, market, record)
+        else:
+            continue
+        frames.append((int(record["collect_ts"]), record["symbol"], orjson.dumps(frame), frame))
+        if limit and len(frames) >= limit:
+            break
+    return exchange, market, frames
+
+
+def load_replay_feeds(files: list[Path], limit: int) -> tuple[dict, dict]:
+    """按交易所与市场合并回放帧，并从各交易对首帧推断价格与数量小数位。"""
+    feeds = {}
+    scales = {}
+    for file_path in files:
+        exchange, market, frames = load_rt_frames(file_path, limit)
+        feeds.setdefault((exchange, market), []).extend(frames)
+        symbol_scales = scales.setdefault((exchange, market), {})
+        for _ts, symbol, _text, frame in frames:
+            levels = frame_levels(exchange, frame)
+            if symbol in symbol_scales or not levels:
+                continue
+            symbol_scales[symbol] = (max(decimal_places(level[0]) for level in levels), max(decimal_places(level[1]) for level in levels))
+    for key, frames in feeds.items():
+        frames.sort(key=lambda item: item[0])
+        feeds[key] = [(ts, symbol, text) for ts, symbol, text, _frame in frames]
+    return feeds, scales
+
+
+def plan_replay_groups(feeds: dict) -> list[tuple[str, str, tuple[str, ...]]]:
+    """按采集端的连接分组规则划分回放交易对。"""
+    from cex import cex_orderbook_ws_common as ws_common
+
+    groups = []
+    for exchange, market in sorted(feeds):
+        symbols = sorted({symbol for _ts, symbol, _text in feeds[(exchange, market)]})
+        for group in ws_common.plan_symbol_groups([], symbols, ws_common.symbols_per_connection(exchange)):
+            groups.append((exchange, market, group))
+    return groups
+
+
+def dumps_text(payload: dict) -> str:
+    """编码替身服务回报消息。"""
+    return orjson.dumps(payload).decode("utf-8")
+
+
+def build_server_replies(exchange: str, text: str, subscribed: set) -> list[str]:
+    """按交易所握手规则处理订阅、退订与心跳，返回需回报的消息。"""
+    if text == "ping":
+        return ["pong"]
+    message = orjson.loads(text)
+    op = message.get("op")
+    if exchange == "bybit" and op == "ping":
+        return [dumps_text({"success": True, "ret_msg": "pong", "conn_id": CONN_ID, "op": "ping"})]
+    if op not in {"subscribe", "unsubscribe"}:
+        return []
+    args = message.get("args", [])
+    symbols = [arg.rsplit(".", 1)[-1] if exchange == "bybit" else arg["instId"] for arg in args]
+    if op == "subscribe":
+        subscribed.update(symbols)
+    else:
+        subscribed.difference_update(symbols)
+    if exchange == "bybit":
+        return [dumps_text({"success": True, "ret_msg": "", "conn_id": CONN_ID, "op": op})]
+    return [dumps_text({"event": op, "arg": arg, "connId": CONN_ID}) for arg in args]
+
+
+async def send_replay_frames(ws, frames: list, subscribed: set, started: asyncio.Event, speed: float | None, tracker: dict) -> None:
+    """按录制时间间隔与倍速向单个连接推送已订阅交易对的帧。"""
+    await started.wait()
+    await asyncio.sleep(SUBSCRIBE_SETTLE_SECONDS)
+    loop = asyncio.get_running_loop()
+    started_ts = loop.time()
+    base_ts = frames[0][0] if frames else 0
+    for ts, symbol, text in frames:
+        if symbol not in subscribed:
+            continue
+        if speed is not None:
+            delay = (ts - base_ts) / 1000 / speed - (loop.time() - started_ts)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await ws.send(text, text=True)
+    tracker["finished"] += 1
+    if tracker["finished"] >= tracker["expected"]:
+        tracker["done_event"].set()
+
+
+async def serve_replay_connection(ws, feeds: dict, speed: float | None, tracker: dict) -> None:
+    """处理单个采集连接：Binance按地址中的流名直接推送，其余交易所等待订阅请求。"""
+    parts = ws.request.path.strip("/").split("/")
+    exchange, market = parts[0], parts[1]
+    frames = feeds.get((exchange, market), [])
+    subscribed = set()
+    started = asyncio.Event()
+    if exchange == "binance":
+        stream_symbol = parts[-1].split("@", 1)[0]
+        subscribed.update({symbol for _ts, symbol, _text in frames if symbol.lower() == stream_symbol})
+        started.set()
+    sender = asyncio.create_task(send_replay_frames(ws, frames, subscribed, started, speed, tracker))
+    try:
+        async for text in ws:
+            for reply in build_server_replies(exchange, text, subscribed):
+                await ws.send(reply)
+            if subscribed:
+                started.set()
+    finally:
+        sender.cancel()
+
+
+async def serve_replay(feeds: dict, speed: float | None, tracker: dict, ready_queue, scales: dict, groups: list) -> None:
+    """启动本地替身WS服务并回报监听端口。"""
+    from websockets.asyncio.server import serve
+
+    async def handler(ws) -> None:
+        await serve_replay_connection(ws, feeds, speed, tracker)
+
+    async with serve(handler, SERVER_HOST, 0, compression=None, ping_interval=None, max_size=None) as server:
+        port = server.sockets[0].getsockname()[1]
+        frame_count = sum(len(frames) for frames in feeds.values())
+        ready_queue.put({"port": port, "scales": scales, "groups": groups, "frame_count": frame_count})
+        await server.serve_forever()
+
+
+def run_replay_server(files: list[Path], limit: int, speed: float | None, ready_queue, done_event) -> None:
+    """替身服务子进程入口，与采集端分进程运行以免占用被测进程的CPU。"""
+    feeds, scales = load_replay_feeds(files, limit)
+    groups = plan_replay_groups(feeds)
+    tracker = {"finished": 0, "expected": len(groups) * ROLE_COUNT, "done_event": done_event}
+    asyncio.run(serve_replay(feeds, speed, tracker, ready_queue, scales, groups))
+
+
+def start_thread_engine(groups: list) -> None:
+    """以线程引擎启动全部连接分组。"""
+    from cex import cex_orderbook_ws_common as ws_common
+
+    for exchange, market, symbols in groups:
+        threading.Thread(target=ws_common.run_group_loop, args=(exchange, market, symbols, threading.Event()), daemon=True).start()
+
+
+def start_asyncio_engine(groups: list) -> None:
+    """以asyncio引擎在单个事件循环线程内启动全部连接分组。"""
+    from cex import cex_orderbook_ws_async_common as ws_async
+
+    async def run_groups() -> None:
+        await asyncio.gather(*(ws_async.run_group_loop(exchange, market, symbols) for exchange, market, symbols in groups))
+
+    threading.Thread(target=asyncio.run, args=(run_groups(),), daemon=True).start()
+
+
+ENGINE_RUNNERS = {"thread": start_thread_engine, "asyncio": start_asyncio_engine}  # 可回放的WS采集引擎启动函数映射，新引擎在此登记，映射
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    """返回已排序数值的分位数。"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def run_engine_replay(engine: str, port: int, groups: list, scales: dict, out_dir: str, done_event, result_queue) -> None:
+    """采集端子进程入口：将各交易所地址指向替身服务，统计接收到落盘的延迟与资源占用。"""
+    app_config.WS_ENGINE = engine
+    from cex import cex_config
+    from cex import cex_orderbook_ws_common as ws_common
+
+    cex_config.DATA_DYLAN_ROOT = Path(out_dir) / "data"
+    ws_common.UPLOAD_HOOK = lambda _file_path: None
+    log_lines = []
+    for market in ("future", "spot"):
+        ws_common.configure_market_runtime(market, True, None, log_lines.append)
+    for key, symbol_scales in scales.items():
+        ws_common.INSTRUMENT_SCALES[key] = {"ts": time.monotonic(), "scales": symbol_scales}
+    build_ws_url = ws_common.build_ws_url
+    handle_session_message = ws_common.handle_session_message
+    submit_write_job = ws_common.submit_write_job
+    run_write_job = ws_common.run_write_job
+    local = threading.local()
+    stats_lock = threading.Lock()
+    pending = {}
+    latencies = []
+    stats = {"recv_count": 0, "first_ts": 0.0, "first_cpu": 0.0, "last_write_ts": 0.0}
+
+    def bench_ws_url(exchange: str, market: str, symbol: str) -> str:
+        url = f"ws://{SERVER_HOST}:{port}/{exchange}/{market}"
+        if exchange == "binance":
+            return url + "/ws/" + build_ws_url(exchange, market, symbol).rsplit("/", 1)[-1]
+        return url
+
+    def bench_handle_session_message(exchange: str, contexts: dict, raw: str) -> list[str]:
+        recv_ts = time.perf_counter()
+        with stats_lock:
+            if not stats["recv_count"]:
+                stats["first_ts"] = recv_ts
+                stats["first_cpu"] = time.process_time()
+            stats["recv_count"] += 1
+        local.recv_ts = recv_ts
+        try:
+            return handle_session_message(exchange, contexts, raw)
+        finally:
+            local.recv_ts = None
+
+    def bench_submit_write_job(context: dict, kind: str, payload=None) -> None:
+        recv_ts = getattr(local, "recv_ts", None)
+        if kind == "records" and recv_ts is not None:
+            pending[id(payload)] = recv_ts
+        submit_write_job(context, kind, payload)
+
+    def bench_run_write_job(context: dict, kind: str, payload) -> None:
+        run_write_job(context, kind, payload)
+        recv_ts = pending.pop(id(payload), None) if kind == "records" else None
+        if recv_ts is not None:
+            now_ts = time.perf_counter()
+            latencies.append(now_ts - recv_ts)
+            stats["last_write_ts"] = now_ts
+
+    ws_common.build_ws_url = bench_ws_url
+    ws_common.handle_session_message = bench_handle_session_message
+    ws_common.submit_write_job = bench_submit_write_job
+    ws_common.run_write_job = bench_run_write_job
+    ENGINE_RUNNERS[engine](groups)
+    done_event.wait()
+    last_count = -1
+    while last_count != stats["recv_count"]:
+        last_count = stats["recv_count"]
+        time.sleep(QUIET_SECONDS)
+        for market in ("future", "spot"):
+            ws_common.drain_market_writer(market)
+    cpu_seconds = time.process_time() - stats["first_cpu"]
+    elapsed = max(stats["last_write_ts"] - stats["first_ts"], 1e-9)
+    latencies.sort()
+    writers = [ws_common.get_market_writer_snapshot(market) for market in ("future", "spot")]
+    result_queue.put(
+        {
+            "engine": engine,
+            "recv_count": stats["recv_count"],
+            "write_count": len(latencies),
+            "elapsed": elapsed,
+            "p50_ms": percentile(latencies, 0.5) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+            "cpu_seconds": cpu_seconds,
+            "peak_rss_bytes": int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * (1 if sys.platform == "darwin" else 1024),
+            "writer_peak_depth": max(writer["peak_depth"] for writer in writers),
+            "writer_stall_count": sum(writer["stall_count"] for writer in writers),
+            "log_count": len(log_lines),
+        }
+    )
+
+
+def run_engine_bench(engine: str, files: list[Path], speed: float | None, limit: int) -> dict:
+    """为单个引擎启动独立的替身服务与采集端子进程并返回统计结果。"""
+    mp = multiprocessing.get_context("spawn")
+    ready_queue = mp.Queue()
+    result_queue = mp.Queue()
+    done_event = mp.Event()
+    server = mp.Process(target=run_replay_server, args=(files, limit, speed, ready_queue, done_event), daemon=True)
+    server.start()
+    out_dir = tempfile.mkdtemp(prefix="bench_ws_replay_")
+    try:
+        ready = ready_queue.get(timeout=READY_TIMEOUT_SECONDS)
+        worker = mp.Process(
+            target=run_engine_replay, args=(engine, ready["port"], ready["groups"], ready["scales"], out_dir, done_event, result_queue), daemon=True
+        )
+        worker.start()
+        result = result_queue.get()
+        worker.join()
+        result["frame_count"] = ready["frame_count"]
+        result["group_count"] = len(ready["groups"])
+        return result
+    finally:
+        server.terminate()
+        server.join()
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def format_result(result: dict) -> str:
+    """构造单个引擎的统计行。"""
+    return (
+        f"{result['engine']}: {result['recv_count'] / result['elapsed']:.0f} 条/秒 | "
+        f"接收 {result['recv_count']} 帧 / 落盘 {result['write_count']} 批 / {result['elapsed']:.2f} 秒 | "
+        f"延迟 p50 {result['p50_ms']:.2f}ms p99 {result['p99_ms']:.2f}ms max {result['max_ms']:.1f}ms | "
+        f"CPU {result['cpu_seconds']:.2f} 秒 {result['cpu_seconds'] / result['elapsed'] * 100:.0f}% | "
+        f"峰值RSS {result['peak_rss_bytes'] / 1024 / 1024:.1f} MB | "
+        f"写队列峰值 {result['writer_peak_depth']} | 背压 {result['writer_stall_count']}次 | 日志 {result['log_count']} 条"
+    )
+
+
+def main() -> None:
+    """用本地替身WS服务回放录制的rt小时文件，对比各WS采集引擎的吞吐、延迟与资源占用。"""
+    paths, speed, engines, limit = parse_args(sys.argv[1:])
+    files = list_rt_files(paths)
+    if not files:
+        print("用法: python3 bench/bench_ws_replay.py <rt小时文件或目录...> [-speed=1|10|max] [-engine=thread,asyncio] [-limit=单文件最大帧数]")
+        return
+    unknown = [engine for engine in engines if engine not in ENGINE_RUNNERS]
+    if unknown:
+        raise RuntimeError(f"未支持的引擎: {','.join(unknown)}")
+    results = [run_engine_bench(engine, files, speed, limit) for engine in engines]
+    speed_text = "不限速" if speed is None else f"{speed:g}x"
+    print(f"回放文件: {len(files)} 个 | 帧数: {results[0]['frame_count']} | 连接分组: {results[0]['group_count']} x 主备 | 倍速: {speed_text}")
+    for result in results:
+        print(format_result(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -646,12 +646,17 @@ def sync_local_files_to_s3_on_startup() -> None:
 
 def list_s3_file_names(dir_path: Path) -> list[str]:
     """列出S3目录下的直接子文件名。"""
+    return sorted(list_s3_file_sizes(dir_path))
+
+
+def list_s3_file_sizes(dir_path: Path) -> dict[str, int]:
+    """列出S3目录下的直接子文件名及其对象大小。"""
     prefix = build_s3_prefix(dir_path)
     if not prefix:
-        return []
+        return {}
     try:
         paginator = get_s3_client().get_paginator("list_objects_v2")
-        names = set()
+        sizes = {}
         for page in paginator.paginate(Bucket=app_config.S3_BUCKET_NAME, Prefix=prefix):
             for item in page.get("Contents", []):
                 key = str(item.get("Key") or "")
@@ -660,8 +665,8 @@ def list_s3_file_names(dir_path: Path) -> list[str]:
                 suffix = key[len(prefix) :]
                 if "/" in suffix:
                     continue
-                names.add(suffix)
-        return sorted(names)
+                sizes[suffix] = int(item.get("Size") or 0)
+        return sizes
     except NoCredentialsError as exc:
         raise RuntimeError("S3检查失败: 缺少凭证") from exc
     except PartialCredentialsError as exc:
@@ -685,6 +690,14 @@ def list_storage_file_names(dir_path: Path) -> list[str]:
     return list_s3_file_names(dir_path)
 
 
+def list_storage_file_sizes(dir_path: Path) -> dict[str, int]:
+    """按当前存储模式列出目录下的直接子文件名及其大小，S3模式下本地已有的文件以本地大小为准。"""
+    local_sizes = {path.name: path.stat().st_size for path in dir_path.iterdir() if path.is_file()} if dir_path.exists() else {}
+    if not is_s3_storage_mode() or not STORAGE_S3_READ_ENABLED:
+        return local_sizes
+    return {**list_s3_file_sizes(dir_path), **local_sizes}
+
+
 def storage_file_exists(file_path: Path) -> bool:
     """按当前存储模式判断文件是否存在。"""
     if file_path.exists():
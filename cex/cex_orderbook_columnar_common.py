@@ -0,0 +1,149 @@
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cex.cex_common import build_part_path
+from cex.cex_orderbook_snapshot_common import build_schema
+
+
+COLUMNAR_SUFFIXES = {"parquet": ".parquet", "arrow": ".arrow"}  # 列式快照格式到文件后缀映射，映射
+PARQUET_COMPRESSION = "snappy"  # 列式快照Parquet压缩算法，字符串
+SCALAR_FIELDS = (
+    "symbol",
+    "update_type",
+    "ts",
+    "cts",
+    "collect_ts",
+    "update_id",
+    "seq",
+    "best_bid",
+    "best_ask",
+    "bid_depth",
+    "ask_depth",
+)  # 列式快照标量字段列表，个数
+KEY_FIELDS = ("symbol", "update_type", "ts", "cts", "update_id", "seq")  # 组成快照去重键的字段，顺序同待切换缓存去重键，个数
+
+
+def build_rt_snapshot_schema() -> pa.Schema:
+    """构造实时快照列式表结构，在历史快照结构上追加采集时间。"""
+    schema = build_schema()
+    return schema.insert(schema.get_field_index("cts") + 1, pa.field("collect_ts", pa.int64()))
+
+
+RT_SNAPSHOT_SCHEMA = build_rt_snapshot_schema()  # 实时快照列式表结构，结构
+ISSUED_PATHS = set()  # 本进程已分配的列式分段路径集合，上传删除本地文件后仍不复用，个数
+
+
+def build_columnar_path(base_dir: Path, symbol: str, hour_str: str, tag: str, file_format: str) -> Path:
+    """构造单小时列式分段路径，同小时已有分段时顺延分段序号。"""
+    return next_columnar_path(base_dir / symbol / hour_str / f"{symbol}-{tag}-{hour_str}{COLUMNAR_SUFFIXES[file_format]}")
+
+
+def columnar_part_index(base_path: Path, path: Path) -> int | None:
+    """返回分段相对基础路径的序号，基础路径本身为0，不属于同一小时标签时为空。"""
+    if path.suffix != base_path.suffix:
+        return None
+    if path.name == base_path.name:
+        return 0
+    prefix = base_path.stem + "-"
+    part_text = path.stem[len(prefix) :]
+    if not path.stem.startswith(prefix) or not part_text.isdigit():
+        return None
+    return int(part_text)
+
+
+def build_columnar_part_path(base_path: Path, part_index: int) -> Path:
+    """按分段序号构造同小时列式分段路径。"""
+    if part_index <= 0:
+        return base_path
+    return base_path.with_name(f"{base_path.stem}-{part_index}{base_path.suffix}")
+
+
+def next_columnar_path(base_path: Path) -> Path:
+    """从基础路径起分配同小时下一个未被占用的列式分段路径。"""
+    part_index = 0
+    path = base_path
+    while path in ISSUED_PATHS or path.exists() or build_part_path(path).exists():
+        part_index += 1
+        path = build_columnar_part_path(base_path, part_index)
+    ISSUED_PATHS.add(path)
+    return path
+
+
+def list_columnar_segments(base_path: Path) -> list[Path]:
+    """按分段序号列出基础路径所在小时已落为正式文件的列式分段。"""
+    if not base_path.parent.exists():
+        return []
+    indexed = []
+    for path in base_path.parent.iterdir():
+        part_index = columnar_part_index(base_path, path)
+        if part_index is not None:
+            indexed.append((part_index, path))
+    return [path for _part_index, path in sorted(indexed)]
+
+
+def read_columnar_key_rows(path: Path) -> list[tuple]:
+    """读取列式分段中组成去重键的字段，按行返回字段元组。"""
+    table = read_columnar_segment(path).select(list(KEY_FIELDS))
+    return list(zip(*(table.column(name).to_pylist() for name in KEY_FIELDS)))
+
+
+def build_side_array(side_levels: list) -> pa.Array:
+    """将多条快照的单侧档位拼为list<struct<price,qty>>列。"""
+    offsets = [0]
+    prices = []
+    sizes = []
+    for levels in side_levels:
+        for price, size in levels:
+            prices.append(price)
+            sizes.append(size)
+        offsets.append(len(prices))
+    values = pa.StructArray.from_arrays([pa.array(prices, pa.float64()), pa.array(sizes, pa.float64())], names=["price", "qty"])
+    return pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), values)
+
+
+def build_record_batch(snapshots: list) -> pa.RecordBatch:
+    """将一批快照字典按列组装为记录批次。"""
+    arrays = []
+    for field in RT_SNAPSHOT_SCHEMA:
+        if field.name in SCALAR_FIELDS:
+            arrays.append(pa.array([snapshot[field.name] for snapshot in snapshots], field.type))
+        else:
+            arrays.append(build_side_array([snapshot[field.name] for snapshot in snapshots]))
+    return pa.RecordBatch.from_arrays(arrays, schema=RT_SNAPSHOT_SCHEMA)
+
+
+class ColumnarSegmentWriter:
+    """按批次写入的单小时列式快照分段，关闭时由临时文件切换为正式文件。"""
+
+    def __init__(self, path: Path, file_format: str):
+        """打开临时分段文件。"""
+        self.path = path
+        self.part_path = build_part_path(path)
+        if file_format == "parquet":
+            self.writer = pq.ParquetWriter(self.part_path, RT_SNAPSHOT_SCHEMA, compression=PARQUET_COMPRESSION)
+        else:
+            self.writer = pa.ipc.new_file(self.part_path, RT_SNAPSHOT_SCHEMA)
+        self.row_count = 0
+
+    def write_snapshots(self, snapshots: list) -> None:
+        """写入一批快照，Parquet下对应一个行组。"""
+        self.writer.write_batch(build_record_batch(snapshots))
+        self.row_count += len(snapshots)
+
+    def close(self) -> None:
+        """写出文件尾并切换为正式文件，无记录时删除临时文件。"""
+        self.writer.close()
+        if self.row_count <= 0:
+            self.part_path.unlink()
+            return
+        self.part_path.replace(self.path)
+
+
+def read_columnar_segment(path: Path) -> pa.Table:
+    """读取单个列式快照分段。"""
+    if path.suffix == ".parquet":
+        return pq.read_table(path)
+    with pa.memory_map(str(path), "r") as source:
+        return pa.ipc.open_file(source).read_all()
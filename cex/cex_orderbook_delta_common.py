@@ -0,0 +1,121 @@
+from itertools import islice
+from operator import neg
+from pathlib import Path
+
+import orjson
+from sortedcontainers import SortedDict
+
+from cex.cex_orderbook_segment_common import iter_segment_lines
+
+
+KEYFRAME_KIND = "key"  # 关键帧记录类型，字符串
+DELTA_KIND = "delta"  # 差分记录类型，字符串
+HEADER_FIELDS = (
+    "symbol",
+    "update_type",
+    "ts",
+    "cts",
+    "collect_ts",
+    "update_id",
+    "seq",
+    "best_bid",
+    "best_ask",
+    "bid_depth",
+    "ask_depth",
+)  # 差分记录保留的快照标量字段列表，个数
+
+
+def build_encoder_state() -> dict:
+    """构造单个输出文件的关键帧差分编码状态。"""
+    return {"previous": None, "since_keyframe": 0}
+
+
+def diff_levels(previous_levels: list, levels: list) -> list:
+    """比较前后两份前N档，返回新增或变化的档位，移出视图的档位数量记为0。"""
+    if levels is previous_levels:
+        return []
+    previous_sizes = {price: size for price, size in previous_levels}
+    changes = []
+    for level in levels:
+        price, size = level
+        if previous_sizes.pop(price, None) != size:
+            changes.append(level)
+    for price in previous_sizes:
+        changes.append([price, "0"])
+    return changes
+
+
+def encode_snapshot_record(state: dict, snapshot: dict, keyframe_interval: int) -> dict:
+    """将快照编码为关键帧或相对上一条输出的差分记录。"""
+    previous = state["previous"]
+    state["previous"] = snapshot
+    if previous is None or snapshot["update_type"] == "snapshot" or state["since_keyframe"] >= keyframe_interval:
+        state["since_keyframe"] = 0
+        record = dict(snapshot)
+        record["kind"] = KEYFRAME_KIND
+        return record
+    state["since_keyframe"] += 1
+    record = {field: snapshot[field] for field in HEADER_FIELDS}
+    record["kind"] = DELTA_KIND
+    record["bids"] = diff_levels(previous["bids"], snapshot["bids"])
+    record["asks"] = diff_levels(previous["asks"], snapshot["asks"])
+    return record
+
+
+def build_side(levels: list, reverse: bool) -> SortedDict:
+    """将整份档位构造为按价格有序的单侧映射。"""
+    side = SortedDict(neg) if reverse else SortedDict()
+    for level in levels:
+        side[float(level[0])] = level
+    return side
+
+
+def apply_level_changes(side: SortedDict, changes: list) -> None:
+    """将差分档位应用到单侧有序映射。"""
+    for level in changes:
+        price = float(level[0])
+        if float(level[1]) == 0:
+            side.pop(price, None)
+        else:
+            side[price] = level
+
+
+def build_side_levels(side: SortedDict, depth: int) -> list:
+    """输出单侧前N档。"""
+    return [side[price] for price in islice(side, depth)]
+
+
+def iter_decoded_snapshots(records):
+    """将关键帧差分记录流还原为完整快照，未标记类型的整行快照视为关键帧。"""
+    bids = None
+    asks = None
+    for record in records:
+        kind = record.pop("kind", KEYFRAME_KIND)
+        if kind == KEYFRAME_KIND:
+            bids = build_side(record["bids"], True)
+            asks = build_side(record["asks"], False)
+            yield record
+            continue
+        if bids is None:
+            continue
+        apply_level_changes(bids, record["bids"])
+        apply_level_changes(asks, record["asks"])
+        record["bids"] = build_side_levels(bids, record["bid_depth"])
+        record["asks"] = build_side_levels(asks, record["ask_depth"])
+        yield record
+
+
+def iter_rt_ss_snapshots(file_path: Path):
+    """逐条读取rt_ss文件并输出完整快照，兼容整行快照与关键帧差分两种格式。"""
+    records = (orjson.loads(line) for line in iter_segment_lines(file_path) if line.strip())
+    yield from iter_decoded_snapshots(records)
+
+
+def read_snapshot_at(file_path: Path, collect_ts: int) -> dict | None:
+    """还原指定采集时间点时刻生效的完整快照。"""
+    result = None
+    for snapshot in iter_rt_ss_snapshots(file_path):
+        if snapshot["collect_ts"] > collect_ts:
+            break
+        result = snapshot
+    return result
@@ -0,0 +1,265 @@
+from decimal import Decimal
+from itertools import islice
+from operator import neg
+
+from sortedcontainers import SortedDict
+
+
+def format_number(value: float) -> str:
+    """格式化盘口价格与数量。"""
+    text = f"{value:.10f}".rstrip("0").rstrip(".")
+    return text if text else "0"
+
+
+def plain_decimal_text(text: str) -> str:
+    """将科学计数法等数值文本规范为定点小数文本。"""
+    return format(Decimal(text), "f")
+
+
+def decimal_places(text: str) -> int:
+    """返回数值文本去掉末尾0后的小数位数。"""
+    _whole, _dot, frac = plain_decimal_text(text).partition(".")
+    return len(frac.rstrip("0"))
+
+
+def parse_scaled(text: str, scale: int) -> int:
+    """按固定小数位将数值文本解析为整数刻度，超出小数位的非0部分抛出ValueError。"""
+    whole, _dot, frac = text.partition(".")
+    if len(frac) > scale:
+        if frac[scale:].strip("0"):
+            raise ValueError(f"数值 {text} 超出 {scale} 位小数")
+        frac = frac[:scale]
+    return int(whole + frac.ljust(scale, "0"))
+
+
+def format_scaled(value: int, scale: int) -> str:
+    """将整数刻度按固定小数位格式化为去掉末尾0的文本。"""
+    if scale == 0:
+        return str(value)
+    text = str(value).rjust(scale + 1, "0")
+    frac = text[-scale:].rstrip("0")
+    return f"{text[:-scale]}.{frac}" if frac else text[:-scale]
+
+
+class SortedOrderBook:
+    """按价格有序维护的实时内存盘口。"""
+
+    def __init__(self, depth: int, keep_levels: int, formatter=format_number, keep_raw: bool = False):
+        """初始化有序盘口，keep_raw时额外保留交易所原始价格与数量文本供校验和使用。"""
+        self.depth = depth
+        self.keep_levels = max(depth, keep_levels)
+        self.formatter = formatter
+        self.keep_raw = keep_raw
+        self.bid_raw = {}
+        self.ask_raw = {}
+        self.bids = SortedDict(neg)
+        self.asks = SortedDict()
+        self.bid_texts = {}
+        self.ask_texts = {}
+        self.bid_prices = []
+        self.ask_prices = []
+        self.bid_levels = []
+        self.ask_levels = []
+        self.bid_dirty = True
+        self.ask_dirty = True
+        self.parse_price = float
+        self.parse_size = float
+
+    def replace(self, bids: list, asks: list) -> None:
+        """用快照整体替换盘口。"""
+        parse_price = self.parse_price
+        parse_size = self.parse_size
+        self.bids = SortedDict(neg, {parse_price(price): parse_size(size) for price, size in bids})
+        self.asks = SortedDict({parse_price(price): parse_size(size) for price, size in asks})
+        self.bid_raw = {parse_price(price): [price, size] for price, size in bids} if self.keep_raw else {}
+        self.ask_raw = {parse_price(price): [price, size] for price, size in asks} if self.keep_raw else {}
+        self.bids = self.trim_side(self.bids, self.bid_raw)
+        self.asks = self.trim_side(self.asks, self.ask_raw)
+        self.bid_texts = {}
+        self.ask_texts = {}
+        self.bid_dirty = True
+        self.ask_dirty = True
+
+    def apply_delta(self, bids: list, asks: list) -> None:
+        """将增量档位应用到盘口。"""
+        parse_price = self.parse_price
+        parse_size = self.parse_size
+        bid_boundary = self.view_boundary(self.bid_prices)
+        ask_boundary = self.view_boundary(self.ask_prices)
+        for price_text, size_text in bids:
+            price = parse_price(price_text)
+            size = parse_size(size_text)
+            if size == 0:
+                self.bids.pop(price, None)
+                self.bid_raw.pop(price, None)
+            else:
+                self.bids[price] = size
+                if self.keep_raw:
+                    self.bid_raw[price] = [price_text, size_text]
+            self.bid_texts.pop(price, None)
+            if bid_boundary is None or price >= bid_boundary:
+                self.bid_dirty = True
+        for price_text, size_text in asks:
+            price = parse_price(price_text)
+            size = parse_size(size_text)
+            if size == 0:
+                self.asks.pop(price, None)
+                self.ask_raw.pop(price, None)
+            else:
+                self.asks[price] = size
+                if self.keep_raw:
+                    self.ask_raw[price] = [price_text, size_text]
+            self.ask_texts.pop(price, None)
+            if ask_boundary is None or price <= ask_boundary:
+                self.ask_dirty = True
+        if len(self.bids) > self.keep_levels:
+            self.bids = self.trim_side(self.bids, self.bid_texts, self.bid_raw)
+        if len(self.asks) > self.keep_levels:
+            self.asks = self.trim_side(self.asks, self.ask_texts, self.ask_raw)
+
+    def trim_side(self, side: SortedDict, *text_maps: dict) -> SortedDict:
+        """从远端弹出超出保留层数的档位。"""
+        while len(side) > self.keep_levels:
+            price, _size = side.popitem(-1)
+            for texts in text_maps:
+                texts.pop(price, None)
+        return side
+
+    def view_boundary(self, prices: list) -> float | None:
+        """返回缓存视图最末档价格，视图未满时返回空。"""
+        if self.depth <= 0 or len(prices) < self.depth:
+            return None
+        return prices[-1]
+
+    def build_side_view(self, side: SortedDict, texts: dict, depth: int) -> tuple[list, list]:
+        """构造单侧前N档价格列表与格式化档位列表。"""
+        prices = list(islice(side, depth))
+        levels = []
+        for price in prices:
+            level = texts.get(price)
+            if level is None:
+                level = self.format_level(price, side[price])
+                texts[price] = level
+            levels.append(level)
+        return prices, levels
+
+    def format_level(self, price, size) -> list:
+        """格式化单个输出档位。"""
+        return [self.formatter(price), self.formatter(size)]
+
+    def price_value(self, price) -> float:
+        """返回盘口键对应的浮点价格。"""
+        return price
+
+    def side_values(self, side: SortedDict, prices: list) -> list:
+        """将单侧指定价格的档位展开为价格、数量交错的浮点列表。"""
+        values = []
+        for price in prices:
+            values.append(price)
+            values.append(side[price])
+        return values
+
+    def refresh_view(self) -> None:
+        """按需重建缓存的前N档视图。"""
+        if self.bid_dirty:
+            self.bid_prices, self.bid_levels = self.build_side_view(self.bids, self.bid_texts, self.depth)
+            self.bid_dirty = False
+        if self.ask_dirty:
+            self.ask_prices, self.ask_levels = self.build_side_view(self.asks, self.ask_texts, self.depth)
+            self.ask_dirty = False
+
+    def top_levels(self, depth: int) -> tuple[list, list, list, list]:
+        """返回买卖两侧前N档价格与格式化档位。"""
+        if depth == self.depth:
+            self.refresh_view()
+            return self.bid_prices, self.bid_levels, self.ask_prices, self.ask_levels
+        bid_prices, bid_levels = self.build_side_view(self.bids, self.bid_texts, depth)
+        ask_prices, ask_levels = self.build_side_view(self.asks, self.ask_texts, depth)
+        return bid_prices, bid_levels, ask_prices, ask_levels
+
+    def raw_top_levels(self, depth: int) -> tuple[list, list]:
+        """返回买卖两侧前N档交易所原始价格与数量文本。"""
+        bid_levels = [self.bid_raw[price] for price in islice(self.bids, depth)]
+        ask_levels = [self.ask_raw[price] for price in islice(self.asks, depth)]
+        return bid_levels, ask_levels
+
+    def __len__(self) -> int:
+        """返回盘口总档位数。"""
+        return len(self.bids) + len(self.asks)
+
+
+class TickOrderBook(SortedOrderBook):
+    """按交易对价格精度与数量精度以整数刻度为键的内存盘口，输出由定点缩放格式化，价格精确且哈希与排序更快。"""
+
+    def __init__(self, depth: int, keep_levels: int, price_scale: int, size_scale: int, formatter=format_number, keep_raw: bool = False):
+        """初始化整数刻度盘口，formatter为float时输出浮点档位。"""
+        super().__init__(depth, keep_levels, formatter=formatter, keep_raw=keep_raw)
+        self.float_output = formatter is float
+        self.price_scale = price_scale
+        self.size_scale = size_scale
+        self.price_unit = 10**price_scale
+        self.size_unit = 10**size_scale
+        self.parse_price = self.parse_price_text
+        self.parse_size = self.parse_size_text
+
+    def parse_price_text(self, text: str) -> int:
+        """将价格文本解析为整数刻度，精度不足时先放大盘口刻度。"""
+        try:
+            return parse_scaled(text, self.price_scale)
+        except ValueError:
+            self.widen_scales(decimal_places(text), self.size_scale)
+            return parse_scaled(plain_decimal_text(text), self.price_scale)
+
+    def parse_size_text(self, text: str) -> int:
+        """将数量文本解析为整数刻度，精度不足时先放大盘口刻度。"""
+        try:
+            return parse_scaled(text, self.size_scale)
+        except ValueError:
+            self.widen_scales(self.price_scale, decimal_places(text))
+            return parse_scaled(plain_decimal_text(text), self.size_scale)
+
+    def replace(self, bids: list, asks: list) -> None:
+        """用快照整体替换盘口，解析中放大过刻度时按新刻度重建一次。"""
+        scales = (self.price_scale, self.size_scale)
+        super().replace(bids, asks)
+        if (self.price_scale, self.size_scale) != scales:
+            super().replace(bids, asks)
+
+    def widen_scales(self, price_scale: int, size_scale: int) -> None:
+        """交易所推送的小数位超出合约精度时放大刻度并换算已有档位。"""
+        price_scale = max(price_scale, self.price_scale)
+        size_scale = max(size_scale, self.size_scale)
+        price_factor = 10 ** (price_scale - self.price_scale)
+        size_factor = 10 ** (size_scale - self.size_scale)
+        self.bids = SortedDict(neg, {price * price_factor: size * size_factor for price, size in self.bids.items()})
+        self.asks = SortedDict({price * price_factor: size * size_factor for price, size in self.asks.items()})
+        self.bid_raw = {price * price_factor: level for price, level in self.bid_raw.items()}
+        self.ask_raw = {price * price_factor: level for price, level in self.ask_raw.items()}
+        self.price_scale = price_scale
+        self.size_scale = size_scale
+        self.price_unit = 10**price_scale
+        self.size_unit = 10**size_scale
+        self.bid_texts = {}
+        self.ask_texts = {}
+        self.bid_prices = []
+        self.ask_prices = []
+        self.bid_dirty = True
+        self.ask_dirty = True
+
+    def format_level(self, price: int, size: int) -> list:
+        """按定点缩放格式化单个输出档位。"""
+        if self.float_output:
+            return [price / self.price_unit, size / self.size_unit]
+        return [format_scaled(price, self.price_scale), format_scaled(size, self.size_scale)]
+
+    def price_value(self, price: int) -> float:
+        """返回整数刻度对应的浮点价格。"""
+        return price / self.price_unit
+
+    def side_values(self, side: SortedDict, prices: list) -> list:
+        """将单侧指定价格的档位展开为价格、数量交错的浮点列表。"""
+        values = []
+        for price in prices:
+            values.append(price / self.price_unit)
+            values.append(side[price] / self.size_unit)
+        return values
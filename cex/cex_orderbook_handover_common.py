@@ -0,0 +1,103 @@
+from pathlib import Path
+import socket
+import threading
+
+import orjson
+
+import app_config
+from cex import cex_orderbook_ws_common as ws_common
+
+
+HANDOVER_SOCKET_PATH = Path(app_config.WS_HANDOVER_SOCKET_PATH)  # 新旧进程落盘交接本地套接字路径，路径
+HANDOVER_TIMEOUT_SECONDS = app_config.WS_HANDOVER_TIMEOUT_SECONDS  # 落盘交接请求超时，秒
+HANDOVER_REQUEST = {"op": "handover"}  # 落盘交接请求内容，映射
+
+
+def read_message(conn: socket.socket) -> dict | None:
+    """读取一条以换行结尾的JSON消息，连接提前关闭时返回空。"""
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            return None
+        data += chunk
+    return orjson.loads(data)
+
+
+def send_message(conn: socket.socket, payload: dict) -> None:
+    """发送一条以换行结尾的JSON消息。"""
+    conn.sendall(orjson.dumps(payload) + b"\n")
+
+
+def serve_handover_request(conn: socket.socket, release_hook) -> None:
+    """处理新进程的交接请求，交出落盘权后回报各文件续写位置。"""
+    with conn:
+        request = read_message(conn)
+        if request != HANDOVER_REQUEST:
+            return
+        files = ws_common.release_market_writes()
+        send_message(conn, {"ok": files is not None, "files": files or {}})
+    if files is not None:
+        ws_common.log(f"已通过本地套接字交出落盘权，共 {len(files)} 个分段文件")
+        if release_hook:
+            release_hook()
+
+
+def bind_handover_socket() -> socket.socket | None:
+    """绑定交接套接字，已有进程在监听时返回空，残留的套接字文件直接清理。"""
+    HANDOVER_SOCKET_PATH.parent.mkdir(parents=True, exist_ok=True)
+    if HANDOVER_SOCKET_PATH.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(HANDOVER_SOCKET_PATH))
+            return None
+        except OSError:
+            HANDOVER_SOCKET_PATH.unlink(missing_ok=True)
+        finally:
+            probe.close()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(HANDOVER_SOCKET_PATH))
+    server.listen(1)
+    return server
+
+
+def run_handover_server(server: socket.socket, release_hook) -> None:
+    """交接服务主循环，完成一次交接后关闭监听。"""
+    try:
+        while not ws_common.WRITES_RELEASED.is_set():
+            conn, _addr = server.accept()
+            try:
+                serve_handover_request(conn, release_hook)
+            except OSError as exc:
+                ws_common.log(f"落盘交接请求处理失败: {exc}")
+    finally:
+        server.close()
+        HANDOVER_SOCKET_PATH.unlink(missing_ok=True)
+
+
+def start_handover_server(release_hook=None) -> bool:
+    """启动后台交接服务，供升级时的新进程接管落盘。"""
+    server = bind_handover_socket()
+    if server is None:
+        return False
+    threading.Thread(target=run_handover_server, args=(server, release_hook), name="ws-handover-server", daemon=True).start()
+    return True
+
+
+def request_handover() -> dict | None:
+    """向旧进程请求交接，成功时返回各分段文件续写位置，旧进程不支持时返回空。"""
+    if not HANDOVER_SOCKET_PATH.exists():
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(HANDOVER_TIMEOUT_SECONDS)
+    try:
+        conn.connect(str(HANDOVER_SOCKET_PATH))
+        send_message(conn, HANDOVER_REQUEST)
+        reply = read_message(conn)
+    except OSError:
+        return None
+    finally:
+        conn.close()
+    if not reply or not reply.get("ok"):
+        return None
+    return reply["files"]
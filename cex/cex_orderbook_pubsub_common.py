@@ -0,0 +1,229 @@
+from collections import deque
+from pathlib import Path
+import selectors
+import socket
+import threading
+import time
+
+import orjson
+
+import app_config
+
+
+PUBSUB_DIR = Path(app_config.WS_PUBSUB_SOCKET_DIR)  # 实时行情本地分发套接字目录，每个采集进程一个套接字，路径
+CLIENT_QUEUE_MAX = app_config.WS_PUBSUB_CLIENT_QUEUE_MAX  # 单个订阅者待发送队列上限，满时丢弃最旧消息，条
+BIND_RETRY_SECONDS = 5  # 套接字被占用时的重试绑定间隔，秒
+TOPIC_FIELDS = ("exchange", "market", "symbol", "stage")  # 订阅主题字段列表，个数
+CLIENTS_LOCK = threading.Lock()  # 订阅者列表修改锁，锁
+CLIENTS = ()  # 当前订阅者列表，修改时整体替换供发布端无锁读取，个数
+SERVER_NAMES = set()  # 本进程已启动的分发服务名集合，个数
+
+
+def normalize_filter(topic_filter: dict) -> dict:
+    """将订阅过滤条件统一为字段到取值集合的映射，缺省字段表示不限。"""
+    result = {}
+    for field in TOPIC_FIELDS:
+        value = topic_filter.get(field)
+        if value is None:
+            continue
+        result[field] = {value} if isinstance(value, str) else set(value)
+    return result
+
+
+def topic_matches(topic_filter: dict, topic: tuple) -> bool:
+    """判断主题是否满足单条过滤条件。"""
+    for field, value in zip(TOPIC_FIELDS, topic):
+        allowed = topic_filter.get(field)
+        if allowed is not None and value not in allowed:
+            return False
+    return True
+
+
+def client_wants(client: dict, topic: tuple) -> bool:
+    """判断订阅者是否订阅了该主题。"""
+    return any(topic_matches(topic_filter, topic) for topic_filter in client["filters"])
+
+
+def has_subscribers(topic: tuple) -> bool:
+    """判断是否有订阅者需要该主题，无订阅者时发布端可跳过编码。"""
+    return any(client_wants(client, topic) for client in CLIENTS)
+
+
+def encode_message(topic: tuple, record) -> bytes:
+    """将单条记录编码为带主题的换行分隔JSON，整行文本记录原样嵌入。"""
+    data = record.rstrip("\n").encode("utf-8") if isinstance(record, str) else orjson.dumps(record)
+    exchange, market, symbol, stage = topic
+    return b'{"exchange":"%s","market":"%s","symbol":"%s","stage":"%s","data":%s}\n' % (
+        exchange.encode(),
+        market.encode(),
+        symbol.encode(),
+        stage.encode(),
+        data,
+    )
+
+
+def publish(topic: tuple, records: list) -> None:
+    """向订阅了该主题的客户端分发记录，队列满时丢弃最旧消息，不阻塞采集线程。"""
+    clients = [client for client in CLIENTS if client_wants(client, topic)]
+    if not clients or not records:
+        return
+    lines = [encode_message(topic, record) for record in records]
+    for client in clients:
+        with client["cond"]:
+            overflow = len(client["queue"]) + len(lines) - CLIENT_QUEUE_MAX
+            if overflow > 0:
+                client["drop_count"] += overflow
+            client["queue"].extend(lines)
+            client["cond"].notify()
+
+
+def add_client(client: dict) -> None:
+    """登记订阅者。"""
+    global CLIENTS
+    with CLIENTS_LOCK:
+        CLIENTS = CLIENTS + (client,)
+
+
+def remove_client(client: dict) -> None:
+    """移除订阅者。"""
+    global CLIENTS
+    with CLIENTS_LOCK:
+        CLIENTS = tuple(item for item in CLIENTS if item is not client)
+
+
+def take_client_batch(client: dict) -> list[bytes]:
+    """等待并取出订阅者队列中的全部待发送消息，有丢弃时在批首插入丢弃通知。"""
+    with client["cond"]:
+        while not client["queue"]:
+            client["cond"].wait()
+        batch = list(client["queue"])
+        client["queue"].clear()
+        drop_count = client["drop_count"]
+        client["drop_count"] = 0
+    if drop_count:
+        batch.insert(0, orjson.dumps({"event": "dropped", "count": drop_count}) + b"\n")
+    return batch
+
+
+def run_client_sender(conn: socket.socket, client: dict) -> None:
+    """订阅者发送线程，连接断开后移除订阅者。"""
+    try:
+        while True:
+            conn.sendall(b"".join(take_client_batch(client)))
+    except OSError:
+        pass
+    finally:
+        remove_client(client)
+        conn.close()
+
+
+def read_request(conn: socket.socket) -> dict | None:
+    """读取订阅者发来的一行订阅请求，格式错误或连接提前关闭时返回空。"""
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            return None
+        data += chunk
+    try:
+        request = orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return None
+    if not isinstance(request, dict) or request.get("op") != "subscribe":
+        return None
+    return request
+
+
+def serve_client(conn: socket.socket) -> None:
+    """读取订阅请求并为订阅者启动发送线程。"""
+    try:
+        request = read_request(conn)
+    except OSError:
+        request = None
+    if request is None:
+        conn.close()
+        return
+    filters = [normalize_filter(topic_filter) for topic_filter in request.get("topics") or [{}]]
+    client = {"filters": filters, "queue": deque(maxlen=CLIENT_QUEUE_MAX), "cond": threading.Condition(), "drop_count": 0}
+    add_client(client)
+    threading.Thread(target=run_client_sender, args=(conn, client), name="ws-pubsub-client", daemon=True).start()
+
+
+def bind_pubsub_socket(path: Path) -> socket.socket | None:
+    """绑定分发套接字，已有进程在监听时返回空，残留的套接字文件直接清理。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(path))
+            return None
+        except OSError:
+            path.unlink(missing_ok=True)
+        finally:
+            probe.close()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen()
+    return server
+
+
+def run_pubsub_server(path: Path) -> None:
+    """分发服务主循环，套接字被其他进程占用时定期重试，升级交接后可接替旧进程。"""
+    server = bind_pubsub_socket(path)
+    while server is None:
+        time.sleep(BIND_RETRY_SECONDS)
+        server = bind_pubsub_socket(path)
+    with server:
+        while True:
+            conn, _addr = server.accept()
+            threading.Thread(target=serve_client, args=(conn,), name="ws-pubsub-accept", daemon=True).start()
+
+
+def start_pubsub_server(name: str) -> None:
+    """启动本进程的后台分发服务，同名服务只启动一次。"""
+    with CLIENTS_LOCK:
+        if name in SERVER_NAMES:
+            return
+        SERVER_NAMES.add(name)
+    threading.Thread(target=run_pubsub_server, args=(PUBSUB_DIR / f"{name}.sock",), name="ws-pubsub-server", daemon=True).start()
+
+
+def list_pubsub_sockets(socket_dir: Path = PUBSUB_DIR) -> list[Path]:
+    """列出目录下各采集进程的分发套接字。"""
+    return sorted(Path(socket_dir).glob("*.sock"))
+
+
+def iter_pubsub_messages(topics: list[dict] | None = None, socket_dir: Path = PUBSUB_DIR):
+    """连接目录下全部分发套接字并按到达顺序输出订阅消息，topics为空时订阅全部主题。"""
+    request = orjson.dumps({"op": "subscribe", "topics": topics or [{}]}) + b"\n"
+    selector = selectors.DefaultSelector()
+    for path in list_pubsub_sockets(socket_dir):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(str(path))
+            conn.sendall(request)
+        except OSError:
+            conn.close()
+            continue
+        selector.register(conn, selectors.EVENT_READ, bytearray())
+    try:
+        while selector.get_map():
+            for key, _mask in selector.select():
+                chunk = key.fileobj.recv(1 << 20)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+                pending = key.data
+                pending.extend(chunk)
+                end = pending.rfind(b"\n")
+                if end < 0:
+                    continue
+                lines = bytes(pending[: end + 1]).splitlines()
+                del pending[: end + 1]
+                for line in lines:
+                    yield orjson.loads(line)
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
@@ -0,0 +1,111 @@
+from pathlib import Path
+import threading
+import zlib
+
+import app_config
+
+
+SEGMENT_SUFFIXES = {"none": ".json", "gzip": ".json.gz", "zstd": ".json.zst"}  # 分段文件压缩方式到文件后缀映射，映射
+GZIP_LEVEL = app_config.WS_SEGMENT_GZIP_LEVEL  # gzip压缩级别，级别
+ZSTD_LEVEL = app_config.WS_SEGMENT_ZSTD_LEVEL  # zstd压缩级别，级别
+READ_CHUNK_BYTES = 1024 * 1024  # 压缩分段读取块大小，字节
+ZSTD_LOCAL = threading.local()  # 线程内zstd压缩器缓存，对象
+
+
+def segment_suffix(codec: str) -> str:
+    """返回指定压缩方式的分段文件后缀。"""
+    if codec not in SEGMENT_SUFFIXES:
+        raise RuntimeError(f"未支持的分段压缩方式: {codec}")
+    return SEGMENT_SUFFIXES[codec]
+
+
+def segment_codec_from_path(file_path: Path) -> str:
+    """按文件后缀识别分段文件压缩方式。"""
+    name = file_path.name
+    for codec, suffix in SEGMENT_SUFFIXES.items():
+        if codec != "none" and name.endswith(suffix):
+            return codec
+    return "none"
+
+
+def load_zstandard():
+    """按需加载zstandard模块。"""
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise RuntimeError("zstd分段压缩需要安装zstandard") from exc
+    return zstandard
+
+
+def open_segment_file(file_path: Path, codec: str):
+    """以追加方式打开分段文件，压缩分段以二进制写入。"""
+    if codec == "none":
+        return file_path.open("a", encoding="utf-8")
+    return file_path.open("ab")
+
+
+def encode_segment_frame(codec: str, text: str) -> bytes:
+    """将一批行压缩为可独立解压的完整帧。"""
+    data = text.encode("utf-8")
+    if codec == "gzip":
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    compressor = getattr(ZSTD_LOCAL, "compressor", None)
+    if compressor is None:
+        compressor = load_zstandard().ZstdCompressor(level=ZSTD_LEVEL)
+        ZSTD_LOCAL.compressor = compressor
+    return compressor.compress(data)
+
+
+def write_segment_text(handle, codec: str, text: str) -> None:
+    """写入一批行，压缩分段每次写入一个完整帧后落盘。"""
+    if codec == "none":
+        handle.write(text)
+    else:
+        handle.write(encode_segment_frame(codec, text))
+    handle.flush()
+
+
+def append_segment_text(file_path: Path, codec: str, text: str) -> None:
+    """向分段文件追加一批行。"""
+    with open_segment_file(file_path, codec) as handle:
+        write_segment_text(handle, codec, text)
+
+
+def build_segment_decoder(codec: str):
+    """构造单帧解压器。"""
+    if codec == "gzip":
+        return zlib.decompressobj(31)
+    return load_zstandard().ZstdDecompressor().decompressobj()
+
+
+def iter_segment_blocks(file_path: Path, codec: str):
+    """逐帧解压分段文件，末尾未写完整的帧只输出已能解出的部分。"""
+    decoder = build_segment_decoder(codec)
+    with file_path.open("rb") as f:
+        while True:
+            data = f.read(READ_CHUNK_BYTES)
+            if not data:
+                return
+            while data:
+                yield decoder.decompress(data)
+                if not decoder.eof:
+                    break
+                data = decoder.unused_data
+                decoder = build_segment_decoder(codec)
+
+
+def iter_segment_lines(file_path: Path):
+    """逐行读取分段文件，兼容压缩分段，丢弃崩溃时残留的半行。"""
+    codec = segment_codec_from_path(file_path)
+    if codec == "none":
+        with file_path.open("r", encoding="utf-8") as f:
+            yield from f
+        return
+    pending = b""
+    for block in iter_segment_blocks(file_path, codec):
+        pending += block
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8") + "\n"
@@ -0,0 +1,108 @@
+import zlib
+
+
+CHECKSUM_LEVELS = 25  # OKX与Bitget校验和参与档位数，档位
+CHECKSUM_EXCHANGES = {"okx", "bitget"}  # 推送盘口校验和的交易所集合，个数
+RESYNC_EXCHANGES = {"bybit", "okx", "bitget"}  # 支持同连接重订阅补快照的交易所集合，个数
+SEQUENCE_EXCHANGES = {"bybit", "okx", "bitget"}  # 推送增量需检查序号衔接的交易所集合，Binance订阅的depth20部分深度流每条均为完整快照不在其中，个数
+
+
+def build_sequence_state() -> dict:
+    """构造单个交易对的序号连续性状态。"""
+    return {"last_id": None, "resyncing": False}
+
+
+def reset_sequence_state(state: dict) -> None:
+    """在收到完整快照后重置序号状态并结束重同步。"""
+    state["last_id"] = None
+    state["resyncing"] = False
+
+
+def message_items(exchange: str, message: dict) -> list:
+    """返回消息中参与序号校验的数据项。"""
+    if exchange == "bybit":
+        return [message.get("data", {})]
+    if exchange == "binance":
+        return [message]
+    return message.get("data", [])
+
+
+def is_snapshot_message(exchange: str, message: dict) -> bool:
+    """判断消息是否为可整体替换盘口的完整快照。"""
+    if exchange == "bybit":
+        return message.get("type") == "snapshot"
+    if exchange == "binance":
+        return True
+    return message.get("action") == "snapshot"
+
+
+def item_sequence(exchange: str, item: dict) -> tuple[int | None, int | None]:
+    """返回数据项的当前序号与期望衔接的上一序号。"""
+    if exchange == "okx":
+        seq_id = int(item.get("seqId", "0") or 0)
+        prev_seq_id = int(item.get("prevSeqId", "-1") or -1)
+        return (seq_id or None), (prev_seq_id if prev_seq_id >= 0 else None)
+    if exchange == "bitget":
+        return int(item.get("seq", "0") or 0) or None, None
+    return int(item.get("u", "0") or 0) or None, None
+
+
+def message_sequence_id(exchange: str, message: dict) -> int | None:
+    """返回消息最后一个数据项的序号，无序号时返回空。"""
+    items = message_items(exchange, message)
+    if not items:
+        return None
+    return item_sequence(exchange, items[-1])[0]
+
+
+def find_sequence_gap(exchange: str, state: dict, message: dict) -> str | None:
+    """检查消息与上一条的序号衔接，返回缺口原因，连续时返回空。"""
+    snapshot = is_snapshot_message(exchange, message)
+    for item in message_items(exchange, message):
+        current_id, prev_id = item_sequence(exchange, item)
+        if current_id is None:
+            continue
+        last_id = state["last_id"]
+        if snapshot or last_id is None:
+            state["last_id"] = current_id
+            continue
+        if exchange == "okx" and prev_id is not None and prev_id != last_id:
+            return f"序号不连续 prevSeqId={prev_id} 上一条={last_id}"
+        if exchange == "bybit" and current_id != last_id + 1:
+            return f"序号不连续 u={current_id} 上一条={last_id}"
+        if exchange == "bitget" and current_id < last_id:
+            return f"序号回退 {current_id} < {last_id}"
+        state["last_id"] = current_id
+    return None
+
+
+def build_checksum_text(bid_levels: list, ask_levels: list) -> str:
+    """按交易所规则交错拼接前25档买卖原始价格与数量。"""
+    parts = []
+    for index in range(max(len(bid_levels), len(ask_levels))):
+        if index < len(bid_levels):
+            parts.extend(bid_levels[index])
+        if index < len(ask_levels):
+            parts.extend(ask_levels[index])
+    return ":".join(parts)
+
+
+def compute_book_checksum(bid_levels: list, ask_levels: list) -> int:
+    """计算盘口前25档的有符号crc32校验和。"""
+    value = zlib.crc32(build_checksum_text(bid_levels, ask_levels).encode("utf-8"))
+    return value - (1 << 32) if value >= (1 << 31) else value
+
+
+def find_checksum_mismatch(exchange: str, orderbook, message: dict) -> str | None:
+    """用盘口前25档原始文本校验消息附带的校验和，不一致时返回原因。"""
+    if exchange not in CHECKSUM_EXCHANGES:
+        return None
+    items = message.get("data", [])
+    if not items or "checksum" not in items[-1]:
+        return None
+    expected = int(items[-1]["checksum"])
+    bid_levels, ask_levels = orderbook.raw_top_levels(CHECKSUM_LEVELS)
+    actual = compute_book_checksum(bid_levels, ask_levels)
+    if actual != expected:
+        return f"校验和不一致 {actual} != {expected}"
+    return None
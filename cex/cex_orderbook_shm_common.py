@@ -0,0 +1,141 @@
+from pathlib import Path
+import mmap
+import os
+import struct
+import threading
+import time
+
+
+BOOK_MAGIC = b"DLHB"  # 共享内存盘口槽位文件标识，字节
+BOOK_VERSION = 1  # 共享内存盘口槽位布局版本，版本
+STATIC_HEADER = struct.Struct("<4sII")  # 槽位固定头：标识、版本、档位容量，结构
+SEQ_FIELD = struct.Struct("<Q")  # 顺序锁计数，奇数表示写入中，结构
+BOOK_HEADER = struct.Struct("<qqqII")  # 盘口头：交易所时间、采集时间、更新序号、买档数、卖档数，结构
+SEQ_OFFSET = 16  # 顺序锁计数偏移，字节
+BOOK_HEADER_OFFSET = SEQ_OFFSET + SEQ_FIELD.size  # 盘口头偏移，字节
+LEVELS_OFFSET = 64  # 档位数组偏移，字节
+READ_RETRY_LIMIT = 1000  # 读取遇到写入中时的最大重试次数，次
+NONE_UPDATE_ID = -1  # 无更新序号时写入的占位值，数值
+SLOT_LOCK = threading.Lock()  # 进程内槽位创建锁，锁
+SLOTS = {}  # 进程内已打开的写入槽位映射，映射
+
+
+def slot_path(shm_dir: Path, exchange: str, market: str, symbol: str) -> Path:
+    """返回单个交易对槽位文件路径。"""
+    return Path(shm_dir) / f"{exchange}_{market}_{symbol}.book"
+
+
+def slot_size(depth: int) -> int:
+    """返回指定档位容量的槽位字节数。"""
+    return LEVELS_OFFSET + depth * 4 * 8
+
+
+def open_book_slot(shm_dir: Path, exchange: str, market: str, symbol: str, depth: int) -> dict:
+    """打开或创建交易对的写入槽位，同一进程内主备共用一个槽位。"""
+    path = slot_path(shm_dir, exchange, market, symbol)
+    with SLOT_LOCK:
+        slot = SLOTS.get(path)
+        if slot is not None:
+            return slot
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = slot_size(depth)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            buffer = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        STATIC_HEADER.pack_into(buffer, 0, BOOK_MAGIC, BOOK_VERSION, depth)
+        sequence = SEQ_FIELD.unpack_from(buffer, SEQ_OFFSET)[0]
+        if sequence % 2:
+            SEQ_FIELD.pack_into(buffer, SEQ_OFFSET, sequence + 1)
+        slot = {"buffer": buffer, "depth": depth, "lock": threading.Lock()}
+        SLOTS[path] = slot
+        return slot
+
+
+def publish_book(slot: dict, orderbook, ts_ms: int, collect_ts: int, update_id: int | None) -> None:
+    """按顺序锁协议将盘口前N档写入槽位，读者遇到写入中或计数变化时重读。"""
+    depth = slot["depth"]
+    orderbook.refresh_view()
+    bid_prices = orderbook.bid_prices[:depth]
+    ask_prices = orderbook.ask_prices[:depth]
+    bid_values = orderbook.side_values(orderbook.bids, bid_prices)
+    ask_values = orderbook.side_values(orderbook.asks, ask_prices)
+    buffer = slot["buffer"]
+    with slot["lock"]:
+        sequence = SEQ_FIELD.unpack_from(buffer, SEQ_OFFSET)[0]
+        SEQ_FIELD.pack_into(buffer, SEQ_OFFSET, sequence + 1)
+        BOOK_HEADER.pack_into(
+            buffer, BOOK_HEADER_OFFSET, ts_ms, collect_ts, NONE_UPDATE_ID if update_id is None else update_id, len(bid_prices), len(ask_prices)
+        )
+        struct.pack_into(f"<{len(bid_values)}d", buffer, LEVELS_OFFSET, *bid_values)
+        struct.pack_into(f"<{len(ask_values)}d", buffer, LEVELS_OFFSET + depth * 2 * 8, *ask_values)
+        SEQ_FIELD.pack_into(buffer, SEQ_OFFSET, sequence + 2)
+
+
+def close_book_slots() -> None:
+    """关闭进程内全部写入槽位，槽位文件保留供读者继续读取最后状态。"""
+    with SLOT_LOCK:
+        for slot in SLOTS.values():
+            slot["buffer"].close()
+        SLOTS.clear()
+
+
+def list_book_slots(shm_dir: Path) -> list[tuple[str, str, str]]:
+    """列出目录下已发布的交易对，返回交易所、市场、交易对。"""
+    results = []
+    for path in sorted(Path(shm_dir).glob("*.book")):
+        exchange, market, symbol = path.stem.split("_", 2)
+        results.append((exchange, market, symbol))
+    return results
+
+
+class BookReader:
+    """只读映射单个交易对槽位，按顺序锁协议读取最新盘口。"""
+
+    def __init__(self, shm_dir: Path, exchange: str, market: str, symbol: str):
+        """打开交易对槽位文件并校验布局。"""
+        self.path = slot_path(shm_dir, exchange, market, symbol)
+        with self.path.open("rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, depth = STATIC_HEADER.unpack_from(self.buffer, 0)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            self.buffer.close()
+            raise ValueError(f"不是有效的盘口槽位文件: {self.path}")
+        self.depth = depth
+        self.levels = struct.Struct(f"<{depth * 4}d")
+
+    def sequence(self) -> int:
+        """返回当前顺序锁计数，可用于判断盘口是否有更新。"""
+        return SEQ_FIELD.unpack_from(self.buffer, SEQ_OFFSET)[0]
+
+    def read(self) -> dict | None:
+        """读取一致的最新盘口，尚未发布时返回空。"""
+        buffer = self.buffer
+        for _ in range(READ_RETRY_LIMIT):
+            start = SEQ_FIELD.unpack_from(buffer, SEQ_OFFSET)[0]
+            if start % 2:
+                time.sleep(0)
+                continue
+            ts_ms, collect_ts, update_id, bid_count, ask_count = BOOK_HEADER.unpack_from(buffer, BOOK_HEADER_OFFSET)
+            values = self.levels.unpack_from(buffer, LEVELS_OFFSET)
+            if SEQ_FIELD.unpack_from(buffer, SEQ_OFFSET)[0] != start:
+                continue
+            if start == 0:
+                return None
+            ask_start = self.depth * 2
+            return {
+                "seq": start // 2,
+                "ts": ts_ms,
+                "collect_ts": collect_ts,
+                "update_id": None if update_id == NONE_UPDATE_ID else update_id,
+                "bids": list(zip(values[0 : bid_count * 2 : 2], values[1 : bid_count * 2 : 2])),
+                "asks": list(zip(values[ask_start : ask_start + ask_count * 2 : 2], values[ask_start + 1 : ask_start + ask_count * 2 : 2])),
+            }
+        raise TimeoutError(f"盘口槽位持续写入中: {self.path}")
+
+    def close(self) -> None:
+        """关闭只读映射。"""
+        self.buffer.close()
@@ -1,25 +1,39 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 import csv
+import multiprocessing
+import queue
 import re
 import tarfile
+import threading
 import time
 import zipfile
 from io import BytesIO, TextIOWrapper
+from html import unescape
+from xml.etree import ElementTree
 
+import numpy as np
 import orjson
-from openpyxl import load_workbook
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 import pyarrow.parquet as pq
 from sortedcontainers import SortedDict
 
+import app_config
 from cex import cex_config
 from cex.cex_common import build_part_path
 from cex.cex_common import cleanup_stale_part_file
 from cex.cex_common import download_file_from_storage
 from cex.cex_common import list_storage_file_names
-from cex.cex_common import replace_output_file
+from cex.cex_common import list_storage_file_sizes
 from cex.cex_common import seconds_until_next_utc_midnight
+from cex.cex_common import set_storage_s3_read_enabled
 from cex.cex_common import storage_file_exists
+from cex.cex_common import upload_file_to_s3
+from cex import cex_common
 
 
 BYBIT_DEPTH = 200  # Bybit历史订单簿深度，档位
@@ -35,12 +49,38 @@ OKX_ORDERBOOK_LEVELS = {
 DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")  # 日期格式正则，正则
 BATCH_SIZE = 20000  # Parquet批次大小，条
 SMALL_BATCH_SIZE = 100  # 超大深度Parquet批次大小，条
+LEVEL_BUFFER_INITIAL = 1 << 20  # 单侧档位缓冲区初始容量，不足时倍增，档位
+XLSX_NAMESPACE = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"  # xlsx工作表XML命名空间前缀，字符串
+XLSX_RELATIONSHIP_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"  # xlsx工作表关系标识属性名，字符串
+XLSX_SHARED_STRINGS = "xl/sharedStrings.xml"  # xlsx共享字符串表路径，字符串
+XLSX_READ_CHUNK_BYTES = 1024 * 1024  # xlsx工作表XML分块读取大小，字节
+XLSX_ROW_END = b"</row>"  # xlsx工作表行结束标记，字节
+XLSX_CELL_PATTERN = re.compile(rb'<c r="([A-Z]+)(\d+)"([^>]*?)(?:/>|>(?:<v>([^<]*)</v>|(.*?))</c>)', re.S)  # xlsx单元格列字母、行号、其余属性、数值与其他内容匹配规则，正则
+XLSX_TYPE_PATTERN = re.compile(rb'\bt="(\w+)"')  # xlsx单元格类型匹配规则，正则
+XLSX_VALUE_PATTERN = re.compile(rb"<v\b[^>]*>([^<]*)</v>")  # xlsx单元格值匹配规则，正则
+XLSX_TEXT_PATTERN = re.compile(rb"<t\b[^>]*>([^<]*)</t>")  # xlsx内联字符串文本匹配规则，正则
+BINANCE_BBO_FLOAT_COLUMNS = ("best_bid_price", "best_bid_qty", "best_ask_price", "best_ask_qty")  # Binance BBO价格与数量列，个数
+BINANCE_BBO_INT_COLUMNS = ("update_id", "ts", "cts")  # Binance BBO按整数解析的列，缺失时输出为空，个数
+CSV_BLOCK_BYTES = 4 * 1024 * 1024  # Arrow CSV流式读取块大小，字节
+INT_TEXT_PATTERN = r"^-?[0-9]+$"  # 可按整数解析的文本规则，正则
+SCALAR_FIELDS = ("symbol", "update_type", "ts", "cts", "update_id", "seq", "best_bid", "best_ask", "bid_depth", "ask_depth")  # 快照标量字段列表，个数
 QUIET = False  # 静默模式开关，开关
 STATUS_HOOK = None  # 状态回调函数，函数
 LOG_HOOK = None  # 日志回调函数，函数
 DATASET_QUIET = {}  # 分数据集静默模式映射，映射
 DATASET_STATUS_HOOK = {}  # 分数据集状态回调映射，映射
 DATASET_LOG_HOOK = {}  # 分数据集日志回调映射，映射
+UPLOAD_HOOK = None  # 快照文件上传回调函数，为空时直接提交上传队列，函数
+WORKER_COUNT = app_config.SNAPSHOT_WORKERS  # 历史快照并行进程数，1为在当前进程内顺序处理，个
+MEMORY_LIMIT_BYTES = app_config.SNAPSHOT_MEMORY_LIMIT_BYTES  # 并行快照任务预估内存总上限，字节
+WORKER_BASE_BYTES = 256 * 1024 * 1024  # 单个快照进程的基础内存与全量盘口预估，字节
+LEVEL_MEMORY_BYTES = 16 * 2  # 单个档位在批次缓冲与Parquet编码中的内存预估，字节
+ARCHIVE_MEMORY_FACTOR = 4  # 归档文件大小到解压读取内存的折算倍数，倍
+EVENT_POLL_SECONDS = 0.5  # 子进程事件队列轮询间隔，秒
+PROCESS_CONTEXT = multiprocessing.get_context("spawn")  # 快照子进程启动上下文，上下文
+CHECKPOINT_SECONDS = app_config.SNAPSHOT_CHECKPOINT_SECONDS  # 单日快照转换检查点间隔，0为关闭，秒
+CHECKPOINT_EXCHANGES = {"bybit", "okx"}  # 支持检查点续跑的交易所（逐行JSON归档），集合
+CHECKPOINT_VERSION = 1  # 检查点文件格式版本，版本
 
 
 def configure_dataset_runtime(output_dataset_id: str, quiet: bool, status_hook, log_hook) -> None:
@@ -62,11 +102,23 @@ def log(output_dataset_id: str, message: str) -> None:
 
 def status_update(output_dataset_id: str, exchange: str, symbol: str, value) -> None:
     """更新指定数据集的状态信息。"""
+    market = "future" if output_dataset_id == "D10011" else "spot"
+    emit_status(output_dataset_id, cex_config.get_status_key(exchange, market, symbol), value)
+
+
+def emit_status(output_dataset_id: str, key: str, value) -> None:
+    """按状态键回调指定数据集的状态值。"""
     hook = DATASET_STATUS_HOOK.get(output_dataset_id, STATUS_HOOK)
-    if not hook:
+    if hook:
+        hook(key, value)
+
+
+def submit_upload(file_path: Path) -> None:
+    """提交已完成快照文件的上传。"""
+    if UPLOAD_HOOK:
+        UPLOAD_HOOK(file_path)
         return
-    market = "future" if output_dataset_id == "D10011" else "spot"
-    hook(cex_config.get_status_key(exchange, market, symbol), value)
+    upload_file_to_s3(file_path)
 
 
 def list_input_symbols(base_dir: Path) -> list[str]:
@@ -127,11 +179,29 @@ def build_output_path(input_dataset_id: str, exchange: str, base_dir: Path, symb
 
 def iter_zip_messages(file_path: Path):
     """遍历Zip文件中的原始订单簿消息。"""
+    for msg, _position in iter_zip_message_positions(file_path):
+        yield msg
+
+
+def iter_member_lines(file_obj, member_index: int, start: tuple[int, int]):
+    """逐行解析归档成员中的消息并附带读取位置，位于续读成员时先跳到记录的字节偏移。"""
+    offset = 0
+    if member_index == start[0] and start[1]:
+        file_obj.seek(start[1])
+        offset = start[1]
+    for line in file_obj:
+        offset += len(line)
+        yield orjson.loads(line), (member_index, offset)
+
+
+def iter_zip_message_positions(file_path: Path, start: tuple[int, int] = (0, 0)):
+    """遍历Zip文件中的原始订单簿消息，附带读取位置（成员序号、成员内字节偏移），可从指定位置续读。"""
     with zipfile.ZipFile(file_path, "r") as zip_file:
-        for name in zip_file.namelist():
+        for member_index, name in enumerate(zip_file.namelist()):
+            if member_index < start[0]:
+                continue
             with zip_file.open(name) as file_obj:
-                for line in file_obj:
-                    yield orjson.loads(line)
+                yield from iter_member_lines(file_obj, member_index, start)
 
 
 def iter_binance_messages(file_path: Path, symbol: str):
@@ -145,31 +215,193 @@ def iter_binance_messages(file_path: Path, symbol: str):
                 yield row
 
 
+def xlsx_column_index(reference: str) -> int:
+    """将单元格引用中的列字母转换为从0开始的列序号。"""
+    index = 0
+    for char in reference:
+        if char.isdigit():
+            break
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+def read_xlsx_shared_strings(workbook: zipfile.ZipFile) -> list[str]:
+    """读取xlsx共享字符串表。"""
+    if XLSX_SHARED_STRINGS not in workbook.namelist():
+        return []
+    strings = []
+    item_tag = f"{XLSX_NAMESPACE}si"
+    text_tag = f"{XLSX_NAMESPACE}t"
+    phonetic_tag = f"{XLSX_NAMESPACE}rPh"
+    with workbook.open(XLSX_SHARED_STRINGS) as file_obj:
+        for _event, element in ElementTree.iterparse(file_obj):
+            if element.tag != item_tag:
+                continue
+            for phonetic in element.findall(phonetic_tag):
+                element.remove(phonetic)
+            strings.append("".join(node.text or "" for node in element.iter(text_tag)))
+            element.clear()
+    return strings
+
+
+def resolve_xlsx_sheet_path(workbook: zipfile.ZipFile) -> str:
+    """按工作簿激活页解析工作表XML在包内的路径。"""
+    root = ElementTree.fromstring(workbook.read("xl/workbook.xml"))
+    view = root.find(f"{XLSX_NAMESPACE}bookViews/{XLSX_NAMESPACE}workbookView")
+    active_index = int(view.get("activeTab", 0)) if view is not None else 0
+    sheets = root.findall(f"{XLSX_NAMESPACE}sheets/{XLSX_NAMESPACE}sheet")
+    relationship_id = sheets[min(active_index, len(sheets) - 1)].get(XLSX_RELATIONSHIP_ID)
+    relationships = ElementTree.fromstring(workbook.read("xl/_rels/workbook.xml.rels"))
+    for relationship in relationships:
+        if relationship.get("Id") == relationship_id:
+            target = relationship.get("Target")
+            return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    raise ValueError(f"xlsx缺少工作表关系: {relationship_id}")
+
+
+def parse_xlsx_number(text: bytes) -> int | float:
+    """按openpyxl规则将数值文本转换为整数或浮点数。"""
+    if b"." in text or b"E" in text or b"e" in text:
+        return float(text)
+    return int(text)
+
+
+def parse_xlsx_cell(attributes: bytes, value: bytes, inner: bytes, shared_strings: list[str]):
+    """按单元格类型将原始XML片段转换为Python值。"""
+    type_match = XLSX_TYPE_PATTERN.search(attributes)
+    cell_type = type_match.group(1) if type_match else b"n"
+    if cell_type == b"inlineStr":
+        return unescape("".join(text.decode("utf-8") for text in XLSX_TEXT_PATTERN.findall(inner)))
+    if not value:
+        value_match = XLSX_VALUE_PATTERN.search(inner)
+        if value_match is None:
+            return None
+        value = value_match.group(1)
+    if cell_type == b"n":
+        return parse_xlsx_number(value)
+    if cell_type == b"s":
+        return shared_strings[int(value)]
+    if cell_type == b"b":
+        return value == b"1"
+    return unescape(value.decode("utf-8"))
+
+
+def is_xlsx_numeric_column(attributes: tuple) -> bool:
+    """判断整列单元格是否均为数值类型。"""
+    return all(b't="' not in item or b't="n"' in item for item in set(attributes))
+
+
+def convert_xlsx_numbers(texts: tuple) -> np.ndarray:
+    """将整列数值文本转换为numpy数组，全部为整数文本时为int64，否则为float64。"""
+    raw = np.array(texts, dtype=np.bytes_)
+    try:
+        return raw.astype(np.int64)
+    except (ValueError, OverflowError):
+        return raw.astype(np.float64)
+
+
+def build_xlsx_columns_by_cell(cells: list[tuple], width: int, shared_strings: list[str]) -> list[list]:
+    """逐格解析单元格并按行号与列位置排列为列，表头以外的列忽略。"""
+    rows = {}
+    for letters, row_number, attributes, value, inner in cells:
+        index = xlsx_column_index(letters.decode("ascii"))
+        if index >= width:
+            continue
+        row = rows.get(row_number)
+        if row is None:
+            row = rows[row_number] = [None] * width
+        row[index] = parse_xlsx_cell(attributes, value, inner, shared_strings)
+    if not rows:
+        return [[] for _ in range(width)]
+    return [list(column) for column in zip(*rows.values())]
+
+
+def build_xlsx_columns(cells: list[tuple], header_letters: tuple, width: int, shared_strings: list[str]) -> list:
+    """将一块单元格转换为列，各行列序与表头一致时按列步长切片并整列转换数值，否则逐格解析。"""
+    count = len(header_letters)
+    if count != width or len(cells) % count:
+        return build_xlsx_columns_by_cell(cells, width, shared_strings)
+    letters, _row_numbers, attributes, values, inners = zip(*cells)
+    for index, expected in enumerate(header_letters):
+        column_letters = letters[index::count]
+        if column_letters.count(expected) != len(column_letters):
+            return build_xlsx_columns_by_cell(cells, width, shared_strings)
+    columns = []
+    for index in range(count):
+        column_attributes = attributes[index::count]
+        column_values = values[index::count]
+        if is_xlsx_numeric_column(column_attributes) and b"" not in column_values:
+            columns.append(convert_xlsx_numbers(column_values))
+            continue
+        column_inners = inners[index::count]
+        columns.append([parse_xlsx_cell(*cell, shared_strings) for cell in zip(column_attributes, column_values, column_inners)])
+    return columns
+
+
+def iter_xlsx_column_blocks(workbook: zipfile.ZipFile):
+    """分块扫描xlsx激活工作表XML，首行作为表头，按块输出表头与各列值，数值列整列转换为numpy数组，不处理日期样式。"""
+    shared_strings = read_xlsx_shared_strings(workbook)
+    header = None
+    header_letters = ()
+    pending = b""
+    with workbook.open(resolve_xlsx_sheet_path(workbook)) as file_obj:
+        while True:
+            chunk = file_obj.read(XLSX_READ_CHUNK_BYTES)
+            data = pending + chunk
+            end = len(data)
+            if chunk:
+                row_end = data.rfind(XLSX_ROW_END)
+                if row_end < 0:
+                    pending = data
+                    continue
+                end = row_end + len(XLSX_ROW_END)
+            pending = data[end:]
+            cells = XLSX_CELL_PATTERN.findall(data, 0, end)
+            if data.count(b"<c ", 0, end) + data.count(b"<c>", 0, end) != len(cells):
+                raise ValueError("xlsx单元格缺少前置的r引用属性，无法解析")
+            if header is None and cells:
+                header_row = cells[0][1]
+                header_cells = [cell for cell in cells if cell[1] == header_row]
+                cells = cells[len(header_cells) :]
+                header = ["None"] * (xlsx_column_index(header_cells[-1][0].decode("ascii")) + 1)
+                for letters, _row_number, attributes, value, inner in header_cells:
+                    header[xlsx_column_index(letters.decode("ascii"))] = str(parse_xlsx_cell(attributes, value, inner, shared_strings))
+                header_letters = tuple(cell[0] for cell in header_cells)
+            if cells:
+                yield header, build_xlsx_columns(cells, header_letters, len(header), shared_strings)
+            if not chunk:
+                return
+
+
 def iter_bitget_messages(file_path: Path, symbol: str):
-    """遍历Bitget原始BBO消息。"""
+    """遍历Bitget原始BBO消息，xlsx工作表按XML分块扫描并整列转换类型，不经openpyxl逐格构建。"""
     with zipfile.ZipFile(file_path, "r") as zip_file:
         name = zip_file.namelist()[0]
-        workbook = load_workbook(BytesIO(zip_file.read(name)), read_only=True, data_only=True)
-        sheet = workbook.active
-        rows = sheet.iter_rows(values_only=True)
-        header = [str(item) for item in next(rows)]
-        for values in rows:
-            row = {header[index]: values[index] for index in range(len(header))}
-            row["symbol"] = symbol
-            yield row
+        with zipfile.ZipFile(BytesIO(zip_file.read(name)), "r") as workbook:
+            for header, columns in iter_xlsx_column_blocks(workbook):
+                values = [column.tolist() if isinstance(column, np.ndarray) else column for column in columns]
+                for row_values in zip(*values):
+                    row = dict(zip(header, row_values))
+                    row["symbol"] = symbol
+                    yield row
 
 
 def iter_tar_messages(file_path: Path):
     """遍历Tar文件中的原始订单簿消息。"""
+    for msg, _position in iter_tar_message_positions(file_path):
+        yield msg
+
+
+def iter_tar_message_positions(file_path: Path, start: tuple[int, int] = (0, 0)):
+    """遍历Tar文件中的原始订单簿消息，附带读取位置（成员序号、成员内字节偏移），可从指定位置续读。"""
     with tarfile.open(file_path, "r:gz") as tar_file:
-        for member in tar_file.getmembers():
-            if not member.isfile():
+        for member_index, member in enumerate(tar_file.getmembers()):
+            if member_index < start[0] or not member.isfile():
                 continue
             file_obj = tar_file.extractfile(member)
             if not file_obj:
                 continue
-            for line in file_obj:
-                yield orjson.loads(line)
+            yield from iter_member_lines(file_obj, member_index, start)
 
 
 def iter_messages(exchange: str, file_path: Path, symbol: str):
@@ -189,6 +421,14 @@ def iter_messages(exchange: str, file_path: Path, symbol: str):
     yield from iter_tar_messages(file_path)
 
 
+def iter_message_positions(exchange: str, file_path: Path, start: tuple[int, int]):
+    """遍历支持检查点续读的归档消息并附带读取位置。"""
+    if exchange == "bybit" or file_path.name.endswith(".zip"):
+        yield from iter_zip_message_positions(file_path, start)
+        return
+    yield from iter_tar_message_positions(file_path, start)
+
+
 def trim_levels(levels: list) -> list[list[str]]:
     """裁剪盘口层级为价格和数量。"""
     return [[str(level[0]), str(level[1])] for level in levels if len(level) >= 2]
@@ -281,35 +521,6 @@ def parse_int_or_none(value) -> int | None:
     return int(text) if text.isdigit() else None
 
 
-def build_snapshot(input_dataset_id: str, exchange: str, orderbook: dict, msg: dict, msg_type: str, data: dict) -> dict:
-    """构造Parquet写入快照。"""
-    depth = output_depth_for_dataset(input_dataset_id, exchange)
-    bids = orderbook["bids"]
-    asks = orderbook["asks"]
-    bid_items = list(reversed(bids.items()))[:depth]
-    ask_items = list(asks.items())[:depth]
-    best_bid = bid_items[0][0] if bid_items else None
-    best_ask = ask_items[0][0] if ask_items else None
-    bid_list = [{"price": price, "qty": qty} for price, qty in bid_items]
-    ask_list = [{"price": price, "qty": qty} for price, qty in ask_items]
-    ts_value = normalize_ts_ms(msg.get("ts"))
-    cts_value = normalize_ts_ms(msg.get("cts"))
-    return {
-        "symbol": data.get("s", msg.get("symbol")),
-        "update_type": msg_type,
-        "ts": ts_value,
-        "cts": cts_value if cts_value is not None else ts_value,
-        "update_id": parse_int_or_none(data.get("u")),
-        "seq": parse_int_or_none(data.get("seq")),
-        "best_bid": best_bid,
-        "best_ask": best_ask,
-        "bid_depth": len(bid_items),
-        "ask_depth": len(ask_items),
-        "bids": bid_list,
-        "asks": ask_list,
-    }
-
-
 def build_schema() -> pa.Schema:
     """构造输出Parquet表结构。"""
     side_type = pa.list_(pa.struct([("price", pa.float64()), ("qty", pa.float64())]))
@@ -331,9 +542,97 @@ def build_schema() -> pa.Schema:
     )
 
 
-def write_parquet(records: list, writer: pq.ParquetWriter, schema: pa.Schema) -> None:
-    """写入单个Parquet批次。"""
-    writer.write_table(pa.Table.from_pylist(records, schema=schema))
+def build_side_buffer(rows: int, depth: int) -> dict:
+    """预分配单侧档位的价格、数量与偏移数组。"""
+    level_capacity = max(1, min(rows * depth, LEVEL_BUFFER_INITIAL))
+    offsets = np.empty(rows + 1, dtype=np.int32)
+    offsets[0] = 0
+    return {
+        "prices": np.empty(level_capacity, dtype=np.float64),
+        "sizes": np.empty(level_capacity, dtype=np.float64),
+        "offsets": offsets,
+        "count": 0,
+    }
+
+
+def append_side_levels(side: dict, row: int, prices: list, book: SortedDict) -> None:
+    """将单条快照的单侧档位追加到缓冲区，数量直接从盘口映射取出，容量不足时按倍数扩容。"""
+    count = len(prices)
+    start = side["count"]
+    end = start + count
+    if end > len(side["prices"]):
+        capacity = max(end, len(side["prices"]) * 2)
+        for key in ("prices", "sizes"):
+            grown = np.empty(capacity, dtype=np.float64)
+            grown[:start] = side[key][:start]
+            side[key] = grown
+    side["prices"][start:end] = np.fromiter(prices, np.float64, count)
+    side["sizes"][start:end] = np.fromiter(map(book.__getitem__, prices), np.float64, count)
+    side["offsets"][row + 1] = end
+    side["count"] = end
+
+
+def build_side_column(side: dict, rows: int) -> pa.Array:
+    """由偏移与子数组直接组装list<struct<price,qty>>列，不经过逐档字典。"""
+    count = side["count"]
+    values = pa.StructArray.from_arrays([pa.array(side["prices"][:count]), pa.array(side["sizes"][:count])], names=["price", "qty"])
+    return pa.ListArray.from_arrays(pa.array(side["offsets"][: rows + 1]), values)
+
+
+class SnapshotBatchBuilder:
+    """按列累积一批快照：标量字段存列表，前N档写入预分配的numpy数组并记录偏移，成批转为Arrow表。"""
+
+    def __init__(self, schema: pa.Schema, depth: int, capacity: int):
+        """按输出深度与批次行数预分配缓冲区。"""
+        self.schema = schema
+        self.depth = depth
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self) -> None:
+        """开始新批次，已交给Arrow的缓冲区不再复用。"""
+        self.rows = 0
+        self.scalars = {name: [] for name in SCALAR_FIELDS}
+        self.bids = build_side_buffer(self.capacity, self.depth)
+        self.asks = build_side_buffer(self.capacity, self.depth)
+
+    def append(self, orderbook: dict, msg: dict, msg_type: str, data: dict) -> None:
+        """按盘口当前状态追加一条快照。"""
+        bids = orderbook["bids"]
+        asks = orderbook["asks"]
+        bid_prices = bids.keys()[-self.depth :]
+        bid_prices.reverse()
+        ask_prices = asks.keys()[: self.depth]
+        append_side_levels(self.bids, self.rows, bid_prices, bids)
+        append_side_levels(self.asks, self.rows, ask_prices, asks)
+        ts_value = normalize_ts_ms(msg.get("ts"))
+        cts_value = normalize_ts_ms(msg.get("cts"))
+        scalars = self.scalars
+        scalars["symbol"].append(data.get("s", msg.get("symbol")))
+        scalars["update_type"].append(msg_type)
+        scalars["ts"].append(ts_value)
+        scalars["cts"].append(cts_value if cts_value is not None else ts_value)
+        scalars["update_id"].append(parse_int_or_none(data.get("u")))
+        scalars["seq"].append(parse_int_or_none(data.get("seq")))
+        scalars["best_bid"].append(bid_prices[0] if bid_prices else None)
+        scalars["best_ask"].append(ask_prices[0] if ask_prices else None)
+        scalars["bid_depth"].append(len(bid_prices))
+        scalars["ask_depth"].append(len(ask_prices))
+        self.rows += 1
+
+    def take_table(self) -> pa.Table:
+        """输出当前批次的Arrow表并开始新批次。"""
+        arrays = []
+        for field in self.schema:
+            if field.name == "bids":
+                arrays.append(build_side_column(self.bids, self.rows))
+            elif field.name == "asks":
+                arrays.append(build_side_column(self.asks, self.rows))
+            else:
+                arrays.append(pa.array(self.scalars[field.name], field.type))
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+        self.reset()
+        return table
 
 
 def is_valid_archive(file_path: Path) -> bool:
@@ -356,6 +655,265 @@ def is_valid_snapshot_output(file_path: Path) -> bool:
     return pq.ParquetFile(file_path).metadata.num_rows > 0
 
 
+def new_replay_state() -> dict:
+    """构造空盘口的回放状态。"""
+    return {"orderbook": {"bids": SortedDict(), "asks": SortedDict()}, "has_snapshot": False, "total": 0}
+
+
+def replay_messages(exchange: str, messages, state: dict, builder: SnapshotBatchBuilder, batch_size: int, flush_table) -> None:
+    """将带读取位置的消息逐条回放到盘口并累积快照，每满一个批次连同该批最后一条消息的读取位置交给flush_table。"""
+    orderbook = state["orderbook"]
+    for msg, position in messages:
+        normalized = normalize_message(exchange, msg)
+        if normalized is None:
+            continue
+        msg_type, data = normalized
+        if msg_type == "snapshot":
+            state["has_snapshot"] = update_orderbook(orderbook, msg_type, data)
+        elif msg_type == "delta" and state["has_snapshot"]:
+            update_orderbook(orderbook, msg_type, data)
+        else:
+            continue
+        builder.append(orderbook, msg, msg_type, data)
+        state["total"] += 1
+        if builder.rows >= batch_size:
+            flush_table(builder.take_table(), position)
+
+
+def write_replayed_snapshots(
+    writer: pq.ParquetWriter, schema: pa.Schema, input_dataset_id: str, exchange: str, input_path: Path, symbol: str, batch_size: int
+) -> int:
+    """逐条回放归档消息到内存盘口并按批次写出快照，返回快照条数。"""
+    state = new_replay_state()
+    builder = SnapshotBatchBuilder(schema, output_depth_for_dataset(input_dataset_id, exchange), batch_size)
+    messages = ((msg, None) for msg in iter_messages(exchange, input_path, symbol))
+    replay_messages(exchange, messages, state, builder, batch_size, lambda table, _position: writer.write_table(table))
+    if builder.rows:
+        writer.write_table(builder.take_table())
+    return state["total"]
+
+
+def build_checkpoint_path(output_path: Path) -> Path:
+    """构造单日快照检查点文件路径。"""
+    return output_path.with_name(output_path.name + ".ckpt")
+
+
+def build_segment_path(output_path: Path, index: int) -> Path:
+    """构造检查点分段文件路径，每段为已封口的独立Parquet。"""
+    return output_path.with_name(f"{output_path.name}.{index}.part")
+
+
+def clear_snapshot_checkpoint(output_path: Path) -> None:
+    """删除检查点文件与全部分段文件。"""
+    build_checkpoint_path(output_path).unlink(missing_ok=True)
+    for segment_path in output_path.parent.glob(f"{output_path.name}.*.part"):
+        segment_path.unlink()
+
+
+def save_snapshot_checkpoint(output_path: Path, input_path: Path, batch_size: int, depth: int, state: dict, segments: int, position) -> None:
+    """原子写入检查点：已封口分段数、归档读取位置、已写快照数与完整盘口。"""
+    orderbook = state["orderbook"]
+    checkpoint = {
+        "version": CHECKPOINT_VERSION,
+        "input_name": input_path.name,
+        "input_size": input_path.stat().st_size,
+        "batch_size": batch_size,
+        "depth": depth,
+        "segments": segments,
+        "position": list(position),
+        "total": state["total"],
+        "has_snapshot": state["has_snapshot"],
+        "bids": list(orderbook["bids"].items()),
+        "asks": list(orderbook["asks"].items()),
+    }
+    checkpoint_path = build_checkpoint_path(output_path)
+    tmp_path = build_part_path(checkpoint_path)
+    tmp_path.write_bytes(orjson.dumps(checkpoint))
+    tmp_path.replace(checkpoint_path)
+
+
+def load_snapshot_checkpoint(output_path: Path, input_path: Path, batch_size: int, depth: int) -> dict | None:
+    """读取与当前归档和批次参数一致且分段齐全的检查点，否则返回空。"""
+    checkpoint_path = build_checkpoint_path(output_path)
+    if not checkpoint_path.exists():
+        return None
+    try:
+        checkpoint = orjson.loads(checkpoint_path.read_bytes())
+    except orjson.JSONDecodeError:
+        return None
+    expected = {
+        "version": CHECKPOINT_VERSION,
+        "input_name": input_path.name,
+        "input_size": input_path.stat().st_size,
+        "batch_size": batch_size,
+        "depth": depth,
+    }
+    if any(checkpoint.get(key) != value for key, value in expected.items()):
+        return None
+    if not all(build_segment_path(output_path, index).exists() for index in range(checkpoint["segments"])):
+        return None
+    return checkpoint
+
+
+def merge_snapshot_segments(segment_paths: list[Path], output_path: Path, schema: pa.Schema) -> None:
+    """按顺序将分段文件的行组逐个写入输出文件，行组划分不变；只有一段时直接改名。"""
+    if len(segment_paths) == 1:
+        segment_paths[0].replace(output_path)
+        return
+    writer = pq.ParquetWriter(output_path, schema, compression="snappy")
+    for segment_path in segment_paths:
+        segment_file = pq.ParquetFile(segment_path)
+        for index in range(segment_file.metadata.num_row_groups):
+            writer.write_table(segment_file.read_row_group(index))
+    writer.close()
+    for segment_path in segment_paths:
+        segment_path.unlink()
+
+
+def write_checkpointed_snapshots(
+    schema: pa.Schema, input_dataset_id: str, output_dataset_id: str, exchange: str, input_path: Path, output_path: Path, symbol: str, batch_size: int
+) -> int:
+    """回放单日归档并定期落检查点，中断后从最近检查点续跑，返回快照条数。
+
+    从头开始的转换同时写入临时输出文件与检查点分段，分段只在中断时用于续跑，完成后直接删除，避免对整日数据解码再编码一遍；
+    从检查点续跑时临时输出文件缺少中断前的行组，完成后由分段合并生成。
+    """
+    depth = output_depth_for_dataset(input_dataset_id, exchange)
+    checkpoint = load_snapshot_checkpoint(output_path, input_path, batch_size, depth)
+    state = new_replay_state()
+    segments = 0
+    position = (0, 0)
+    if checkpoint is None:
+        clear_snapshot_checkpoint(output_path)
+    else:
+        state["orderbook"]["bids"] = SortedDict(map(tuple, checkpoint["bids"]))
+        state["orderbook"]["asks"] = SortedDict(map(tuple, checkpoint["asks"]))
+        state["has_snapshot"] = checkpoint["has_snapshot"]
+        state["total"] = checkpoint["total"]
+        segments = checkpoint["segments"]
+        position = tuple(checkpoint["position"])
+        log(output_dataset_id, f"从检查点续跑: {output_path.name}，已写快照: {state['total']}")
+    builder = SnapshotBatchBuilder(schema, depth, batch_size)
+    output_writer = pq.ParquetWriter(build_part_path(output_path), schema, compression="snappy") if checkpoint is None else None
+    writer = pq.ParquetWriter(build_segment_path(output_path, segments), schema, compression="snappy")
+    last_checkpoint = time.monotonic()
+
+    def flush_table(table: pa.Table, table_position) -> None:
+        nonlocal writer, segments, last_checkpoint
+        writer.write_table(table)
+        if output_writer is not None:
+            output_writer.write_table(table)
+        if time.monotonic() - last_checkpoint < CHECKPOINT_SECONDS:
+            return
+        writer.close()
+        segments += 1
+        save_snapshot_checkpoint(output_path, input_path, batch_size, depth, state, segments, table_position)
+        writer = pq.ParquetWriter(build_segment_path(output_path, segments), schema, compression="snappy")
+        last_checkpoint = time.monotonic()
+
+    replay_messages(exchange, iter_message_positions(exchange, input_path, position), state, builder, batch_size, flush_table)
+    if builder.rows:
+        table = builder.take_table()
+        writer.write_table(table)
+        if output_writer is not None:
+            output_writer.write_table(table)
+    writer.close()
+    if output_writer is not None:
+        output_writer.close()
+    else:
+        merge_snapshot_segments([build_segment_path(output_path, index) for index in range(segments + 1)], build_part_path(output_path), schema)
+    clear_snapshot_checkpoint(output_path)
+    return state["total"]
+
+
+def iter_binance_csv_batches(file_path: Path):
+    """以Arrow CSV流式块读取Binance BBO归档，表头按原始首行解析，价格数量列为float64，整数类列保留文本。"""
+    with zipfile.ZipFile(file_path, "r") as zip_file:
+        name = zip_file.namelist()[0]
+        with zip_file.open(name) as file_obj:
+            header = next(csv.reader([file_obj.readline().decode("utf-8")]), [])
+            if not header or not file_obj.peek(1):
+                return
+            columns = [column for column in BINANCE_BBO_FLOAT_COLUMNS + BINANCE_BBO_INT_COLUMNS if column in header]
+            column_types = {column: pa.float64() if column in BINANCE_BBO_FLOAT_COLUMNS else pa.string() for column in columns}
+            reader = pacsv.open_csv(
+                file_obj,
+                read_options=pacsv.ReadOptions(column_names=header, block_size=CSV_BLOCK_BYTES),
+                convert_options=pacsv.ConvertOptions(column_types=column_types, include_columns=columns),
+            )
+            yield from reader
+
+
+def parse_int_column(column: pa.Array) -> pa.Array:
+    """按parse_int_or_none规则将文本列转换为int64，非整数文本为空。"""
+    valid = pc.match_substring_regex(column, INT_TEXT_PATTERN)
+    return pc.if_else(valid, column, pa.scalar(None, pa.string())).cast(pa.int64())
+
+
+def normalize_ts_column(column: pa.Array) -> pa.Array:
+    """按normalize_ts_ms规则将整列时间戳统一为毫秒。"""
+    return pc.if_else(pc.less(pc.abs(column), 10**11), pc.multiply(column, 1000), column)
+
+
+def build_binance_bbo_table(schema: pa.Schema, symbol: str, batch: pa.RecordBatch) -> pa.Table:
+    """按列将一块Binance BBO行直接转换为快照表，每行买卖各一档，结果与逐行回放一致。"""
+    rows = batch.num_rows
+    names = batch.schema.names
+    for column in BINANCE_BBO_FLOAT_COLUMNS:
+        if column not in names or batch.column(column).null_count:
+            raise ValueError(f"Binance BBO缺少有效的{column}列")
+    int_columns = {
+        column: parse_int_column(batch.column(column)) if column in names else pa.nulls(rows, pa.int64()) for column in BINANCE_BBO_INT_COLUMNS
+    }
+    ts_values = normalize_ts_column(int_columns["ts"])
+    offsets = np.arange(rows + 1, dtype=np.int32)
+    depths = pa.array(np.ones(rows, dtype=np.int32))
+    sides = {}
+    for side, prefix in (("bids", "best_bid"), ("asks", "best_ask")):
+        prices = batch.column(f"{prefix}_price").to_numpy()
+        sizes = batch.column(f"{prefix}_qty").to_numpy()
+        sides[side] = build_side_column({"prices": prices, "sizes": sizes, "offsets": offsets, "count": rows}, rows)
+    arrays = {
+        "symbol": pa.repeat(pa.scalar(symbol, pa.string()), rows),
+        "update_type": pa.repeat(pa.scalar("snapshot", pa.string()), rows),
+        "ts": ts_values,
+        "cts": pc.coalesce(normalize_ts_column(int_columns["cts"]), ts_values),
+        "update_id": int_columns["update_id"],
+        "seq": pa.nulls(rows, pa.int64()),
+        "best_bid": batch.column("best_bid_price"),
+        "best_ask": batch.column("best_ask_price"),
+        "bid_depth": depths,
+        "ask_depth": depths,
+        "bids": sides["bids"],
+        "asks": sides["asks"],
+    }
+    return pa.Table.from_arrays([arrays[field.name] for field in schema], schema=schema)
+
+
+def write_binance_snapshots(writer: pq.ParquetWriter, schema: pa.Schema, input_path: Path, symbol: str, batch_size: int) -> int:
+    """按Arrow CSV流式块列式生成Binance BBO快照，按批次大小切分行组写出，不经逐行盘口回放，返回快照条数。"""
+    pending = []
+    pending_rows = 0
+    total = 0
+    for batch in iter_binance_csv_batches(input_path):
+        table = build_binance_bbo_table(schema, symbol, batch)
+        pending.append(table)
+        pending_rows += table.num_rows
+        total += table.num_rows
+        if pending_rows < batch_size:
+            continue
+        merged = pa.concat_tables(pending)
+        offset = 0
+        while pending_rows - offset >= batch_size:
+            writer.write_table(merged.slice(offset, batch_size))
+            offset += batch_size
+        pending = [merged.slice(offset)]
+        pending_rows -= offset
+    if pending_rows:
+        writer.write_table(pa.concat_tables(pending))
+    return total
+
+
 def process_date(input_dataset_id: str, output_dataset_id: str, exchange: str, input_dir: Path, output_dir: Path, symbol: str, date_str: str) -> None:
     """处理单日订单簿归档。"""
     input_path = build_input_path(input_dataset_id, exchange, input_dir, symbol, date_str)
@@ -368,42 +926,29 @@ def process_date(input_dataset_id: str, output_dataset_id: str, exchange: str, i
     output_path = build_output_path(input_dataset_id, exchange, output_dir, symbol, date_str)
     cleanup_stale_part_file(output_path)
     if storage_file_exists(output_path) and (not output_path.exists() or is_valid_snapshot_output(output_path)):
+        clear_snapshot_checkpoint(output_path)
         return
     tmp_output_path = build_part_path(output_path)
     if tmp_output_path.exists():
         tmp_output_path.unlink()
     output_path.parent.mkdir(parents=True, exist_ok=True)
     schema = build_schema()
-    writer = pq.ParquetWriter(tmp_output_path, schema, compression="snappy")
-    orderbook = {"bids": SortedDict(), "asks": SortedDict()}
-    has_snapshot = False
-    batch = []
     batch_size = batch_size_for_dataset(input_dataset_id, exchange)
-    total = 0
-    for msg in iter_messages(exchange, input_path, symbol):
-        normalized = normalize_message(exchange, msg)
-        if normalized is None:
-            continue
-        msg_type, data = normalized
-        if msg_type == "snapshot":
-            has_snapshot = update_orderbook(orderbook, msg_type, data)
-        elif msg_type == "delta" and has_snapshot:
-            update_orderbook(orderbook, msg_type, data)
+    if CHECKPOINT_SECONDS > 0 and exchange in CHECKPOINT_EXCHANGES:
+        total = write_checkpointed_snapshots(schema, input_dataset_id, output_dataset_id, exchange, input_path, output_path, symbol, batch_size)
+    else:
+        writer = pq.ParquetWriter(tmp_output_path, schema, compression="snappy")
+        if exchange == "binance":
+            total = write_binance_snapshots(writer, schema, input_path, symbol, batch_size)
         else:
-            continue
-        batch.append(build_snapshot(input_dataset_id, exchange, orderbook, msg, msg_type, data))
-        total += 1
-        if len(batch) >= batch_size:
-            write_parquet(batch, writer, schema)
-            batch.clear()
-    if batch:
-        write_parquet(batch, writer, schema)
-    writer.close()
+            total = write_replayed_snapshots(writer, schema, input_dataset_id, exchange, input_path, symbol, batch_size)
+        writer.close()
     if total <= 0:
         tmp_output_path.unlink()
         log(output_dataset_id, f"无有效快照，已跳过: {output_path}")
         return
-    replace_output_file(tmp_output_path, output_path)
+    tmp_output_path.replace(output_path)
+    submit_upload(output_path)
     log(output_dataset_id, f"已写入: {output_path}，记录数: {total}")
 
 
@@ -475,48 +1020,216 @@ def iter_available_dates(input_dataset_id: str, exchange: str, input_dir: Path,
     return sorted(dates)
 
 
-def run_dataset(input_dataset_id: str, output_dataset_id: str) -> None:
-    """运行指定历史订单簿快照任务。"""
-    while True:
-        for exchange in cex_config.get_supported_exchanges(output_dataset_id):
-            if cex_config.apply_pause_if_requested(output_dataset_id, exchange):
-                input_dir = cex_config.get_source_dir(input_dataset_id, exchange)
-                if input_dir:
-                    for symbol in resolve_symbols(input_dataset_id, exchange, input_dir):
-                        status_update(output_dataset_id, exchange, symbol, cex_config.PAUSED_STATUS_TEXT)
-                continue
+def plan_symbol_dates(
+    input_dataset_id: str, output_dataset_id: str, exchange: str, input_dir: Path, output_dir: Path, symbol: str, start_date: str
+) -> tuple[list[str], int] | None:
+    """统计交易对待处理日期与已完成天数并刷新初始状态，无可处理数据时返回空。"""
+    available_dates = iter_available_dates(input_dataset_id, exchange, input_dir, symbol, start_date)
+    if not available_dates:
+        status_update(output_dataset_id, exchange, symbol, (0, "无可处理数据"))
+        return None
+    processed_dates = processed_dates_for_symbol(input_dataset_id, exchange, output_dir, symbol, available_dates)
+    done_count = len(processed_dates)
+    if processed_dates:
+        status_update(output_dataset_id, exchange, symbol, (done_count, f"日 {max(processed_dates)} 准备回补"))
+    else:
+        status_update(output_dataset_id, exchange, symbol, (0, f"准备 {available_dates[0]}"))
+    return [date_str for date_str in available_dates if date_str not in processed_dates], done_count
+
+
+def iter_dataset_symbols(input_dataset_id: str, output_dataset_id: str):
+    """遍历各交易所待处理交易对，处理暂停并输出交易所、输入输出目录、交易对、待处理日期与已完成天数。"""
+    for exchange in cex_config.get_supported_exchanges(output_dataset_id):
+        if cex_config.apply_pause_if_requested(output_dataset_id, exchange):
             input_dir = cex_config.get_source_dir(input_dataset_id, exchange)
-            output_dir = cex_config.get_output_dir(output_dataset_id, exchange)
-            start_date = cex_config.get_min_start_date(input_dataset_id, exchange)
-            if not input_dir or not output_dir or not start_date:
-                continue
-            for symbol in resolve_symbols(input_dataset_id, exchange, input_dir):
-                if cex_config.apply_pause_if_requested(output_dataset_id, exchange):
+            if input_dir:
+                for symbol in resolve_symbols(input_dataset_id, exchange, input_dir):
                     status_update(output_dataset_id, exchange, symbol, cex_config.PAUSED_STATUS_TEXT)
-                    break
-                available_dates = iter_available_dates(input_dataset_id, exchange, input_dir, symbol, start_date)
-                if not available_dates:
-                    status_update(output_dataset_id, exchange, symbol, (0, "无可处理数据"))
-                    continue
-                processed_dates = processed_dates_for_symbol(input_dataset_id, exchange, output_dir, symbol, available_dates)
-                done_count = len(processed_dates)
-                synced_until = cex_config.get_min_start_date(input_dataset_id, exchange)
-                if processed_dates:
-                    synced_until = max(processed_dates)
-                    status_update(output_dataset_id, exchange, symbol, (done_count, f"日 {synced_until} 准备回补"))
-                else:
-                    status_update(output_dataset_id, exchange, symbol, (0, f"准备 {available_dates[0]}"))
-                for date_str in available_dates:
+            continue
+        input_dir = cex_config.get_source_dir(input_dataset_id, exchange)
+        output_dir = cex_config.get_output_dir(output_dataset_id, exchange)
+        start_date = cex_config.get_min_start_date(input_dataset_id, exchange)
+        if not input_dir or not output_dir or not start_date:
+            continue
+        for symbol in resolve_symbols(input_dataset_id, exchange, input_dir):
+            if cex_config.apply_pause_if_requested(output_dataset_id, exchange):
+                status_update(output_dataset_id, exchange, symbol, cex_config.PAUSED_STATUS_TEXT)
+                break
+            plan = plan_symbol_dates(input_dataset_id, output_dataset_id, exchange, input_dir, output_dir, symbol, start_date)
+            if plan is None:
+                continue
+            yield exchange, input_dir, output_dir, symbol, plan[0], plan[1]
+
+
+def run_dataset_sequential(input_dataset_id: str, output_dataset_id: str) -> None:
+    """在当前进程内按交易所、交易对、日期顺序处理一轮。"""
+    for exchange, input_dir, output_dir, symbol, pending_dates, done_count in iter_dataset_symbols(input_dataset_id, output_dataset_id):
+        for date_str in pending_dates:
+            if cex_config.apply_pause_if_requested(output_dataset_id, exchange):
+                status_update(output_dataset_id, exchange, symbol, cex_config.PAUSED_STATUS_TEXT)
+                break
+            status_update(output_dataset_id, exchange, symbol, (done_count, f"日 {date_str} 请求中"))
+            process_date(input_dataset_id, output_dataset_id, exchange, input_dir, output_dir, symbol, date_str)
+            done_count += 1
+            output_name = build_output_path(input_dataset_id, exchange, output_dir, symbol, date_str).name
+            status_update(output_dataset_id, exchange, symbol, (done_count, f"日 {date_str} {output_name}"))
+
+
+def estimate_unit_memory(input_dataset_id: str, exchange: str, archive_bytes: int) -> int:
+    """预估单日快照任务峰值内存：进程基础占用、一个批次的档位缓冲与编码开销、按存储中归档大小折算的解压读取开销。"""
+    depth = output_depth_for_dataset(input_dataset_id, exchange)
+    batch_bytes = batch_size_for_dataset(input_dataset_id, exchange) * depth * 2 * LEVEL_MEMORY_BYTES
+    return WORKER_BASE_BYTES + batch_bytes + archive_bytes * ARCHIVE_MEMORY_FACTOR
+
+
+def build_runtime_config() -> dict:
+    """收集需要同步到快照子进程的运行时配置。"""
+    return {
+        "data_storage_mode": app_config.DATA_STORAGE_MODE,
+        "storage_s3_read_enabled": cex_common.STORAGE_S3_READ_ENABLED,
+        "runtime_target_mode": cex_config.RUNTIME_TARGET_MODE,
+        "runtime_target_scope": dict(cex_config.RUNTIME_TARGET_SCOPE),
+    }
+
+
+def init_snapshot_worker(output_dataset_id: str, runtime_config: dict, event_queue) -> None:
+    """快照子进程初始化：恢复运行时配置，状态、日志与上传经事件队列交回父进程。"""
+    global UPLOAD_HOOK
+    app_config.DATA_STORAGE_MODE = runtime_config["data_storage_mode"]
+    set_storage_s3_read_enabled(runtime_config["storage_s3_read_enabled"])
+    cex_config.set_runtime_target_mode(runtime_config["runtime_target_mode"])
+    scope = runtime_config["runtime_target_scope"]
+    cex_config.set_runtime_target_scope(scope["exchanges"], scope["base_coin"], scope["start_date"], scope["end_date"])
+    configure_dataset_runtime(
+        output_dataset_id,
+        True,
+        lambda key, value: event_queue.put(("status", key, value)),
+        lambda message: event_queue.put(("log", message)),
+    )
+    UPLOAD_HOOK = lambda file_path: event_queue.put(("upload", str(file_path)))  # noqa: E731
+
+
+def pump_worker_events(output_dataset_id: str, event_queue, stop_event: threading.Event) -> None:
+    """在父进程内消费子进程事件并转发到状态、日志与上传，停止后排空剩余事件再退出。"""
+    while True:
+        try:
+            event, *payload = event_queue.get(timeout=EVENT_POLL_SECONDS)
+        except queue.Empty:
+            if stop_event.is_set():
+                return
+            continue
+        if event == "status":
+            emit_status(output_dataset_id, *payload)
+        elif event == "log":
+            log(output_dataset_id, payload[0])
+        elif event == "upload":
+            upload_file_to_s3(Path(payload[0]))
+
+
+def collect_dataset_units(input_dataset_id: str, output_dataset_id: str) -> tuple[deque, dict]:
+    """按交易所、交易对、日期展开本轮待处理任务，返回任务队列与各交易对已完成天数，归档大小按交易对目录一次列出，S3模式下取对象大小。"""
+    units = deque()
+    progress = {}
+    for exchange, input_dir, output_dir, symbol, pending_dates, done_count in iter_dataset_symbols(input_dataset_id, output_dataset_id):
+        progress[(exchange, symbol)] = done_count
+        archive_sizes = list_storage_file_sizes(input_dir / symbol)
+        for date_str in pending_dates:
+            input_path = build_input_path(input_dataset_id, exchange, input_dir, symbol, date_str)
+            units.append(
+                {
+                    "exchange": exchange,
+                    "symbol": symbol,
+                    "date_str": date_str,
+                    "input_dir": input_dir,
+                    "output_dir": output_dir,
+                    "memory_bytes": estimate_unit_memory(input_dataset_id, exchange, archive_sizes.get(input_path.name, 0)),
+                }
+            )
+    return units, progress
+
+
+def drop_paused_units(output_dataset_id: str, units: deque, exchange: str) -> None:
+    """移除已暂停交易所的排队任务并刷新其交易对状态。"""
+    symbols = sorted({unit["symbol"] for unit in units if unit["exchange"] == exchange})
+    kept = [unit for unit in units if unit["exchange"] != exchange]
+    units.clear()
+    units.extend(kept)
+    for symbol in symbols:
+        status_update(output_dataset_id, exchange, symbol, cex_config.PAUSED_STATUS_TEXT)
+
+
+def run_dataset_parallel(input_dataset_id: str, output_dataset_id: str) -> None:
+    """按交易所、交易对、日期拆分为独立任务并在进程池中并行处理一轮，按预估内存限制同时运行的任务，单个任务失败只记录并计数，留待下一轮重试。"""
+    units, progress = collect_dataset_units(input_dataset_id, output_dataset_id)
+    if not units:
+        return
+    event_queue = PROCESS_CONTEXT.Queue()
+    pump_stop = threading.Event()
+    pump_thread = threading.Thread(target=pump_worker_events, args=(output_dataset_id, event_queue, pump_stop), daemon=True)
+    pump_thread.start()
+    running = {}
+    reserved_bytes = 0
+    failed_count = 0
+    broken = False
+    try:
+        with ProcessPoolExecutor(
+            max_workers=WORKER_COUNT,
+            mp_context=PROCESS_CONTEXT,
+            initializer=init_snapshot_worker,
+            initargs=(output_dataset_id, build_runtime_config(), event_queue),
+        ) as executor:
+            while (units and not broken) or running:
+                while units and not broken and len(running) < WORKER_COUNT:
+                    unit = units[0]
+                    exchange = unit["exchange"]
                     if cex_config.apply_pause_if_requested(output_dataset_id, exchange):
-                        status_update(output_dataset_id, exchange, symbol, cex_config.PAUSED_STATUS_TEXT)
+                        drop_paused_units(output_dataset_id, units, exchange)
+                        continue
+                    if running and reserved_bytes + unit["memory_bytes"] > MEMORY_LIMIT_BYTES:
                         break
-                    if date_str in processed_dates:
+                    units.popleft()
+                    reserved_bytes += unit["memory_bytes"]
+                    symbol = unit["symbol"]
+                    status_update(output_dataset_id, exchange, symbol, (progress[(exchange, symbol)], f"日 {unit['date_str']} 请求中"))
+                    future = executor.submit(
+                        process_date, input_dataset_id, output_dataset_id, exchange, unit["input_dir"], unit["output_dir"], symbol, unit["date_str"]
+                    )
+                    running[future] = unit
+                if not running:
+                    continue
+                done, _pending = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    unit = running.pop(future)
+                    reserved_bytes -= unit["memory_bytes"]
+                    exchange = unit["exchange"]
+                    symbol = unit["symbol"]
+                    try:
+                        future.result()
+                    except (RuntimeError, OSError, ValueError, KeyError, MemoryError, zipfile.BadZipFile) as exc:
+                        failed_count += 1
+                        broken = broken or isinstance(exc, BrokenProcessPool)
+                        log(output_dataset_id, f"{exchange} {symbol} 日 {unit['date_str']} 处理失败，下一轮重试: {exc}")
+                        status_update(output_dataset_id, exchange, symbol, (progress[(exchange, symbol)], f"日 {unit['date_str']} 处理失败"))
                         continue
-                    status_update(output_dataset_id, exchange, symbol, (done_count, f"日 {date_str} 请求中"))
-                    process_date(input_dataset_id, output_dataset_id, exchange, input_dir, output_dir, symbol, date_str)
-                    done_count += 1
-                    output_name = build_output_path(input_dataset_id, exchange, output_dir, symbol, date_str).name
-                    status_update(output_dataset_id, exchange, symbol, (done_count, f"日 {date_str} {output_name}"))
+                    progress[(exchange, symbol)] += 1
+                    output_name = build_output_path(input_dataset_id, exchange, unit["output_dir"], symbol, unit["date_str"]).name
+                    status_update(output_dataset_id, exchange, symbol, (progress[(exchange, symbol)], f"日 {unit['date_str']} {output_name}"))
+    finally:
+        pump_stop.set()
+        pump_thread.join()
+    if broken:
+        log(output_dataset_id, f"快照进程池异常退出，本轮剩余 {len(units)} 个日期留待下一轮")
+    if failed_count:
+        log(output_dataset_id, f"本轮 {failed_count} 个日期处理失败，下一轮重试")
+
+
+def run_dataset(input_dataset_id: str, output_dataset_id: str) -> None:
+    """运行指定历史订单簿快照任务。"""
+    while True:
+        if WORKER_COUNT > 1:
+            run_dataset_parallel(input_dataset_id, output_dataset_id)
+        else:
+            run_dataset_sequential(input_dataset_id, output_dataset_id)
         sleep_seconds = seconds_until_next_utc_midnight()
         log(output_dataset_id, f"等待 {sleep_seconds} 秒后再次执行（UTC 00:00）")
         cex_config.wait_with_task_control(sleep_seconds)
@@ -0,0 +1,94 @@
+from pathlib import Path
+import hashlib
+import time
+
+import orjson
+
+import app_config
+from cex import cex_config
+
+KEY_DIGEST_BYTES = 8  # 去重键索引单条摘要长度，字节
+
+
+def standby_dir() -> Path:
+    """返回去重键索引与溢写目录，相对路径按数据根目录的上级目录解析，随运行时替换的数据根目录变化。"""
+    index_dir = Path(app_config.WS_STANDBY_INDEX_DIR)
+    if index_dir.is_absolute():
+        return index_dir
+    return cex_config.DATA_DYLAN_ROOT.absolute().parent / index_dir
+
+
+def key_index_path(file_path: Path) -> Path:
+    """返回分段文件对应的去重键索引路径。"""
+    return standby_dir() / f"{file_path.name}.keys"
+
+
+def key_digest(key: tuple) -> bytes:
+    """返回去重键的定长摘要，索引只存摘要，原始帧信封的键不再随帧原文重复落盘。"""
+    return hashlib.blake2b(orjson.dumps(key), digest_size=KEY_DIGEST_BYTES).digest()
+
+
+def append_key_index(file_path: Path, keys: list) -> None:
+    """向分段文件的去重键索引追加一批键的摘要。"""
+    if not keys:
+        return
+    index_path = key_index_path(file_path)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    with index_path.open("ab") as f:
+        f.write(b"".join(key_digest(key) for key in keys))
+
+
+def has_key_index(file_path: Path) -> bool:
+    """判断分段文件是否已有去重键索引。"""
+    return key_index_path(file_path).exists()
+
+
+def load_key_index(file_path: Path) -> set | None:
+    """读取分段文件的去重键摘要集合，无索引时返回空，丢弃崩溃时残留的半条摘要。"""
+    index_path = key_index_path(file_path)
+    if not index_path.exists():
+        return None
+    data = index_path.read_bytes()
+    end = len(data) - len(data) % KEY_DIGEST_BYTES
+    return {data[start : start + KEY_DIGEST_BYTES] for start in range(0, end, KEY_DIGEST_BYTES)}
+
+
+def remove_key_index(file_path: Path) -> None:
+    """删除分段文件的去重键索引。"""
+    key_index_path(file_path).unlink(missing_ok=True)
+
+
+def prune_key_indexes(max_age_seconds: float) -> None:
+    """删除超过保留时长未更新的去重键索引，清理已结束小时残留的索引。"""
+    index_dir = standby_dir()
+    if not index_dir.exists():
+        return
+    deadline = time.time() - max_age_seconds
+    for index_path in index_dir.glob("*.keys"):
+        try:
+            if index_path.stat().st_mtime < deadline:
+                index_path.unlink(missing_ok=True)
+        except FileNotFoundError:
+            continue
+
+
+def open_spill_file(market: str, file_path: Path):
+    """新建待切换缓存溢写文件，返回路径与追加句柄。"""
+    spill_path = standby_dir() / "spill" / f"{market}-{file_path.name}.spill"
+    spill_path.parent.mkdir(parents=True, exist_ok=True)
+    return spill_path, spill_path.open("wb")
+
+
+def append_spill_line(handle, key: tuple, line: str) -> None:
+    """向溢写文件追加一行缓存及其去重键。"""
+    handle.write(orjson.dumps([key, line]) + b"\n")
+
+
+def iter_spill_lines(spill_path: Path):
+    """按写入顺序读取溢写文件中的去重键与缓存行。"""
+    with spill_path.open("rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            key, text = orjson.loads(line)
+            yield tuple(key), text
@@ -0,0 +1,215 @@
+import asyncio
+import threading
+import time
+
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import WebSocketException
+
+from cex import cex_config
+from cex import cex_orderbook_ws_common as ws_common
+
+TASK_CONTROL_POLL_SECONDS = 1.0  # 任务控制轮询间隔，秒
+
+
+async def wait_with_task_control(seconds: int | float) -> None:
+    """在事件循环内按秒等待并响应任务控制变更。"""
+    deadline = time.time() + max(0.0, float(seconds))
+    while True:
+        if cex_config.TASK_CONTROL_EVENT.is_set():
+            cex_config.TASK_CONTROL_EVENT.clear()
+            return
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(TASK_CONTROL_POLL_SECONDS, remaining))
+
+
+async def connect_ws(url: str) -> ClientConnection:
+    """建立异步WebSocket连接。"""
+    return await connect(url, open_timeout=ws_common.TIMEOUT_SECONDS, ping_interval=None, max_size=None)
+
+
+async def keepalive(ws: ClientConnection, exchange: str) -> None:
+    """后台协程发送心跳包。"""
+    payload = ws_common.ping_payload(exchange)
+    if payload is None:
+        return
+    while True:
+        await asyncio.sleep(ws_common.PING_INTERVAL_SECONDS)
+        try:
+            await ws.send(payload)
+        except WebSocketException:
+            return
+        except TimeoutError:
+            return
+        except OSError:
+            return
+
+
+async def handle_session_message(exchange: str, market: str, contexts: dict[str, dict], raw: str) -> list[str]:
+    """处理单条消息且不阻塞事件循环：写入队列将满时在线程中等待空位，同步落盘时整条消息交给线程处理。"""
+    if not ws_common.WRITER_QUEUE_ENABLED:
+        return await asyncio.to_thread(ws_common.handle_session_message, exchange, contexts, raw)
+    if not ws_common.has_writer_room(market):
+        await asyncio.to_thread(ws_common.wait_writer_room, market)
+    return ws_common.handle_session_message(exchange, contexts, raw)
+
+
+async def tick_session_contexts(market: str, contexts: dict[str, dict]) -> None:
+    """定时输出到期条目且不阻塞事件循环，写入队列空位不足或同步落盘时交给线程处理。"""
+    if ws_common.WRITER_QUEUE_ENABLED and ws_common.has_writer_room(market, ws_common.WRITER_JOBS_PER_MESSAGE * len(contexts)):
+        ws_common.tick_session_contexts(contexts)
+        return
+    await asyncio.to_thread(ws_common.tick_session_contexts, contexts)
+
+
+async def run_session(exchange: str, market: str, symbols: tuple[str, ...], role: str, ws_url: str, states: dict) -> None:
+    """运行单个角色的一次异步WS会话。"""
+    try:
+        ws = await connect_ws(ws_url)
+        for payload in ws_common.build_subscribe_payloads(exchange, market, symbols, ws_common.market_depth(market)):
+            await ws.send(payload)
+        ws_common.update_group_status(states, exchange, market, symbols, role, connected=True, status_text="已连接 0", recv_count=0)
+    except WebSocketException as exc:
+        ws_common.handle_session_error(states, exchange, market, symbols, role, "连接异常", exc)
+        return
+    except TimeoutError as exc:
+        ws_common.handle_session_error(states, exchange, market, symbols, role, "连接超时", exc)
+        return
+    except OSError as exc:
+        ws_common.handle_session_error(states, exchange, market, symbols, role, "网络错误", exc)
+        return
+
+    contexts = await asyncio.to_thread(ws_common.build_session_contexts, exchange, market, symbols, role, states)
+    keepalive_task = asyncio.create_task(keepalive(ws, exchange))
+    tick_seconds = ws_common.session_tick_seconds()
+    last_recv_ts = last_tick_ts = time.monotonic()
+    try:
+        while True:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), tick_seconds or ws_common.RECV_TIMEOUT_SECONDS)
+            except WebSocketException as exc:
+                ws_common.handle_session_error(states, exchange, market, symbols, role, "连接异常", exc)
+                break
+            except TimeoutError as exc:
+                if tick_seconds > 0 and time.monotonic() - last_recv_ts < ws_common.RECV_TIMEOUT_SECONDS:
+                    try:
+                        await tick_session_contexts(market, contexts)
+                    except ws_common.WriterStalledError as stall_exc:
+                        ws_common.handle_session_error(states, exchange, market, symbols, role, "写入阻塞", stall_exc)
+                        break
+                    last_tick_ts = time.monotonic()
+                    continue
+                ws_common.handle_session_error(states, exchange, market, symbols, role, "连接超时", exc)
+                break
+            except OSError as exc:
+                ws_common.handle_session_error(states, exchange, market, symbols, role, "网络错误", exc)
+                break
+            last_recv_ts = time.monotonic()
+            if isinstance(raw, bytes):
+                raw = raw.decode("utf-8")
+            try:
+                if tick_seconds > 0 and last_recv_ts - last_tick_ts >= tick_seconds:
+                    await tick_session_contexts(market, contexts)
+                    last_tick_ts = last_recv_ts
+                for payload in await handle_session_message(exchange, market, contexts, raw):
+                    await ws.send(payload)
+            except ws_common.WriterStalledError as exc:
+                ws_common.handle_session_error(states, exchange, market, symbols, role, "写入阻塞", exc)
+                break
+            except WebSocketException as exc:
+                ws_common.handle_session_error(states, exchange, market, symbols, role, "连接异常", exc)
+                break
+            except OSError as exc:
+                ws_common.handle_session_error(states, exchange, market, symbols, role, "网络错误", exc)
+                break
+    finally:
+        keepalive_task.cancel()
+        await asyncio.to_thread(ws_common.close_session_contexts, contexts)
+        ws_common.update_group_status(states, exchange, market, symbols, role, connected=False, status_text="连接关闭")
+        ws_common.switch_group_role(states, exchange, market, symbols, role)
+        await ws.close()
+
+
+async def run_role_loop(exchange: str, market: str, symbols: tuple[str, ...], role: str, ws_url: str, states: dict) -> None:
+    """持续维护单个角色的异步WS连接。"""
+    ws_common.update_group_status(states, exchange, market, symbols, role, connected=False, status_text="准备连接", recv_count=0)
+    try:
+        while True:
+            await run_session(exchange, market, symbols, role, ws_url, states)
+            await asyncio.sleep(ws_common.RECONNECT_INTERVAL_SECONDS)
+    finally:
+        ws_common.update_group_status(states, exchange, market, symbols, role, connected=False, status_text="已停止")
+
+
+async def run_group_loop(exchange: str, market: str, symbols: tuple[str, ...]) -> None:
+    """持续维护一个连接分组的主备异步WS连接。"""
+    ws_common.log(f"{exchange} {market} {ws_common.group_label(symbols)} 主备订阅启动", market)
+    states = {symbol: ws_common.build_session_state() for symbol in symbols}
+    primary_url, backup_url = ws_common.build_ws_urls(exchange, market, symbols[0])
+    try:
+        await asyncio.gather(
+            run_role_loop(exchange, market, symbols, ws_common.PRIMARY_ROLE, primary_url, states),
+            run_role_loop(exchange, market, symbols, ws_common.BACKUP_ROLE, backup_url, states),
+        )
+    finally:
+        for symbol in symbols:
+            ws_common.status_update(exchange, market, symbol, None)
+        ws_common.log(f"{exchange} {market} {ws_common.group_label(symbols)} 主备订阅停止", market)
+
+
+async def run_exchange_supervisor(
+    exchange: str, market: str, stop_event: threading.Event | None = None, shard_index: int = 0, shard_count: int = 1
+) -> None:
+    """按交易所维护全部连接分组协程，多进程模式下只维护本分片的交易对。"""
+    dataset_id = "D10002-4" if market == "future" else "D10006-8"
+    if not cex_config.is_supported(dataset_id, exchange):
+        symbol_list = cex_config.get_future_symbols(exchange) if market == "future" else cex_config.get_spot_symbols(exchange)
+        for symbol in symbol_list:
+            ws_common.status_update(exchange, market, symbol, cex_config.UNSUPPORTED_STATUS_TEXT)
+        return
+    workers: dict[tuple[str, ...], asyncio.Task] = {}
+    fallback_symbols = cex_config.get_future_symbols(exchange) if market == "future" else cex_config.get_spot_symbols(exchange)
+    fallback_symbols = [symbol for symbol in fallback_symbols if ws_common.is_symbol_in_shard(symbol, shard_index, shard_count)]
+    group_size = ws_common.symbols_per_connection(exchange)
+    while stop_event is None or not stop_event.is_set():
+        if cex_config.apply_pause_if_requested(dataset_id, exchange):
+            paused_symbols = {symbol for group in workers for symbol in group} | set(fallback_symbols)
+            for group in sorted(workers):
+                workers.pop(group).cancel()
+            for symbol in sorted(paused_symbols):
+                ws_common.status_update(exchange, market, symbol, cex_config.PAUSED_STATUS_TEXT)
+            await wait_with_task_control(1)
+            continue
+        try:
+            desired_symbols = await asyncio.to_thread(ws_common.resolve_symbols, exchange, market)
+        except ws_common.NetworkRequestError as exc:
+            desired_symbols = fallback_symbols
+            ws_common.log(f"{exchange} {market} 动态合约刷新失败，继续使用静态列表: {exc}", market)
+        desired_symbols = [symbol for symbol in desired_symbols if ws_common.is_symbol_in_shard(symbol, shard_index, shard_count)]
+        await asyncio.to_thread(ws_common.refresh_instrument_scales, exchange, market, desired_symbols)
+        desired_groups = ws_common.plan_symbol_groups(list(workers), desired_symbols, group_size)
+        for group in sorted(set(workers) - set(desired_groups)):
+            workers.pop(group).cancel()
+        for group in sorted(set(desired_groups) - set(workers)):
+            workers[group] = asyncio.create_task(run_group_loop(exchange, market, group), name=f"{exchange}-{market}-{group[0]}")
+        wait_seconds = ws_common.DELIVERY_REFRESH_SECONDS if market == "future" else max(ws_common.DELIVERY_REFRESH_SECONDS, 60)
+        await wait_with_task_control(wait_seconds)
+    for task in workers.values():
+        task.cancel()
+    await asyncio.gather(*workers.values(), return_exceptions=True)
+
+
+async def run_market(market: str) -> None:
+    """在单个事件循环内运行全部交易所监督协程。"""
+    await asyncio.gather(*(run_exchange_supervisor(exchange, market) for exchange in cex_config.list_exchanges()))
+
+
+def run_market_ws(market: str) -> None:
+    """以asyncio引擎运行指定市场的多交易所订单簿WS。"""
+    asyncio.run(run_market(market))
+
+
+def run_exchange_ws(exchange: str, market: str, stop_event: threading.Event, shard_index: int, shard_count: int) -> None:
+    """以asyncio引擎运行单个交易所分片，供多进程模式的子进程调用。"""
+    asyncio.run(run_exchange_supervisor(exchange, market, stop_event, shard_index, shard_count))
@@ -2,18 +2,54 @@ from collections import deque
 from datetime import datetime, timezone
 from pathlib import Path
 import json
+import queue
 import socket
 import threading
 import time
+import zlib
 from urllib.error import HTTPError, URLError
 from urllib.parse import urlencode
 from urllib.request import Request, urlopen
 
+import orjson
 import websocket
 
 import app_config
 from cex import cex_config
 from cex.cex_common import upload_file_to_s3
+from cex.cex_orderbook_delta_common import build_encoder_state, encode_snapshot_record
+from cex.cex_orderbook_engine_common import SortedOrderBook, TickOrderBook, decimal_places, format_number
+from cex.cex_orderbook_segment_common import (
+    append_segment_text,
+    iter_segment_lines,
+    open_segment_file,
+    segment_codec_from_path,
+    segment_suffix,
+    write_segment_text,
+)
+from cex.cex_orderbook_sequence_common import (
+    CHECKSUM_EXCHANGES,
+    RESYNC_EXCHANGES,
+    SEQUENCE_EXCHANGES,
+    build_sequence_state,
+    find_checksum_mismatch,
+    find_sequence_gap,
+    is_snapshot_message,
+    message_sequence_id,
+)
+from cex import cex_orderbook_pubsub_common as pubsub
+from cex.cex_orderbook_shm_common import open_book_slot, publish_book
+from cex.cex_orderbook_standby_common import (
+    append_key_index,
+    append_spill_line,
+    has_key_index,
+    iter_spill_lines,
+    key_digest,
+    load_key_index,
+    open_spill_file,
+    prune_key_indexes,
+    remove_key_index,
+)
 
 
 BYBIT_FUTURE_WS_URL = "wss://stream.bybit.com/v5/public/linear"  # Bybit期货WS地址，字符串
@@ -36,6 +72,31 @@ WRITE_BUFFER_LINES = app_config.WS_WRITE_BUFFER_LINES  # WS写入缓冲行数阈
 WRITE_BUFFER_BYTES = app_config.WS_WRITE_BUFFER_BYTES  # WS写入缓冲字节阈值，字节
 WRITE_BUFFER_INTERVAL_SECONDS = app_config.WS_WRITE_BUFFER_INTERVAL_SECONDS  # WS写入缓冲刷新间隔，秒
 DELIVERY_REFRESH_SECONDS = app_config.DELIVERY_REFRESH_SECONDS  # 动态合约刷新间隔，秒
+SYMBOLS_PER_CONNECTION = app_config.WS_SYMBOLS_PER_CONNECTION  # WS单连接订阅交易对数映射，映射
+SUBSCRIBE_BATCH_SIZE = app_config.WS_SUBSCRIBE_BATCH_SIZE  # WS单条订阅请求最大参数数，个
+RT_RAW_PASSTHROUGH = app_config.WS_RT_RAW_PASSTHROUGH  # rt文件原始帧直写开关，开关
+SEGMENT_COMPRESSION = app_config.WS_SEGMENT_COMPRESSION  # WS分段文件按阶段压缩方式映射，映射
+SNAPSHOT_FORMAT = app_config.WS_SNAPSHOT_FORMAT  # rt_ss与rt_ss_1s输出格式，字符串
+COLUMNAR_FORMATS = {"parquet", "arrow"}  # 列式快照输出格式集合，个数
+COLUMNAR_BATCH_ROWS = app_config.WS_COLUMNAR_BATCH_ROWS  # 列式快照单批写入行数，条
+RT_SS_ENCODING = app_config.WS_RT_SS_ENCODING  # rt_ss JSON输出编码，字符串
+RT_SS_KEYFRAME_INTERVAL = app_config.WS_RT_SS_KEYFRAME_INTERVAL  # rt_ss差分编码关键帧间隔，条
+RT_SS_COALESCE_MS = app_config.WS_RT_SS_COALESCE_MS  # rt_ss快照合并窗口，0为逐条输出，毫秒
+SEQUENCE_CHECK_ENABLED = app_config.WS_SEQUENCE_CHECK_ENABLED  # WS盘口序号连续性检查开关，开关
+CHECKSUM_CHECK_ENABLED = app_config.WS_CHECKSUM_CHECK_ENABLED  # OKX与Bitget盘口校验和检查开关，开关
+RESYNC_TIMEOUT_SECONDS = app_config.WS_RESYNC_TIMEOUT_SECONDS  # 单交易对重同步等待快照超时，秒
+PRIMARY_BACKUP_MERGE = app_config.WS_PRIMARY_BACKUP_MERGE  # WS主备合并落盘开关，开关
+MERGE_WINDOW_SIZE = app_config.WS_MERGE_WINDOW_SIZE  # WS主备合并去重滑动窗口大小，条
+MERGE_REORDER_SECONDS = app_config.WS_MERGE_REORDER_MS / 1000  # WS主备合并重排窗口，秒
+MERGE_ROLE = "merge"  # 主备合并输出上下文角色标识，字符串
+MERGE_STAGES = ("raw", "snapshots")  # 主备合并分别去重与重排的输出阶段，个数
+SESSION_TICK_MIN_SECONDS = 0.05  # WS会话定时处理最短间隔，秒
+SHM_PUBLISH_ENABLED = app_config.WS_SHM_PUBLISH_ENABLED  # 实时盘口共享内存发布开关，开关
+SHM_DIR = Path(app_config.WS_SHM_DIR)  # 实时盘口共享内存槽位目录，路径
+PUBSUB_ENABLED = app_config.WS_PUBSUB_ENABLED  # 实时行情本地订阅分发开关，开关
+TICK_PRICES_ENABLED = app_config.WS_TICK_PRICES_ENABLED  # 实时盘口整数刻度开关，开关
+INSTRUMENT_SCALES_LOCK = threading.Lock()  # 合约精度缓存锁，锁
+INSTRUMENT_SCALES = {}  # 按交易所与市场缓存的合约价格、数量小数位映射，映射
 QUIET = False  # 静默模式开关，开关
 STATUS_HOOK = None  # 状态回调函数，函数
 LOG_HOOK = None  # 日志回调函数，函数
@@ -45,17 +106,46 @@ MARKET_LOG_HOOK = {"future": None, "spot": None}  # 分市场日志回调映射
 PRIMARY_ROLE = "primary"  # 主连接角色标识，字符串
 BACKUP_ROLE = "backup"  # 备连接角色标识，字符串
 STANDBY_BUFFER_MAX_LINES = app_config.WS_STANDBY_BUFFER_MAX_LINES  # WS待切换缓存每文件最大行数，行
+STANDBY_BUFFER_MAX_BYTES = app_config.WS_STANDBY_BUFFER_MAX_BYTES  # WS待切换缓存每市场内存上限，超出后溢写本地文件，字节
+STANDBY_KEY_INDEX_ENABLED = app_config.WS_STANDBY_KEY_INDEX_ENABLED  # WS分段文件去重键索引开关，开关
+STANDBY_KEY_INDEX_MAX_AGE_SECONDS = 2 * 3600  # 去重键索引超过该时长未更新视为已结束小时的残留，补写缓存时清理，秒
 MARKET_WRITE_ENABLED = {"future": True, "spot": True}  # 分市场落盘开关映射，映射
 MARKET_BUFFER_LOCK = {"future": threading.Lock(), "spot": threading.Lock()}  # 分市场缓存锁映射，映射
-MARKET_BUFFERED_LINES = {"future": {}, "spot": {}}  # 分市场缓存行映射，映射
-MARKET_BUFFERED_SETS = {"future": {}, "spot": {}}  # 分市场缓存去重集合映射，映射
+MARKET_BUFFERED_FILES = {"future": {}, "spot": {}}  # 分市场按目标文件的缓存条目映射，映射
+MARKET_BUFFERED_BYTES = {"future": 0, "spot": 0}  # 分市场缓存驻留内存字节数映射，字节
 MARKET_BUFFER_DROP_COUNTS = {"future": {}, "spot": {}}  # 分市场缓存丢弃计数映射，映射
+LATENCY_EWMA_ALPHA = 0.01  # 消息延迟指数平均系数，比例
+LATENCY_MAX_WINDOW_SECONDS = 60  # 消息延迟峰值统计窗口，秒
+MARKET_LATENCY_LOCK = threading.Lock()  # 分市场消息延迟统计锁，锁
+MARKET_LATENCY_STATS = {
+    "future": {"count": 0, "ewma_ms": 0.0, "max_ms": 0, "window_start": 0.0},  # 期货消息延迟统计，映射
+    "spot": {"count": 0, "ewma_ms": 0.0, "max_ms": 0, "window_start": 0.0},  # 现货消息延迟统计，映射
+}  # 分市场消息延迟统计映射，映射
+WRITER_QUEUE_ENABLED = app_config.WS_WRITER_QUEUE_ENABLED  # WS独立写入线程开关，开关
+WRITER_QUEUE_MAX_ITEMS = app_config.WS_WRITER_QUEUE_MAX_ITEMS  # WS写入队列最大积压消息数，条
+WRITER_BATCH_MAX_ITEMS = app_config.WS_WRITER_BATCH_MAX_ITEMS  # WS写入线程单批最多处理消息数，条
+WRITER_PUT_TIMEOUT_SECONDS = app_config.WS_WRITER_PUT_TIMEOUT_SECONDS  # WS写入队列满时接收线程最长阻塞时长，秒
+WRITER_ERROR_LOG_INTERVAL = 1000  # 写入线程同类异常的日志间隔，首次与每累计该条数记录一次，条
+WRITER_JOBS_PER_MESSAGE = 2  # 单条消息处理最多提交的落盘任务数，异步引擎据此预留队列空位，条
+WRITER_ROOM_POLL_SECONDS = 0.01  # 异步引擎等待写入队列腾出空位的轮询间隔，秒
+MARKET_WRITER_LOCK = threading.Lock()  # 分市场写入阶段创建锁，锁
+MARKET_WRITERS = {"future": None, "spot": None}  # 分市场写入阶段状态映射，映射
+UPLOAD_HOOK = None  # 文件上传回调函数，为空时直接提交上传队列，函数
+MARKET_CONTROL_HOOK = {"future": None, "spot": None}  # 分市场缓存控制转发回调映射，映射
+MARKET_WORKER_METRICS = {"future": {}, "spot": {}}  # 分市场子进程运行观测映射，映射
+WRITES_RELEASED = threading.Event()  # 已将落盘权交接给新进程，之后不再写入也不缓存，事件
+LAST_WRITTEN_KEYS = {}  # 各分段文件最后一次刷盘的去重键映射，映射
+HANDOVER_CURSORS = {}  # 交接时旧进程报告的各分段文件续写位置映射，映射
 
 
 class NetworkRequestError(RuntimeError):
     """表示网络请求失败。"""
 
 
+class WriterStalledError(RuntimeError):
+    """表示写入队列长时间无法腾出空位。"""
+
+
 def configure_market_runtime(market: str, quiet: bool, status_hook, log_hook) -> None:
     """配置指定市场的运行时回调。"""
     MARKET_QUIET[market] = quiet
@@ -66,6 +156,14 @@ def configure_market_runtime(market: str, quiet: bool, status_hook, log_hook) ->
 def set_market_write_enabled(market: str, enabled: bool) -> None:
     """设置指定市场的落盘开关。"""
     MARKET_WRITE_ENABLED[market] = enabled
+    forward_market_control(market, "write_enabled", enabled)
+
+
+def forward_market_control(market: str, command: str, value=None) -> None:
+    """将缓存控制命令转发给采集子进程。"""
+    hook = MARKET_CONTROL_HOOK.get(market)
+    if hook:
+        hook(command, value)
 
 
 def is_market_write_enabled(market: str) -> bool:
@@ -76,24 +174,39 @@ def is_market_write_enabled(market: str) -> bool:
 def clear_market_buffer(market: str) -> None:
     """清空指定市场的缓存内容。"""
     with MARKET_BUFFER_LOCK[market]:
-        MARKET_BUFFERED_LINES[market].clear()
-        MARKET_BUFFERED_SETS[market].clear()
+        for entry in MARKET_BUFFERED_FILES[market].values():
+            close_buffer_spill(entry, True)
+        MARKET_BUFFERED_FILES[market].clear()
+        MARKET_BUFFERED_BYTES[market] = 0
         MARKET_BUFFER_DROP_COUNTS[market].clear()
+    forward_market_control(market, "clear")
 
 
-def get_market_buffer_snapshot(market: str) -> dict:
-    """返回指定市场的待切换缓存快照。"""
+def get_local_market_buffer_snapshot(market: str) -> dict:
+    """返回当前进程内指定市场的待切换缓存快照。"""
     with MARKET_BUFFER_LOCK[market]:
-        file_count = len(MARKET_BUFFERED_LINES[market])
-        line_count = sum(len(lines) for lines in MARKET_BUFFERED_LINES[market].values())
+        entries = MARKET_BUFFERED_FILES[market].values()
+        file_count = len(entries)
+        line_count = sum(len(entry["keys"]) for entry in entries)
+        spilled_count = sum(entry["spilled_count"] for entry in entries)
         dropped_count = sum(int(count) for count in MARKET_BUFFER_DROP_COUNTS[market].values())
     return {
         "file_count": file_count,
         "line_count": line_count,
+        "spilled_count": spilled_count,
         "dropped_count": dropped_count,
     }
 
 
+def get_market_buffer_snapshot(market: str) -> dict:
+    """返回指定市场的待切换缓存快照，含采集子进程。"""
+    snapshot = get_local_market_buffer_snapshot(market)
+    for metrics in list(MARKET_WORKER_METRICS[market].values()):
+        for key in snapshot:
+            snapshot[key] += int(metrics["buffer"][key])
+    return snapshot
+
+
 def get_all_market_buffer_snapshots() -> dict:
     """返回全部市场的待切换缓存快照。"""
     return {
@@ -102,95 +215,281 @@ def get_all_market_buffer_snapshots() -> dict:
     }
 
 
-def build_buffer_dedupe_key(payload: dict) -> str:
-    """构造待切换缓存使用的稳定去重键。"""
+def record_message_latency(market: str, latency_ms: int) -> None:
+    """记录交易所时间到本地采集时间的消息延迟。"""
+    now_ts = time.monotonic()
+    with MARKET_LATENCY_LOCK:
+        stats = MARKET_LATENCY_STATS[market]
+        if stats["count"] == 0:
+            stats["ewma_ms"] = float(latency_ms)
+        else:
+            stats["ewma_ms"] += (latency_ms - stats["ewma_ms"]) * LATENCY_EWMA_ALPHA
+        if now_ts - stats["window_start"] >= LATENCY_MAX_WINDOW_SECONDS:
+            stats["window_start"] = now_ts
+            stats["max_ms"] = latency_ms
+        else:
+            stats["max_ms"] = max(stats["max_ms"], latency_ms)
+        stats["count"] += 1
+
+
+def get_local_latency_snapshot(market: str) -> dict:
+    """返回当前进程内指定市场的消息延迟统计。"""
+    with MARKET_LATENCY_LOCK:
+        return dict(MARKET_LATENCY_STATS[market])
+
+
+def get_market_runtime_snapshot(market: str) -> dict:
+    """返回指定市场的WS引擎运行观测。"""
+    stats = get_local_latency_snapshot(market)
+    message_count = stats["count"]
+    latency_total = stats["ewma_ms"] * stats["count"]
+    latency_max = stats["max_ms"]
+    thread_count = threading.active_count()
+    writer = get_market_writer_snapshot(market)
+    worker_metrics = list(MARKET_WORKER_METRICS[market].values())
+    for metrics in worker_metrics:
+        worker_stats = metrics["latency"]
+        message_count += worker_stats["count"]
+        latency_total += worker_stats["ewma_ms"] * worker_stats["count"]
+        latency_max = max(latency_max, worker_stats["max_ms"])
+        thread_count += int(metrics["thread_count"])
+        for key in ("queue_depth", "stall_count", "stall_seconds", "job_count", "batch_count"):
+            writer[key] += metrics["writer"][key]
+        writer["peak_depth"] = max(writer["peak_depth"], metrics["writer"]["peak_depth"])
+    return {
+        "engine": app_config.WS_ENGINE,
+        "process_count": 1 + len(worker_metrics),
+        "thread_count": thread_count,
+        "message_count": message_count,
+        "latency_avg_ms": latency_total / message_count if message_count else 0.0,
+        "latency_max_ms": latency_max,
+        "writer_queue_depth": writer["queue_depth"],
+        "writer_peak_depth": writer["peak_depth"],
+        "writer_stall_count": writer["stall_count"],
+        "writer_stall_seconds": writer["stall_seconds"],
+    }
+
+
+def build_buffer_dedupe_key(payload: dict) -> tuple:
+    """构造待切换缓存与分段索引使用的去重键。"""
     if "update_type" in payload:
-        return json.dumps(
-            {
-                "kind": "snapshot",
-                "symbol": payload.get("symbol"),
-                "update_type": payload.get("update_type"),
-                "ts": payload.get("ts"),
-                "cts": payload.get("cts"),
-                "update_id": payload.get("update_id"),
-                "seq": payload.get("seq"),
-            },
-            ensure_ascii=True,
-            sort_keys=True,
-            separators=(",", ":"),
+        return (
+            "snapshot",
+            payload.get("symbol"),
+            payload.get("update_type"),
+            payload.get("ts"),
+            payload.get("cts"),
+            payload.get("update_id"),
+            payload.get("seq"),
         )
     if "topic" in payload and "data" in payload:
         data = payload.get("data") or {}
-        return json.dumps(
-            {
-                "kind": "raw",
-                "topic": payload.get("topic"),
-                "symbol": payload.get("symbol"),
-                "type": payload.get("type"),
-                "ts": payload.get("ts"),
-                "cts": payload.get("cts"),
-                "u": data.get("u"),
-                "seq": data.get("seq"),
-            },
-            ensure_ascii=True,
-            sort_keys=True,
-            separators=(",", ":"),
+        return (
+            "raw",
+            payload.get("topic"),
+            payload.get("symbol"),
+            payload.get("type"),
+            payload.get("ts"),
+            payload.get("cts"),
+            data.get("u"),
+            data.get("seq"),
         )
     normalized_payload = dict(payload)
     normalized_payload.pop("collect_ts", None)
-    return json.dumps(normalized_payload, ensure_ascii=True, sort_keys=True, separators=(",", ":"))
+    return ("line", orjson.dumps(normalized_payload, option=orjson.OPT_SORT_KEYS).decode("utf-8"))
+
+
+def build_frame_dedupe_key(line: str) -> tuple:
+    """按原始帧信封中的交易对与帧原文构造去重键，无需解析帧内容。"""
+    raw_start = line.index(',"raw":')
+    return ("frame", line[line.index(',"symbol":"') + 11 : raw_start - 1], line[raw_start + 7 : line.rindex("}")])
+
+
+def build_line_dedupe_key(line: str) -> tuple:
+    """按已落盘的单行文本构造去重键。"""
+    if line.startswith('{"collect_ts":') and ',"raw":' in line:
+        return build_frame_dedupe_key(line)
+    return build_buffer_dedupe_key(orjson.loads(line))
+
+
+def build_record_dedupe_key(record) -> tuple:
+    """构造rt记录的去重键，原始帧信封按帧原文去重。"""
+    if isinstance(record, str):
+        return build_frame_dedupe_key(record)
+    return build_buffer_dedupe_key(record)
 
 
 def buffer_json_line(market: str, file_path: Path, payload: dict) -> None:
     """缓存待切换期间的JSON行。"""
-    line = json.dumps(payload, ensure_ascii=True, separators=(",", ":")) + "\n"
-    dedupe_key = build_buffer_dedupe_key(payload)
+    buffer_text_line(market, file_path, encode_json_line(payload), build_buffer_dedupe_key(payload))
+
+
+def buffer_rt_record(market: str, file_path: Path, record) -> None:
+    """缓存待切换期间的rt记录。"""
+    buffer_text_line(market, file_path, encode_rt_record(record), build_record_dedupe_key(record))
+
+
+def build_buffer_entry() -> dict:
+    """构造单个目标文件的待切换缓存条目。"""
+    return {"keys": set(), "lines": deque(), "spill_path": None, "spill_handle": None, "spilled_count": 0, "spill_failed": False}
+
+
+def close_buffer_spill(entry: dict, remove: bool) -> None:
+    """关闭缓存条目的溢写句柄，按需删除溢写文件。"""
+    if entry["spill_handle"] is not None:
+        entry["spill_handle"].close()
+        entry["spill_handle"] = None
+    if remove and entry["spill_path"] is not None:
+        entry["spill_path"].unlink(missing_ok=True)
+
+
+def iter_buffer_entry(entry: dict):
+    """按缓存顺序输出条目内的去重键与行，先内存后溢写。"""
+    yield from entry["lines"]
+    if entry["spill_path"] is not None:
+        yield from iter_spill_lines(entry["spill_path"])
+
+
+def record_buffer_drop(market: str, file_key: str) -> None:
+    """累计并定期记录待切换缓存的丢弃条数。"""
+    dropped_count = int(MARKET_BUFFER_DROP_COUNTS[market].get(file_key) or 0) + 1
+    MARKET_BUFFER_DROP_COUNTS[market][file_key] = dropped_count
+    if dropped_count == 1 or dropped_count % 1000 == 0:
+        log(f"{market} 待切换缓存已满，开始丢弃最早消息: {Path(file_key).name}，累计丢弃 {dropped_count} 条", market)
+
+
+def open_buffer_spill(market: str, file_path: Path, entry: dict) -> bool:
+    """为缓存条目打开溢写文件，打开失败后该条目不再尝试溢写。"""
+    if entry["spill_handle"] is not None:
+        return True
+    if entry["spill_failed"]:
+        return False
+    try:
+        entry["spill_path"], entry["spill_handle"] = open_spill_file(market, file_path)
+    except OSError as exc:
+        entry["spill_failed"] = True
+        log(f"{market} 待切换缓存溢写文件打开失败，改为丢弃最早消息: {file_path.name}，{exc}", market)
+        return False
+    log(f"{market} 待切换缓存超出内存上限，开始溢写: {file_path.name}", market)
+    return True
+
+
+def buffer_text_line(market: str, file_path: Path, line: str, dedupe_key: tuple) -> None:
+    """按去重键缓存待切换期间的单行文本，超出内存行数或字节上限后溢写到本地追加文件。"""
     file_key = str(file_path.resolve())
     with MARKET_BUFFER_LOCK[market]:
-        line_set = MARKET_BUFFERED_SETS[market].setdefault(file_key, set())
-        if dedupe_key in line_set:
+        entry = MARKET_BUFFERED_FILES[market].get(file_key)
+        if entry is None:
+            entry = build_buffer_entry()
+            MARKET_BUFFERED_FILES[market][file_key] = entry
+        if dedupe_key in entry["keys"]:
+            return
+        memory_full = len(entry["lines"]) >= STANDBY_BUFFER_MAX_LINES or MARKET_BUFFERED_BYTES[market] + len(line) > STANDBY_BUFFER_MAX_BYTES
+        if (entry["spill_handle"] is not None or memory_full) and open_buffer_spill(market, file_path, entry):
+            entry["keys"].add(dedupe_key)
+            append_spill_line(entry["spill_handle"], dedupe_key, line)
+            entry["spilled_count"] += 1
             return
-        line_queue = MARKET_BUFFERED_LINES[market].setdefault(file_key, deque(maxlen=STANDBY_BUFFER_MAX_LINES))
-        if len(line_queue) == line_queue.maxlen:
-            removed_key, _ = line_queue.popleft()
-            line_set.discard(removed_key)
-            dropped_count = int(MARKET_BUFFER_DROP_COUNTS[market].get(file_key) or 0) + 1
-            MARKET_BUFFER_DROP_COUNTS[market][file_key] = dropped_count
-            if dropped_count == 1 or dropped_count % 1000 == 0:
-                log(f"{market} 待切换缓存已满，开始丢弃最早消息: {Path(file_key).name}，累计丢弃 {dropped_count} 条", market)
-        line_queue.append((dedupe_key, line))
-        line_set.add(dedupe_key)
+        if len(entry["lines"]) >= STANDBY_BUFFER_MAX_LINES:
+            dropped_key, dropped_line = entry["lines"].popleft()
+            entry["keys"].discard(dropped_key)
+            MARKET_BUFFERED_BYTES[market] -= len(dropped_line)
+            record_buffer_drop(market, file_key)
+        entry["keys"].add(dedupe_key)
+        entry["lines"].append((dedupe_key, line))
+        MARKET_BUFFERED_BYTES[market] += len(line)
+
+
+def prepare_key_index(file_path: Path) -> bool:
+    """判断续写目标文件时能否同步维护键索引：空文件清掉残留索引后从头建立，非空文件仅在已有索引时续写。"""
+    if not STANDBY_KEY_INDEX_ENABLED:
+        return False
+    if not file_path.exists() or file_path.stat().st_size == 0:
+        remove_key_index(file_path)
+        return True
+    return has_key_index(file_path)
+
+
+def load_existing_keys(file_path: Path) -> set:
+    """返回目标文件已有行的去重键摘要，优先读取键索引，无索引时回退为解析整个文件。"""
+    if not file_path.exists():
+        return set()
+    keys = load_key_index(file_path)
+    if keys is not None:
+        return keys
+    return {key_digest(build_line_dedupe_key(line)) for line in iter_segment_lines(file_path) if line.strip()}
+
+
+def split_after_cursor(items: list, cursor: dict | None, file_path: Path) -> list | None:
+    """按交接续写位置截取尚未由旧进程写入的缓存行，位置无法对齐时返回空。"""
+    if cursor is None:
+        return None
+    if file_path.exists() and file_path.stat().st_size != cursor["size"]:
+        return None
+    for index, (dedupe_key, _line) in enumerate(items):
+        if dedupe_key == cursor["last_key"]:
+            return items[index + 1 :]
+    return None
 
 
 def flush_market_buffer(market: str) -> None:
     """将指定市场的缓存内容补写到正式文件。"""
+    forward_market_control(market, "flush")
     with MARKET_BUFFER_LOCK[market]:
-        buffered_lines = MARKET_BUFFERED_LINES[market]
-        if not buffered_lines:
+        buffered_files = MARKET_BUFFERED_FILES[market]
+        if not buffered_files:
             return
-        flush_items = [(file_key, list(lines)) for file_key, lines in buffered_lines.items()]
-        MARKET_BUFFERED_LINES[market] = {}
-        MARKET_BUFFERED_SETS[market] = {}
+        MARKET_BUFFERED_FILES[market] = {}
+        MARKET_BUFFERED_BYTES[market] = 0
         MARKET_BUFFER_DROP_COUNTS[market] = {}
-    for file_key, lines in flush_items:
+        for entry in buffered_files.values():
+            close_buffer_spill(entry, False)
+    if STANDBY_KEY_INDEX_ENABLED:
+        prune_key_indexes(STANDBY_KEY_INDEX_MAX_AGE_SECONDS)
+    for file_key, entry in buffered_files.items():
         file_path = Path(file_key)
         file_path.parent.mkdir(parents=True, exist_ok=True)
-        existing_keys = set()
-        if file_path.exists():
-            with file_path.open("r", encoding="utf-8") as f:
-                for line in f:
-                    payload = json.loads(line)
-                    existing_keys.add(build_buffer_dedupe_key(payload))
-        wrote = False
-        with file_path.open("a", encoding="utf-8") as f:
-            for dedupe_key, line in lines:
-                if dedupe_key in existing_keys:
-                    continue
-                f.write(line)
-                existing_keys.add(dedupe_key)
-                wrote = True
-        if wrote:
-            upload_file_to_s3(file_path)
+        items = list(iter_buffer_entry(entry))
+        close_buffer_spill(entry, True)
+        if file_path.suffix[1:] in COLUMNAR_FORMATS:
+            HANDOVER_CURSORS.pop(file_key, None)
+            flush_columnar_buffer(file_path, items)
+            continue
+        pending_items = split_after_cursor(items, HANDOVER_CURSORS.pop(file_key, None), file_path)
+        if pending_items is None:
+            existing_keys = load_existing_keys(file_path)
+            pending_items = [(dedupe_key, line) for dedupe_key, line in items if key_digest(dedupe_key) not in existing_keys]
+        pending_lines = [line for _dedupe_key, line in pending_items]
+        pending_keys = [dedupe_key for dedupe_key, _line in pending_items]
+        if pending_lines:
+            indexed = prepare_key_index(file_path)
+            append_segment_text(file_path, segment_codec_from_path(file_path), "".join(pending_lines))
+            if indexed:
+                append_key_index(file_path, pending_keys)
+            submit_upload(file_path)
+
+
+def flush_columnar_buffer(base_path: Path, items: list) -> None:
+    """将待切换缓存的快照补写为该小时下一个列式分段，已在既有分段中的快照按去重键跳过。"""
+    from cex.cex_orderbook_columnar_common import ColumnarSegmentWriter, list_columnar_segments, next_columnar_path, read_columnar_key_rows
+
+    existing_keys = {("snapshot", *row) for path in list_columnar_segments(base_path) for row in read_columnar_key_rows(path)}
+    snapshots = [orjson.loads(line) for dedupe_key, line in items if dedupe_key not in existing_keys]
+    if not snapshots:
+        return
+    writer = ColumnarSegmentWriter(next_columnar_path(base_path), base_path.suffix[1:])
+    for start in range(0, len(snapshots), COLUMNAR_BATCH_ROWS):
+        writer.write_snapshots(snapshots[start : start + COLUMNAR_BATCH_ROWS])
+    writer.close()
+    submit_upload(writer.path)
+
+
+def submit_upload(file_path: Path) -> None:
+    """提交已完成文件的上传。"""
+    if UPLOAD_HOOK:
+        UPLOAD_HOOK(file_path)
+        return
+    upload_file_to_s3(file_path)
 
 
 def log(message: str, market: str | None = None) -> None:
@@ -205,9 +504,14 @@ def log(message: str, market: str | None = None) -> None:
 
 def status_update(exchange: str, market: str, symbol: str, value) -> None:
     """更新统一状态键的状态值。"""
+    emit_status(market, cex_config.get_status_key(exchange, market, symbol), value)
+
+
+def emit_status(market: str, key: str, value) -> None:
+    """按状态键回调状态值。"""
     hook = MARKET_STATUS_HOOK.get(market) or STATUS_HOOK
     if hook:
-        hook(cex_config.get_status_key(exchange, market, symbol), value)
+        hook(key, value)
 
 
 def request_json(url: str) -> dict:
@@ -226,6 +530,18 @@ def request_json(url: str) -> dict:
         raise NetworkRequestError("接口请求失败: 超时") from exc
 
 
+def stage_codec(stage: str) -> str:
+    """返回指定输出阶段的分段压缩方式。"""
+    return SEGMENT_COMPRESSION.get(stage, "none")
+
+
+def snapshot_writer_codec(stage: str) -> str:
+    """返回快照阶段写入器使用的格式，列式输出时替代分段压缩方式。"""
+    if SNAPSHOT_FORMAT in COLUMNAR_FORMATS:
+        return SNAPSHOT_FORMAT
+    return stage_codec(stage)
+
+
 def build_dirs(exchange: str, market: str) -> tuple[Path, Path, Path, str, str, str]:
     """构造目录与文件标签。"""
     return (
@@ -238,31 +554,48 @@ def build_dirs(exchange: str, market: str) -> tuple[Path, Path, Path, str, str,
     )
 
 
-def build_file_path(base_dir: Path, symbol: str, hour_str: str, tag: str) -> Path:
-    """构造单小时JSON文件路径。"""
-    file_name = f"{symbol}-{tag}-{hour_str}.json"
+def build_file_path(base_dir: Path, symbol: str, hour_str: str, tag: str, codec: str = "none") -> Path:
+    """构造单小时JSON文件路径，压缩分段追加压缩后缀，列式格式时为该小时首个列式分段路径。"""
+    suffix = f".{codec}" if codec in COLUMNAR_FORMATS else segment_suffix(codec)
+    file_name = f"{symbol}-{tag}-{hour_str}{suffix}"
     return base_dir / symbol / hour_str / file_name
 
 
-def ensure_writer(base_dir: Path, symbol: str, hour_str: str, tag: str, writer):
-    """按小时切换输出文件句柄。"""
+def ensure_writer(base_dir: Path, symbol: str, hour_str: str, tag: str, writer, codec: str = "none"):
+    """按小时切换输出文件句柄，已结束小时的去重键索引随之删除。"""
     if writer and writer[0] == hour_str:
         return writer
     if writer:
-        writer = flush_writer_buffer(writer)
-        writer[2].close()
-        upload_file_to_s3(writer[1])
-    path = build_file_path(base_dir, symbol, hour_str, tag)
+        close_writer(writer)
+        LAST_WRITTEN_KEYS.pop(str(writer[1].resolve()), None)
+        if writer[7] is not None:
+            remove_key_index(writer[1])
+    if codec in COLUMNAR_FORMATS:
+        from cex.cex_orderbook_columnar_common import ColumnarSegmentWriter, build_columnar_path
+
+        path = build_columnar_path(base_dir, symbol, hour_str, tag, codec)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return [hour_str, path, ColumnarSegmentWriter(path, codec), [], 0, time.monotonic(), codec, None]
+    path = build_file_path(base_dir, symbol, hour_str, tag, codec)
     path.parent.mkdir(parents=True, exist_ok=True)
-    return [hour_str, path, path.open("a", encoding="utf-8"), [], 0, time.monotonic()]
+    key_buffer = [] if prepare_key_index(path) else None
+    return [hour_str, path, open_segment_file(path, codec), [], 0, time.monotonic(), codec, key_buffer]
 
 
 def flush_writer_buffer(writer):
     """刷出单个文件句柄的缓冲内容。"""
     if not writer or not writer[3]:
         return writer
-    writer[2].write("".join(writer[3]))
-    writer[2].flush()
+    if writer[6] in COLUMNAR_FORMATS:
+        writer[2].write_snapshots(writer[3])
+    else:
+        write_segment_text(writer[2], writer[6], "".join(writer[3]))
+        if writer[7] is not None:
+            append_key_index(writer[1], writer[7])
+            LAST_WRITTEN_KEYS[str(writer[1].resolve())] = writer[7][-1]
+            writer[7].clear()
+        else:
+            LAST_WRITTEN_KEYS[str(writer[1].resolve())] = build_line_dedupe_key(writer[3][-1])
     writer[3].clear()
     writer[4] = 0
     writer[5] = time.monotonic()
@@ -270,11 +603,11 @@ def flush_writer_buffer(writer):
 
 
 def close_writer(writer) -> None:
-    """关闭输出文件句柄。"""
+    """关闭输出文件句柄，保留去重键索引供交接补写与重开同一文件续写使用。"""
     if writer:
         writer = flush_writer_buffer(writer)
         writer[2].close()
-        upload_file_to_s3(writer[1])
+        submit_upload(writer[1])
 
 
 def close_writers(rt_writer, rt_ss_writer, rt_ss_1s_writer) -> tuple[None, None, None]:
@@ -290,51 +623,97 @@ def hour_str_from_ms(ts_ms: int) -> str:
     return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y%m%d%H")
 
 
-def format_number(value: float) -> str:
-    """格式化盘口价格与数量。"""
-    text = f"{value:.10f}".rstrip("0").rstrip(".")
-    return text if text else "0"
+def list_okx_instrument_scales(market: str) -> dict[str, tuple[int, int]]:
+    """拉取OKX合约价格精度与数量精度对应的小数位。"""
+    inst_types = ["SPOT"] if market == "spot" else ["SWAP", "FUTURES"]
+    scales = {}
+    for inst_type in inst_types:
+        payload = request_json(f"{OKX_INSTRUMENTS_URL}?{urlencode({'instType': inst_type})}")
+        if payload.get("code") != "0":
+            raise NetworkRequestError(f"接口返回错误: {payload.get('msg')}")
+        for item in payload.get("data", []):
+            if item.get("tickSz") and item.get("lotSz"):
+                scales[item["instId"]] = (decimal_places(item["tickSz"]), decimal_places(item["lotSz"]))
+    return scales
 
 
-def replace_orderbook(orderbook: dict, bids: list, asks: list) -> None:
-    """用快照整体替换内存盘口。"""
-    orderbook["bids"] = {float(price): float(size) for price, size in bids}
-    orderbook["asks"] = {float(price): float(size) for price, size in asks}
+def list_bybit_instrument_scales(market: str) -> dict[str, tuple[int, int]]:
+    """拉取Bybit合约价格精度与数量精度对应的小数位。"""
+    category = "spot" if market == "spot" else "linear"
+    scales = {}
+    cursor = None
+    while True:
+        payload = request_json(build_bybit_instruments_url("Trading", cursor, category))
+        if payload.get("retCode") != 0:
+            raise NetworkRequestError(f"接口返回错误: {payload.get('retMsg')}")
+        result = payload.get("result", {})
+        for item in result.get("list", []):
+            tick_size = item.get("priceFilter", {}).get("tickSize")
+            lot_filter = item.get("lotSizeFilter", {})
+            qty_step = lot_filter.get("qtyStep") or lot_filter.get("basePrecision")
+            if tick_size and qty_step:
+                scales[item["symbol"]] = (decimal_places(tick_size), decimal_places(qty_step))
+        cursor = result.get("nextPageCursor")
+        if not cursor:
+            break
+    return scales
 
 
-def apply_orderbook_delta(orderbook: dict, bids: list, asks: list) -> None:
-    """将增量更新应用到内存盘口。"""
-    for price_text, size_text in bids:
-        price = float(price_text)
-        size = float(size_text)
-        if size == 0:
-            orderbook["bids"].pop(price, None)
-        else:
-            orderbook["bids"][price] = size
-    for price_text, size_text in asks:
-        price = float(price_text)
-        size = float(size_text)
-        if size == 0:
-            orderbook["asks"].pop(price, None)
-        else:
-            orderbook["asks"][price] = size
+def refresh_instrument_scales(exchange: str, market: str, symbols: list) -> None:
+    """在监督循环中预取整个市场的合约精度，缓存缺少交易对且超过刷新间隔时重拉，网络请求期间不持有缓存锁。"""
+    if not TICK_PRICES_ENABLED:
+        return
+    if exchange == "okx":
+        fetch = list_okx_instrument_scales
+    elif exchange == "bybit":
+        fetch = list_bybit_instrument_scales
+    else:
+        return
+    with INSTRUMENT_SCALES_LOCK:
+        cached = INSTRUMENT_SCALES.get((exchange, market))
+    if cached is not None and (all(symbol in cached["scales"] for symbol in symbols) or time.monotonic() - cached["ts"] < DELIVERY_REFRESH_SECONDS):
+        return
+    try:
+        scales = fetch(market)
+    except NetworkRequestError as exc:
+        log(f"{exchange} {market} 合约精度拉取失败，本轮使用浮点盘口: {exc}", market)
+        scales = cached["scales"] if cached is not None else {}
+    with INSTRUMENT_SCALES_LOCK:
+        INSTRUMENT_SCALES[(exchange, market)] = {"ts": time.monotonic(), "scales": scales}
+
+
+def get_instrument_scales(exchange: str, market: str, symbol: str) -> tuple[int, int] | None:
+    """返回缓存中交易对价格与数量小数位，缓存由监督循环预取，未预取或缺少该交易对时返回空。"""
+    with INSTRUMENT_SCALES_LOCK:
+        cached = INSTRUMENT_SCALES.get((exchange, market))
+    return cached["scales"].get(symbol) if cached is not None else None
 
 
-def trim_orderbook(orderbook: dict) -> None:
-    """裁剪内存盘口，避免长期累积过深。"""
-    if len(orderbook["bids"]) > KEEP_ORDERBOOK_LEVELS:
-        keep_prices = sorted(orderbook["bids"], reverse=True)[:KEEP_ORDERBOOK_LEVELS]
-        orderbook["bids"] = {price: orderbook["bids"][price] for price in keep_prices}
-    if len(orderbook["asks"]) > KEEP_ORDERBOOK_LEVELS:
-        keep_prices = sorted(orderbook["asks"])[:KEEP_ORDERBOOK_LEVELS]
-        orderbook["asks"] = {price: orderbook["asks"][price] for price in keep_prices}
+def build_orderbook(exchange: str, market: str, symbol: str, depth: int) -> SortedOrderBook:
+    """构造带前N档缓存的内存盘口，能取到合约精度时以整数刻度为键，列式输出时档位保留浮点数，校验和检查时保留原始文本。"""
+    keep_raw = CHECKSUM_CHECK_ENABLED and exchange in CHECKSUM_EXCHANGES
+    formatter = float if SNAPSHOT_FORMAT in COLUMNAR_FORMATS else format_number
+    scales = get_instrument_scales(exchange, market, symbol) if TICK_PRICES_ENABLED else None
+    if scales is not None:
+        return TickOrderBook(depth, KEEP_ORDERBOOK_LEVELS, scales[0], scales[1], formatter=formatter, keep_raw=keep_raw)
+    return SortedOrderBook(depth, KEEP_ORDERBOOK_LEVELS, formatter=formatter, keep_raw=keep_raw)
+
+
+def replace_orderbook(orderbook: SortedOrderBook, bids: list, asks: list) -> None:
+    """用快照整体替换内存盘口。"""
+    orderbook.replace(bids, asks)
+
+
+def apply_orderbook_delta(orderbook: SortedOrderBook, bids: list, asks: list) -> None:
+    """将增量更新应用到内存盘口。"""
+    orderbook.apply_delta(bids, asks)
 
 
 def build_snapshot(
     exchange: str,
     market: str,
     symbol: str,
-    orderbook: dict,
+    orderbook: SortedOrderBook,
     update_type: str,
     ts_ms: int,
     cts_ms: int,
@@ -344,10 +723,24 @@ def build_snapshot(
     depth: int,
 ) -> dict:
     """构造统一快照结构。"""
-    bids_sorted = sorted(orderbook["bids"].items(), key=lambda item: item[0], reverse=True)[:depth]
-    asks_sorted = sorted(orderbook["asks"].items(), key=lambda item: item[0])[:depth]
-    best_bid = bids_sorted[0][0] if bids_sorted else None
-    best_ask = asks_sorted[0][0] if asks_sorted else None
+    header = build_snapshot_header(exchange, market, symbol, orderbook, update_type, ts_ms, cts_ms, collect_ts, update_id, seq, depth)
+    return materialize_snapshot(header, orderbook, depth)
+
+
+def build_snapshot_header(
+    exchange: str,
+    market: str,
+    symbol: str,
+    orderbook: SortedOrderBook,
+    update_type: str,
+    ts_ms: int,
+    cts_ms: int,
+    collect_ts: int,
+    update_id: int | None,
+    seq: int | None,
+    depth: int,
+) -> dict:
+    """构造未填充档位的快照头，合并输出时延后到真正输出前再取前N档。"""
     return {
         "symbol": symbol,
         "update_type": update_type,
@@ -356,19 +749,31 @@ def build_snapshot(
         "collect_ts": collect_ts,
         "update_id": update_id,
         "seq": seq,
-        "best_bid": best_bid,
-        "best_ask": best_ask,
-        "bid_depth": len(bids_sorted),
-        "ask_depth": len(asks_sorted),
-        "bids": [[format_number(price), format_number(size)] for price, size in bids_sorted],
-        "asks": [[format_number(price), format_number(size)] for price, size in asks_sorted],
+        "best_bid": None,
+        "best_ask": None,
+        "bid_depth": 0,
+        "ask_depth": 0,
+        "bids": None,
+        "asks": None,
     }
 
 
-def build_bybit_instruments_url(status: str, cursor: str | None) -> str:
+def materialize_snapshot(snapshot: dict, orderbook: SortedOrderBook, depth: int) -> dict:
+    """按盘口当前状态填充快照的前N档与最优价。"""
+    bid_prices, bid_levels, ask_prices, ask_levels = orderbook.top_levels(depth)
+    snapshot["best_bid"] = orderbook.price_value(bid_prices[0]) if bid_prices else None
+    snapshot["best_ask"] = orderbook.price_value(ask_prices[0]) if ask_prices else None
+    snapshot["bid_depth"] = len(bid_levels)
+    snapshot["ask_depth"] = len(ask_levels)
+    snapshot["bids"] = bid_levels
+    snapshot["asks"] = ask_levels
+    return snapshot
+
+
+def build_bybit_instruments_url(status: str, cursor: str | None, category: str = "linear") -> str:
     """构造Bybit合约列表接口。"""
     params = {
-        "category": "linear",
+        "category": category,
         "status": status,
         "limit": INSTRUMENTS_LIMIT,
     }
@@ -540,6 +945,31 @@ def build_ws_urls(exchange: str, market: str, symbol: str) -> list[str]:
     return [primary_url, primary_url]
 
 
+def symbols_per_connection(exchange: str) -> int:
+    """返回指定交易所单连接订阅的交易对数。"""
+    if exchange == "binance":
+        return 1
+    return max(1, int(SYMBOLS_PER_CONNECTION.get(exchange, 1)))
+
+
+def plan_symbol_groups(current_groups: list[tuple[str, ...]], desired_symbols: list[str], group_size: int) -> list[tuple[str, ...]]:
+    """保留仍有效的连接分组并将新增交易对打包为新分组。"""
+    desired_set = set(desired_symbols)
+    groups = [group for group in current_groups if set(group) <= desired_set]
+    assigned = {symbol for group in groups for symbol in group}
+    pending = sorted(desired_set - assigned)
+    for index in range(0, len(pending), group_size):
+        groups.append(tuple(pending[index : index + group_size]))
+    return groups
+
+
+def group_label(symbols: tuple[str, ...]) -> str:
+    """返回连接分组的显示名称。"""
+    if len(symbols) == 1:
+        return symbols[0]
+    return f"{symbols[0]}等{len(symbols)}个"
+
+
 def build_session_state() -> dict:
     """构造主备连接共享状态。"""
     return {
@@ -548,6 +978,15 @@ def build_session_state() -> dict:
         "connected": {PRIMARY_ROLE: False, BACKUP_ROLE: False},
         "recv_count": {PRIMARY_ROLE: 0, BACKUP_ROLE: 0},
         "status_text": {PRIMARY_ROLE: "准备连接", BACKUP_ROLE: "准备连接"},
+        "gap_count": 0,
+        "resync_count": 0,
+        "merge_lock": threading.Lock(),
+        "merge_output": None,
+        "merge_stages": {stage_name: build_merge_stage() for stage_name in MERGE_STAGES},
+        "merge_dup_count": 0,
+        "merge_late_count": 0,
+        "merge_pending_snapshot": None,
+        "merge_last_emit_ts": 0,
     }
 
 
@@ -593,7 +1032,10 @@ def build_ws_status_text(state: dict) -> tuple[int, str]:
     else:
         role_summary = "双断重连中"
     online_flag = 1 if state["connected"][active_role] else 0
-    return online_flag, f"{role_summary} | 主:{primary_short} 备:{backup_short} | 消息:{active_count}"
+    status_text = f"{role_summary} | 主:{primary_short} 备:{backup_short} | 消息:{active_count}"
+    if state["gap_count"] or state["resync_count"]:
+        status_text += f" | 缺口:{state['gap_count']} 重同步:{state['resync_count']}"
+    return online_flag, status_text
 
 
 def is_active_role(state: dict, role: str) -> bool:
@@ -625,6 +1067,18 @@ def update_shared_status(
     status_update(exchange, market, symbol, (online_flag, status_text_value))
 
 
+def update_group_status(states: dict, exchange: str, market: str, symbols: tuple[str, ...], role: str, **kwargs) -> None:
+    """按连接分组批量更新各交易对的主备状态。"""
+    for symbol in symbols:
+        update_shared_status(states[symbol], exchange, market, symbol, role, **kwargs)
+
+
+def switch_group_role(states: dict, exchange: str, market: str, symbols: tuple[str, ...], failed_role: str) -> None:
+    """在连接分组失效时逐个交易对切换主备角色。"""
+    for symbol in symbols:
+        switch_active_role(states[symbol], exchange, market, symbol, failed_role)
+
+
 def switch_active_role(state: dict, exchange: str, market: str, symbol: str, failed_role: str) -> None:
     """在主连接失效时切换到另一个角色。"""
     next_role = other_role(failed_role)
@@ -638,20 +1092,41 @@ def switch_active_role(state: dict, exchange: str, market: str, symbol: str, fai
     update_shared_status(state, exchange, market, symbol, failed_role)
 
 
-def send_subscribe(ws: websocket.WebSocket, exchange: str, market: str, symbol: str, depth: int) -> None:
-    """发送订阅请求。"""
+def build_subscribe_arg(exchange: str, market: str, symbol: str, depth: int):
+    """构造单个交易对的订阅参数。"""
     if exchange == "bybit":
-        payload = {"op": "subscribe", "args": [f"orderbook.{depth}.{symbol}"]}
-        ws.send(json.dumps(payload, ensure_ascii=True, separators=(",", ":")))
-        return
+        return f"orderbook.{depth}.{symbol}"
     if exchange == "bitget":
         inst_type = "USDT-FUTURES" if market == "future" else "SPOT"
-        payload = {"op": "subscribe", "args": [{"instType": inst_type, "channel": "books", "instId": symbol}]}
-        ws.send(json.dumps(payload, ensure_ascii=True, separators=(",", ":")))
-        return
+        return {"instType": inst_type, "channel": "books", "instId": symbol}
     if exchange == "okx":
-        payload = {"op": "subscribe", "args": [{"channel": "books", "instId": symbol}]}
-        ws.send(json.dumps(payload, ensure_ascii=True, separators=(",", ":")))
+        return {"channel": "books", "instId": symbol}
+    return None
+
+
+def build_subscribe_payloads(exchange: str, market: str, symbols: tuple[str, ...], depth: int) -> list[str]:
+    """按批次构造一组交易对的订阅请求内容。"""
+    args = [build_subscribe_arg(exchange, market, symbol, depth) for symbol in symbols]
+    args = [arg for arg in args if arg is not None]
+    payloads = []
+    for index in range(0, len(args), SUBSCRIBE_BATCH_SIZE):
+        payload = {"op": "subscribe", "args": args[index : index + SUBSCRIBE_BATCH_SIZE]}
+        payloads.append(json.dumps(payload, ensure_ascii=True, separators=(",", ":")))
+    return payloads
+
+
+def build_resync_payloads(exchange: str, market: str, symbol: str, depth: int) -> list[str]:
+    """构造单个交易对先退订再订阅的请求内容，用于同连接内重新获取完整快照。"""
+    arg = build_subscribe_arg(exchange, market, symbol, depth)
+    if arg is None:
+        return []
+    return [json.dumps({"op": op, "args": [arg]}, ensure_ascii=True, separators=(",", ":")) for op in ("unsubscribe", "subscribe")]
+
+
+def send_subscribe(ws: websocket.WebSocket, exchange: str, market: str, symbols: tuple[str, ...], depth: int) -> None:
+    """发送订阅请求。"""
+    for payload in build_subscribe_payloads(exchange, market, symbols, depth):
+        ws.send(payload)
 
 
 def ping_payload(exchange: str) -> str | None:
@@ -742,9 +1217,10 @@ def normalize_okx_raw(message: dict, item: dict, collect_ts: int, symbol: str, d
     }
 
 
-def apply_bybit_message(orderbook: dict, market: str, symbol: str, message: dict, collect_ts: int, depth: int) -> tuple[dict, bool]:
+def apply_bybit_message(
+    orderbook: SortedOrderBook, market: str, symbol: str, message: dict, collect_ts: int, depth: int, build=build_snapshot
+) -> dict | None:
     """处理Bybit消息并生成快照。"""
-    raw_record = normalize_bybit_raw(message, collect_ts, market, symbol)
     msg_type = message.get("type", "")
     data = message.get("data", {})
     if msg_type == "snapshot":
@@ -752,9 +1228,8 @@ def apply_bybit_message(orderbook: dict, market: str, symbol: str, message: dict
     elif msg_type == "delta":
         apply_orderbook_delta(orderbook, data.get("b", []), data.get("a", []))
     else:
-        return raw_record, False
-    trim_orderbook(orderbook)
-    snapshot = build_snapshot(
+        return None
+    return build(
         "bybit",
         market,
         data.get("s", symbol),
@@ -767,22 +1242,20 @@ def apply_bybit_message(orderbook: dict, market: str, symbol: str, message: dict
         int(data.get("seq", data.get("u", "0")) or 0),
         depth,
     )
-    return raw_record, snapshot
 
 
 def apply_binance_message(
-    orderbook: dict,
+    orderbook: SortedOrderBook,
     market: str,
     symbol: str,
     message: dict,
     collect_ts: int,
     depth: int,
-) -> tuple[dict, dict]:
+    build=build_snapshot,
+) -> dict:
     """处理Binance消息并生成快照。"""
-    raw_record = normalize_binance_raw(message, collect_ts, message.get("s", symbol), depth)
     replace_orderbook(orderbook, message.get("b", []), message.get("a", []))
-    trim_orderbook(orderbook)
-    snapshot = build_snapshot(
+    return build(
         "binance",
         market,
         message.get("s", symbol),
@@ -795,29 +1268,27 @@ def apply_binance_message(
         int(message.get("u", "0") or 0),
         depth,
     )
-    return raw_record, snapshot
 
 
-def apply_bitget_message(orderbook: dict, market: str, symbol: str, message: dict, collect_ts: int, depth: int) -> tuple[list, list]:
+def apply_bitget_message(
+    orderbook: SortedOrderBook, market: str, symbol: str, message: dict, collect_ts: int, depth: int, build=build_snapshot
+) -> list:
     """处理Bitget消息并生成快照列表。"""
-    raw_records = []
     if message.get("event") == "subscribe":
-        return raw_records, []
+        return []
     action = message.get("action", "")
     snapshots = []
     for item in message.get("data", []):
-        raw_records.append(normalize_bitget_raw(message, item, collect_ts, symbol, depth))
         if action == "snapshot":
             replace_orderbook(orderbook, item.get("bids", []), item.get("asks", []))
         elif action == "update":
             apply_orderbook_delta(orderbook, item.get("bids", []), item.get("asks", []))
         else:
             continue
-        trim_orderbook(orderbook)
         ts_ms = int(item.get("ts", "0") or 0)
         seq = int(item.get("seq", "0") or 0)
         snapshots.append(
-            build_snapshot(
+            build(
                 "bitget",
                 market,
                 message.get("arg", {}).get("instId", symbol),
@@ -831,7 +1302,7 @@ def apply_bitget_message(orderbook: dict, market: str, symbol: str, message: dic
                 depth,
             )
         )
-    return raw_records, snapshots
+    return snapshots
 
 
 def normalize_okx_levels(levels: list) -> list:
@@ -839,15 +1310,15 @@ def normalize_okx_levels(levels: list) -> list:
     return [[level[0], level[1]] for level in levels if len(level) >= 2]
 
 
-def apply_okx_message(orderbook: dict, market: str, symbol: str, message: dict, collect_ts: int, depth: int) -> tuple[list, list]:
+def apply_okx_message(
+    orderbook: SortedOrderBook, market: str, symbol: str, message: dict, collect_ts: int, depth: int, build=build_snapshot
+) -> list:
     """处理OKX消息并生成快照列表。"""
-    raw_records = []
     if message.get("event") == "subscribe":
-        return raw_records, []
+        return []
     action = message.get("action", "")
     snapshots = []
     for item in message.get("data", []):
-        raw_records.append(normalize_okx_raw(message, item, collect_ts, symbol, depth))
         asks = normalize_okx_levels(item.get("asks", []))
         bids = normalize_okx_levels(item.get("bids", []))
         if action == "snapshot":
@@ -856,12 +1327,11 @@ def apply_okx_message(orderbook: dict, market: str, symbol: str, message: dict,
             apply_orderbook_delta(orderbook, bids, asks)
         else:
             continue
-        trim_orderbook(orderbook)
         ts_ms = int(item.get("ts", "0") or 0)
         update_id = int(item.get("seqId", item.get("ts", "0")) or 0)
         previous_id = int(item.get("prevSeqId", update_id) or update_id)
         snapshots.append(
-            build_snapshot(
+            build(
                 "okx",
                 market,
                 message.get("arg", {}).get("instId", symbol),
@@ -875,13 +1345,73 @@ def apply_okx_message(orderbook: dict, market: str, symbol: str, message: dict,
                 depth,
             )
         )
-    return raw_records, snapshots
+    return snapshots
+
+
+def normalize_raw_records(exchange: str, market: str, symbol: str, message: dict, collect_ts: int, depth: int) -> list:
+    """将单条交易所消息归一化为Bybit样式的原始记录列表。"""
+    if exchange == "bybit":
+        return [normalize_bybit_raw(message, collect_ts, market, symbol)]
+    if exchange == "binance":
+        return [normalize_binance_raw(message, collect_ts, message.get("s", symbol), depth)]
+    if message.get("event") == "subscribe":
+        return []
+    if exchange == "bitget":
+        return [normalize_bitget_raw(message, item, collect_ts, symbol, depth) for item in message.get("data", [])]
+    return [normalize_okx_raw(message, item, collect_ts, symbol, depth) for item in message.get("data", [])]
+
+
+def build_raw_frame_line(raw: str, collect_ts: int, symbol: str) -> str:
+    """将交易所原始帧包装为带采集时间的单行信封，帧内容原样保留。"""
+    return f'{{"collect_ts":{collect_ts},"symbol":"{symbol}","raw":{raw}}}\n'
+
+
+def build_rt_records(context: dict, message: dict, raw: str, collect_ts: int) -> list:
+    """构造rt文件记录，原始帧直写模式下为整行文本，否则为归一化字典。"""
+    exchange = context["exchange"]
+    if not RT_RAW_PASSTHROUGH:
+        return normalize_raw_records(exchange, context["market"], context["symbol"], message, collect_ts, context["depth"])
+    if exchange in {"bitget", "okx"} and message.get("event") in {"subscribe", "unsubscribe"}:
+        return []
+    return [build_raw_frame_line(raw, collect_ts, context["symbol"])]
+
+
+def iter_rt_records(file_path: Path, exchange: str, market: str):
+    """逐条读取rt文件并输出归一化记录，兼容原始帧信封与归一化两种行格式。"""
+    depth = market_depth(market)
+    for line in iter_segment_lines(file_path):
+        if not line.strip():
+            continue
+        record = orjson.loads(line)
+        if "raw" not in record:
+            yield record
+            continue
+        yield from normalize_raw_records(exchange, market, record["symbol"], record["raw"], record["collect_ts"], depth)
+
+
+def encode_json_line(payload: dict) -> str:
+    """将记录编码为单行JSON文本。"""
+    return json.dumps(payload, ensure_ascii=True, separators=(",", ":")) + "\n"
+
+
+def encode_rt_record(record) -> str:
+    """将rt记录编码为单行文本，原始帧信封已是整行文本。"""
+    if isinstance(record, str):
+        return record
+    return encode_json_line(record)
 
 
 def write_json_line(writer, payload: dict):
     """写入单行JSON记录。"""
-    line = json.dumps(payload, ensure_ascii=True, separators=(",", ":")) + "\n"
+    dedupe_key = build_buffer_dedupe_key(payload) if writer[7] is not None else None
+    return write_text_line(writer, encode_json_line(payload), dedupe_key)
+
+
+def write_text_line(writer, line: str, dedupe_key: tuple | None = None):
+    """写入已编码的单行文本，开启键索引时同步记录去重键。"""
     writer[3].append(line)
+    if writer[7] is not None:
+        writer[7].append(dedupe_key if dedupe_key is not None else build_line_dedupe_key(line))
     writer[4] += len(line)
     now_ts = time.monotonic()
     if (
@@ -893,53 +1423,833 @@ def write_json_line(writer, payload: dict):
     return writer
 
 
-def build_snapshot_file_path(base_dir: Path, symbol: str, tag: str, snapshot: dict) -> Path:
+def write_snapshot_line(writer, snapshot: dict):
+    """写入单条快照，列式写入器按行数阈值成批写出。"""
+    if writer[6] not in COLUMNAR_FORMATS:
+        return write_json_line(writer, snapshot)
+    writer[3].append(snapshot)
+    writer[4] += 1
+    if writer[4] >= COLUMNAR_BATCH_ROWS:
+        flush_writer_buffer(writer)
+    return writer
+
+
+def build_snapshot_file_path(base_dir: Path, symbol: str, tag: str, snapshot: dict, codec: str = "none") -> Path:
     """按快照时间构造输出文件路径。"""
-    return build_file_path(base_dir, symbol, hour_str_from_ms(snapshot["collect_ts"]), tag)
+    return build_file_path(base_dir, symbol, hour_str_from_ms(snapshot["collect_ts"]), tag, codec)
 
 
-def flush_second_snapshot(last_snapshot: dict | None, writer, base_dir: Path, tag: str, symbol: str):
+def flush_second_snapshot(last_snapshot: dict | None, writer, base_dir: Path, tag: str, symbol: str, codec: str = "none"):
     """将上一秒快照写入秒级文件。"""
     if not last_snapshot:
         return writer
     snapshot_hour = hour_str_from_ms(last_snapshot["collect_ts"])
-    writer = ensure_writer(base_dir, symbol, snapshot_hour, tag, writer)
-    writer = write_json_line(writer, last_snapshot)
+    writer = ensure_writer(base_dir, symbol, snapshot_hour, tag, writer, codec)
+    writer = write_snapshot_line(writer, last_snapshot)
     return writer
 
 
-def run_session(exchange: str, market: str, symbol: str, role: str, ws_url: str, stop_event: threading.Event, state: dict) -> None:
-    """运行单个角色的一次WS会话。"""
-    depth = app_config.ORDERBOOK_DEPTH_FUTURE if market == "future" else app_config.ORDERBOOK_DEPTH_SPOT
+def market_depth(market: str) -> int:
+    """返回指定市场的快照输出深度。"""
+    return app_config.ORDERBOOK_DEPTH_FUTURE if market == "future" else app_config.ORDERBOOK_DEPTH_SPOT
+
+
+def handle_session_error(
+    states: dict, exchange: str, market: str, symbols: tuple[str, ...], role: str, status_text: str, exc: BaseException
+) -> None:
+    """记录单个角色的连接错误并触发主备切换。"""
+    update_group_status(states, exchange, market, symbols, role, connected=False, status_text=status_text)
+    switch_group_role(states, exchange, market, symbols, role)
+    log(f"{exchange} {market} {group_label(symbols)} {role_label(role)}{status_text}，准备重连: {exc}", market)
+
+
+def build_session_context(exchange: str, market: str, symbol: str, role: str, state: dict) -> dict:
+    """构造单次WS会话的处理上下文。"""
+    depth = market_depth(market)
     rt_dir, rt_ss_dir, rt_ss_1s_dir, rt_tag, rt_ss_tag, rt_ss_1s_tag = build_dirs(exchange, market)
+    return {
+        "exchange": exchange,
+        "market": market,
+        "symbol": symbol,
+        "role": role,
+        "state": state,
+        "depth": depth,
+        "rt_dir": rt_dir,
+        "rt_ss_dir": rt_ss_dir,
+        "rt_ss_1s_dir": rt_ss_1s_dir,
+        "rt_tag": rt_tag,
+        "rt_ss_tag": rt_ss_tag,
+        "rt_ss_1s_tag": rt_ss_1s_tag,
+        "rt_codec": stage_codec("rt"),
+        "rt_ss_writer_codec": snapshot_writer_codec("rt_ss"),
+        "rt_ss_1s_writer_codec": snapshot_writer_codec("rt_ss_1s"),
+        "rt_ss_encoder": build_encoder_state(),
+        "orderbook": build_orderbook(exchange, market, symbol, depth),
+        "sequence": build_sequence_state(),
+        "pending_snapshot": None,
+        "last_emit_ts": 0,
+        "resync_started_ts": 0.0,
+        "pending_sends": [],
+        "book_slot": None,
+        "rt_writer": None,
+        "rt_ss_writer": None,
+        "rt_ss_1s_writer": None,
+        "recv_count": 0,
+        "last_status_ts": time.monotonic(),
+        "last_second": None,
+        "last_snapshot": None,
+        "writes_pending": False,
+    }
+
+
+def build_session_contexts(exchange: str, market: str, symbols: tuple[str, ...], role: str, states: dict) -> dict[str, dict]:
+    """按交易对构造同一连接下的全部会话上下文。"""
+    return {symbol: build_session_context(exchange, market, symbol, role, states[symbol]) for symbol in symbols}
+
+
+def message_symbol(exchange: str, message: dict) -> str | None:
+    """从复用连接的消息中解析所属交易对。"""
+    if exchange == "bybit":
+        topic = str(message.get("topic") or "")
+        return topic.rsplit(".", 1)[-1] if topic else None
+    if exchange == "binance":
+        return message.get("s")
+    return message.get("arg", {}).get("instId")
+
+
+def route_session_message(exchange: str, contexts: dict[str, dict], message: dict) -> dict | None:
+    """将消息分发到所属交易对的会话上下文。"""
+    if len(contexts) == 1:
+        return next(iter(contexts.values()))
+    return contexts.get(message_symbol(exchange, message))
+
+
+def record_sequence_event(context: dict, gap: bool, resync: bool) -> None:
+    """累计交易对缺口与重同步次数并刷新状态文本。"""
+    state = context["state"]
+    with state["lock"]:
+        state["gap_count"] += 1 if gap else 0
+        state["resync_count"] += 1 if resync else 0
+    update_shared_status(state, context["exchange"], context["market"], context["symbol"], context["role"])
+
+
+def begin_symbol_resync(context: dict, reason: str) -> None:
+    """发现缺口后丢弃该交易对后续增量，并在同连接内重订阅以获取新快照。"""
+    exchange = context["exchange"]
+    sequence = context["sequence"]
+    now_ts = time.monotonic()
+    if sequence["resyncing"] and now_ts - context["resync_started_ts"] < RESYNC_TIMEOUT_SECONDS:
+        return
+    first_gap = not sequence["resyncing"]
+    resync = exchange in RESYNC_EXCHANGES
+    if resync:
+        sequence["resyncing"] = True
+        context["resync_started_ts"] = now_ts
+        context["pending_sends"].extend(build_resync_payloads(exchange, context["market"], context["symbol"], context["depth"]))
+    record_sequence_event(context, first_gap, resync)
+    action = "重订阅补快照" if resync else "丢弃该条"
+    log(f"{exchange} {context['market']} {context['symbol']} {role_label(context['role'])}盘口{reason}，{action}", context["market"])
+
+
+def check_message_sequence(context: dict, message: dict) -> bool:
+    """校验消息序号衔接，返回本条消息是否可应用到内存盘口。"""
+    exchange = context["exchange"]
+    sequence = context["sequence"]
+    snapshot = is_snapshot_message(exchange, message)
+    reason = find_sequence_gap(exchange, sequence, message)
+    if reason is not None:
+        begin_symbol_resync(context, reason)
+        return False
+    if sequence["resyncing"]:
+        if not snapshot:
+            return False
+        sequence["resyncing"] = False
+    return True
+
+
+def apply_exchange_message(context: dict, message: dict, raw: str, collect_ts: int) -> tuple[list, list]:
+    """按交易所处理单条消息并返回原始记录与快照，序号缺口或校验和不一致时不输出快照。"""
+    exchange = context["exchange"]
+    market = context["market"]
+    symbol = context["symbol"]
+    orderbook = context["orderbook"]
+    depth = context["depth"]
+    raw_records = build_rt_records(context, message, raw, collect_ts)
+    coalesce = RT_SS_COALESCE_MS > 0
+    build = build_snapshot_header if coalesce else build_snapshot
+    emitted = take_rollover_snapshot(context, collect_ts) if coalesce else []
+    if SEQUENCE_CHECK_ENABLED and exchange in SEQUENCE_EXCHANGES and not check_message_sequence(context, message):
+        if context["pending_snapshot"] is not None:
+            emitted.append(flush_pending_snapshot(context))
+        return raw_records, emitted
+    if exchange == "bybit":
+        snapshot = apply_bybit_message(orderbook, market, symbol, message, collect_ts, depth, build)
+        snapshots = [snapshot] if snapshot else []
+    elif exchange == "binance":
+        snapshots = [apply_binance_message(orderbook, market, symbol, message, collect_ts, depth, build)]
+    elif exchange == "bitget":
+        snapshots = apply_bitget_message(orderbook, market, symbol, message, collect_ts, depth, build)
+    else:
+        snapshots = apply_okx_message(orderbook, market, symbol, message, collect_ts, depth, build)
+    if snapshots and orderbook.keep_raw:
+        reason = find_checksum_mismatch(exchange, orderbook, message)
+        if reason is not None:
+            context["pending_snapshot"] = None
+            begin_symbol_resync(context, reason)
+            return raw_records, emitted
+    if context["sequence"]["resyncing"] and is_snapshot_message(exchange, message):
+        context["sequence"]["resyncing"] = False
+    if coalesce:
+        return raw_records, emitted + coalesce_snapshots(context, snapshots)
+    return raw_records, snapshots
+
+
+def flush_pending_snapshot(context: dict) -> dict:
+    """按盘口当前状态输出合并窗口内最新的快照。"""
+    pending = context["pending_snapshot"]
+    context["pending_snapshot"] = None
+    context["last_emit_ts"] = pending["collect_ts"]
+    return materialize_snapshot(pending, context["orderbook"], context["depth"])
+
+
+def take_rollover_snapshot(context: dict, collect_ts: int) -> list:
+    """新消息跨入下一秒前先输出上一秒最终状态，保证秒级快照与切分前的最后状态不丢。"""
+    pending = context["pending_snapshot"]
+    if pending is None or pending["collect_ts"] // 1000 == collect_ts // 1000:
+        return []
+    return [flush_pending_snapshot(context)]
+
+
+def coalesce_snapshots(context: dict, headers: list) -> list:
+    """合并窗口内只保留最新快照头，窗口到期或收到整体快照时输出。"""
+    if not headers:
+        return []
+    context["pending_snapshot"] = headers[-1]
+    if headers[-1]["update_type"] == "snapshot" or headers[-1]["collect_ts"] - context["last_emit_ts"] >= RT_SS_COALESCE_MS:
+        return [flush_pending_snapshot(context)]
+    return []
+
+
+def buffer_session_records(context: dict, raw_records: list, snapshots: list, collect_ts: int) -> None:
+    """在待切换期间缓存会话输出。"""
+    market = context["market"]
+    symbol = context["symbol"]
+    raw_path = build_file_path(context["rt_dir"], symbol, hour_str_from_ms(collect_ts), context["rt_tag"], context["rt_codec"])
+    for raw_record in raw_records:
+        buffer_rt_record(market, raw_path, raw_record)
+    for snapshot in snapshots:
+        snapshot_path = build_snapshot_file_path(context["rt_ss_dir"], symbol, context["rt_ss_tag"], snapshot, context["rt_ss_writer_codec"])
+        buffer_json_line(market, snapshot_path, snapshot)
+        second_bucket = int(snapshot["collect_ts"] / 1000)
+        if context["last_second"] is None:
+            context["last_second"] = second_bucket
+        if second_bucket != context["last_second"] and context["last_snapshot"]:
+            last_snapshot = context["last_snapshot"]
+            second_path = build_snapshot_file_path(
+                context["rt_ss_1s_dir"], symbol, context["rt_ss_1s_tag"], last_snapshot, context["rt_ss_1s_writer_codec"]
+            )
+            buffer_json_line(market, second_path, last_snapshot)
+            context["last_second"] = second_bucket
+        context["last_snapshot"] = snapshot
+
+
+def write_session_records(context: dict, raw_records: list, snapshots: list, collect_ts: int) -> None:
+    """将会话输出写入三类订单簿文件。"""
+    symbol = context["symbol"]
+    hour_str = hour_str_from_ms(collect_ts)
+    context["rt_writer"] = ensure_writer(context["rt_dir"], symbol, hour_str, context["rt_tag"], context["rt_writer"], context["rt_codec"])
+    for raw_record in raw_records:
+        dedupe_key = build_record_dedupe_key(raw_record) if context["rt_writer"][7] is not None else None
+        context["rt_writer"] = write_text_line(context["rt_writer"], encode_rt_record(raw_record), dedupe_key)
+    for snapshot in snapshots:
+        snapshot_hour = hour_str_from_ms(snapshot["collect_ts"])
+        previous_writer = context["rt_ss_writer"]
+        context["rt_ss_writer"] = ensure_writer(
+            context["rt_ss_dir"], symbol, snapshot_hour, context["rt_ss_tag"], context["rt_ss_writer"], context["rt_ss_writer_codec"]
+        )
+        if context["rt_ss_writer"] is not previous_writer:
+            context["rt_ss_encoder"] = build_encoder_state()
+        context["rt_ss_writer"] = write_snapshot_line(context["rt_ss_writer"], encode_rt_ss_snapshot(context, snapshot))
+        second_bucket = int(snapshot["collect_ts"] / 1000)
+        if context["last_second"] is None:
+            context["last_second"] = second_bucket
+        if second_bucket != context["last_second"] and context["last_snapshot"]:
+            context["rt_ss_1s_writer"] = flush_second_snapshot(
+                context["last_snapshot"],
+                context["rt_ss_1s_writer"],
+                context["rt_ss_1s_dir"],
+                context["rt_ss_1s_tag"],
+                symbol,
+                context["rt_ss_1s_writer_codec"],
+            )
+            context["last_second"] = second_bucket
+        context["last_snapshot"] = snapshot
+
+
+def encode_rt_ss_snapshot(context: dict, snapshot: dict) -> dict:
+    """按rt_ss编码方式返回待写入记录，差分编码下每个新文件以关键帧开头。"""
+    if RT_SS_ENCODING != "delta" or context["rt_ss_writer_codec"] in COLUMNAR_FORMATS:
+        return snapshot
+    return encode_snapshot_record(context["rt_ss_encoder"], snapshot, RT_SS_KEYFRAME_INTERVAL)
+
+
+def close_session_writers(context: dict) -> None:
+    """关闭会话持有的全部写入器。"""
+    context["rt_writer"], context["rt_ss_writer"], context["rt_ss_1s_writer"] = close_writers(
+        context["rt_writer"], context["rt_ss_writer"], context["rt_ss_1s_writer"]
+    )
+
+
+def handle_session_message(exchange: str, contexts: dict[str, dict], raw: str) -> list[str]:
+    """解析单条WS文本消息并分发到所属交易对处理，返回需由调用方在本连接发送的重同步请求。"""
+    if raw == "pong":
+        return []
+    collect_ts = int(datetime.now(tz=timezone.utc).timestamp() * 1000)
+    message = orjson.loads(raw)
+    context = route_session_message(exchange, contexts, message)
+    if context is None:
+        return []
+    process_session_message(context, message, raw, collect_ts)
+    if not context["pending_sends"]:
+        return []
+    payloads = context["pending_sends"]
+    context["pending_sends"] = []
+    return payloads
+
+
+def process_session_message(context: dict, message: dict, raw: str, collect_ts: int) -> None:
+    """处理单个交易对的消息并按主备状态落盘。"""
+    market = context["market"]
+    role = context["role"]
+    state = context["state"]
+    context["recv_count"] += 1
+    now_status_ts = time.monotonic()
+    if now_status_ts - context["last_status_ts"] >= STATUS_INTERVAL_SECONDS:
+        recv_count = context["recv_count"]
+        update_shared_status(
+            state, context["exchange"], market, context["symbol"], role, connected=True, status_text=f"已连接 {recv_count}", recv_count=recv_count
+        )
+        context["last_status_ts"] = now_status_ts
+    raw_records, snapshots = apply_exchange_message(context, message, raw, collect_ts)
+    if PRIMARY_BACKUP_MERGE:
+        submit_merged_records(context, message, raw_records, snapshots, collect_ts)
+        return
+    if not is_active_role(state, role):
+        if context["writes_pending"]:
+            submit_write_job(context, "close")
+            context["writes_pending"] = False
+        return
+    if SHM_PUBLISH_ENABLED:
+        publish_session_book(context, snapshots)
+    if PUBSUB_ENABLED and pubsub.CLIENTS:
+        fan_out_session_records(context, message, raw_records, snapshots, collect_ts)
+    if snapshots:
+        record_message_latency(market, collect_ts - int(snapshots[-1]["ts"] or collect_ts))
+    submit_write_job(context, "records", (raw_records, snapshots, collect_ts))
+    context["writes_pending"] = True
+
+
+def publish_session_book(context: dict, snapshots: list) -> None:
+    """将交易对盘口最新状态发布到共享内存槽位，未持有落盘权时不发布以免与正在落盘的进程交替覆盖。"""
+    latest = context["pending_snapshot"] or (snapshots[-1] if snapshots else None)
+    if latest is None or WRITES_RELEASED.is_set() or not is_market_write_enabled(context["market"]):
+        return
+    if context["book_slot"] is None:
+        context["book_slot"] = open_book_slot(SHM_DIR, context["exchange"], context["market"], context["symbol"], context["depth"])
+    publish_book(context["book_slot"], context["orderbook"], int(latest["ts"] or 0), latest["collect_ts"], latest["update_id"])
+
+
+def fan_out_session_records(context: dict, message: dict, raw_records: list, snapshots: list, collect_ts: int) -> None:
+    """将归一化增量与快照分发给本地订阅者，原始帧直写模式下仅在有rt订阅者时另行归一化。"""
+    exchange = context["exchange"]
+    market = context["market"]
+    symbol = context["symbol"]
+    rt_topic = (exchange, market, symbol, "rt")
+    if raw_records and pubsub.has_subscribers(rt_topic):
+        if RT_RAW_PASSTHROUGH:
+            raw_records = normalize_raw_records(exchange, market, symbol, message, collect_ts, context["depth"])
+        pubsub.publish(rt_topic, raw_records)
+    if snapshots:
+        pubsub.publish((exchange, market, symbol, "rt_ss"), snapshots)
+
+
+def build_merge_stage() -> dict:
+    """构造主备合并单个输出阶段（原始记录或快照）的去重与重排状态。"""
+    return {"last_id": None, "window": deque(), "seen": set(), "pending": {}, "published_id": None}
+
+
+def release_merge_stage(stage: dict, cutoff: int) -> list:
+    """按序号升序取出重排窗口内不大于截止序号的条目并登记为已输出。"""
+    pending = stage["pending"]
+    window = stage["window"]
+    seen = stage["seen"]
+    released = []
+    for sequence_id in sorted(item for item in pending if item <= cutoff):
+        released.append(pending.pop(sequence_id)[1])
+        window.append(sequence_id)
+        seen.add(sequence_id)
+        if len(window) > MERGE_WINDOW_SIZE:
+            seen.discard(window.popleft())
+        stage["last_id"] = sequence_id
+    return released
+
+
+def admit_merge_item(state: dict, stage_name: str, sequence_id: int, snapshot: bool, item: tuple) -> tuple[bool, list]:
+    """将一路连接某序号的单阶段输出放入重排窗口，返回是否收下与因上游序号重置需先行输出的旧条目。"""
+    stage = state["merge_stages"][stage_name]
+    pending = stage["pending"]
+    last_id = stage["last_id"]
+    if sequence_id in pending or sequence_id in stage["seen"]:
+        state["merge_dup_count"] += 1
+        return False, []
+    flushed = []
+    if last_id is not None and sequence_id <= last_id:
+        if not snapshot or sequence_id >= stage["window"][0]:
+            state["merge_late_count" if sequence_id >= stage["window"][0] else "merge_dup_count"] += 1
+            return False, []
+        flushed = release_merge_stage(stage, max(pending)) if pending else []
+        stage["window"].clear()
+        stage["seen"].clear()
+        stage["last_id"] = None
+        stage["published_id"] = None
+    pending[sequence_id] = (time.monotonic(), item)
+    return True, flushed
+
+
+def take_due_merge_items(state: dict, stage_name: str, now_ts: float, release_all: bool) -> list:
+    """取出重排窗口内已到期的条目，到期条目之前的更小序号即使未到期也一并按序取出。"""
+    stage = state["merge_stages"][stage_name]
+    due = [sequence_id for sequence_id, (arrival_ts, _item) in stage["pending"].items() if release_all or now_ts - arrival_ts >= MERGE_REORDER_SECONDS]
+    if not due:
+        return []
+    return release_merge_stage(stage, max(due))
+
+
+def coalesce_merge_items(state: dict, items: list, release_all: bool) -> list:
+    """开启快照合并时对主备按序输出的快照在共用输出上再合并一次，两路各自的合并窗口不对齐，否则每个窗口会落盘两条。"""
+    coalesced = []
+    for records, _collect_ts, source, message in items:
+        for snapshot in records:
+            pending = state["merge_pending_snapshot"]
+            if pending is not None and pending[0]["collect_ts"] // 1000 != snapshot["collect_ts"] // 1000:
+                coalesced.append(take_merge_pending_snapshot(state))
+            if snapshot["update_type"] == "snapshot" or snapshot["collect_ts"] - state["merge_last_emit_ts"] >= RT_SS_COALESCE_MS:
+                state["merge_pending_snapshot"] = None
+                state["merge_last_emit_ts"] = snapshot["collect_ts"]
+                coalesced.append(([snapshot], snapshot["collect_ts"], source, message))
+            else:
+                state["merge_pending_snapshot"] = (snapshot, source)
+    pending = state["merge_pending_snapshot"]
+    if pending is not None and (release_all or int(time.time() * 1000) - pending[0]["collect_ts"] >= RT_SS_COALESCE_MS):
+        coalesced.append(take_merge_pending_snapshot(state))
+    return coalesced
+
+
+def take_merge_pending_snapshot(state: dict) -> tuple:
+    """取出共用输出上合并窗口内待输出的最新快照，转为快照阶段条目。"""
+    snapshot, source = state["merge_pending_snapshot"]
+    state["merge_pending_snapshot"] = None
+    state["merge_last_emit_ts"] = snapshot["collect_ts"]
+    return [snapshot], snapshot["collect_ts"], source, None
+
+
+def get_merge_output(context: dict) -> dict:
+    """返回交易对主备共用的合并输出上下文，首次使用时创建。"""
+    state = context["state"]
+    if state["merge_output"] is None:
+        state["merge_output"] = build_session_context(context["exchange"], context["market"], context["symbol"], MERGE_ROLE, state)
+    return state["merge_output"]
+
+
+def build_merge_writes(stage_name: str, items: list) -> list:
+    """将已按序取出的单阶段条目转为落盘记录，并按序分发给本地订阅者。"""
+    writes = []
+    for records, collect_ts, source, message in items:
+        raw_records, snapshots = (records, []) if stage_name == "raw" else ([], records)
+        if PUBSUB_ENABLED and pubsub.CLIENTS:
+            fan_out_session_records(source, message, raw_records, snapshots, collect_ts)
+        if snapshots:
+            record_message_latency(source["market"], collect_ts - int(snapshots[-1]["ts"] or collect_ts))
+        writes.append((raw_records, snapshots, collect_ts))
+    return writes
+
+
+def release_merge_items(context: dict, release_all: bool = False, flushed: list | None = None) -> None:
+    """在合并锁内按序输出两个阶段重排窗口中已到期的条目，提交为共用输出的一个落盘任务。"""
+    state = context["state"]
+    now_ts = time.monotonic()
+    writes = list(flushed or [])
+    for stage_name in MERGE_STAGES:
+        items = take_due_merge_items(state, stage_name, now_ts, release_all)
+        if stage_name == "snapshots" and RT_SS_COALESCE_MS > 0:
+            items = coalesce_merge_items(state, items, release_all)
+        writes.extend(build_merge_writes(stage_name, items))
+    if writes:
+        submit_write_job(get_merge_output(context), "batch", writes)
+
+
+def submit_merge_stages(context: dict, message: dict | None, sequence_id: int, snapshot: bool, stage_records: dict, collect_ts: int) -> None:
+    """将一路连接某序号的原始记录与快照分别登记到各自阶段的重排窗口，并输出已到期条目。"""
+    state = context["state"]
+    with state["merge_lock"]:
+        flushed = []
+        for stage_name, records in stage_records.items():
+            if not records:
+                continue
+            admitted, stage_flushed = admit_merge_item(state, stage_name, sequence_id, snapshot, (records, collect_ts, context, message))
+            if stage_name == "snapshots" and RT_SS_COALESCE_MS > 0:
+                stage_flushed = coalesce_merge_items(state, stage_flushed, False)
+            flushed.extend(build_merge_writes(stage_name, stage_flushed))
+            stage = state["merge_stages"][stage_name]
+            if admitted and stage_name == "snapshots" and SHM_PUBLISH_ENABLED and (stage["published_id"] is None or sequence_id > stage["published_id"]):
+                publish_session_book(context, records)
+                stage["published_id"] = sequence_id
+        release_merge_items(context, flushed=flushed)
+
+
+def submit_merged_records(context: dict, message: dict, raw_records: list, snapshots: list, collect_ts: int) -> None:
+    """主备合并模式下原始记录与快照按序号分阶段去重，经重排窗口按序提交到共用输出，每个序号每阶段只落盘一次。"""
+    exchange = context["exchange"]
+    sequence_id = message_sequence_id(exchange, message)
+    if sequence_id is None or not (raw_records or snapshots):
+        return
+    submit_merge_stages(context, message, sequence_id, is_snapshot_message(exchange, message), {"raw": raw_records, "snapshots": snapshots}, collect_ts)
+
+
+def submit_merged_snapshot(context: dict, snapshot: dict) -> None:
+    """主备合并模式下按快照自身序号提交合并窗口内未输出的最新快照，无序号时丢弃。"""
+    if snapshot["update_id"] is None:
+        return
+    submit_merge_stages(context, None, int(snapshot["update_id"]), False, {"snapshots": [snapshot]}, snapshot["collect_ts"])
+
+
+def submit_session_snapshot(context: dict, snapshot: dict) -> None:
+    """在消息处理之外提交单条快照，主备合并时进入合并输出，否则仅活跃连接落盘并分发。"""
+    if PRIMARY_BACKUP_MERGE:
+        submit_merged_snapshot(context, snapshot)
+        return
+    if not is_active_role(context["state"], context["role"]):
+        return
+    if PUBSUB_ENABLED and pubsub.CLIENTS:
+        fan_out_session_records(context, None, [], [snapshot], snapshot["collect_ts"])
+    submit_write_job(context, "records", ([], [snapshot], snapshot["collect_ts"]))
+    context["writes_pending"] = True
+
+
+def session_tick_seconds() -> float:
+    """返回WS会话定时处理间隔，取已开启的重排窗口与快照合并窗口中较小者的一半，均未开启时为0。"""
+    windows = [seconds for seconds in (MERGE_REORDER_SECONDS if PRIMARY_BACKUP_MERGE else 0, RT_SS_COALESCE_MS / 1000) if seconds > 0]
+    if not windows:
+        return 0
+    return max(SESSION_TICK_MIN_SECONDS, min(windows) / 2)
+
+
+def tick_session_contexts(contexts: dict[str, dict]) -> None:
+    """无新消息时按时输出合并窗口已到期的待输出快照，以及主备合并重排窗口内已到期的条目。"""
+    if RT_SS_COALESCE_MS > 0:
+        now_ms = int(time.time() * 1000)
+        for context in contexts.values():
+            pending = context["pending_snapshot"]
+            if pending is not None and now_ms - pending["collect_ts"] >= RT_SS_COALESCE_MS:
+                submit_session_snapshot(context, flush_pending_snapshot(context))
+    if PRIMARY_BACKUP_MERGE:
+        for context in contexts.values():
+            with context["state"]["merge_lock"]:
+                release_merge_items(context)
+
+
+def close_merge_output(context: dict) -> None:
+    """主备两路都已断开时按序输出重排窗口内的全部条目，再补写合并输出的最后一秒快照并关闭写入器。"""
+    state = context["state"]
+    with state["lock"]:
+        other_connected = state["connected"][other_role(context["role"])]
+    if other_connected:
+        return
+    with state["merge_lock"]:
+        output = state["merge_output"]
+        release_merge_items(context, release_all=True)
+        if output is not None or state["merge_output"] is not None:
+            output = state["merge_output"]
+            state["merge_output"] = None
+            submit_write_job(output, "finish", True)
+
+
+def persist_session_records(context: dict, raw_records: list, snapshots: list, collect_ts: int) -> None:
+    """按落盘开关写入正式文件或进入待切换缓存。"""
+    market = context["market"]
+    if WRITES_RELEASED.is_set():
+        close_session_writers(context)
+        return
+    if not is_market_write_enabled(market):
+        close_session_writers(context)
+        buffer_session_records(context, raw_records, snapshots, collect_ts)
+        return
+    flush_market_buffer(market)
+    write_session_records(context, raw_records, snapshots, collect_ts)
+
+
+def get_market_writer(market: str) -> dict:
+    """返回指定市场的写入阶段，首次使用时启动写入线程。"""
+    with MARKET_WRITER_LOCK:
+        writer_stage = MARKET_WRITERS[market]
+        if writer_stage is None:
+            writer_stage = {
+                "queue": queue.Queue(maxsize=WRITER_QUEUE_MAX_ITEMS),
+                "contexts": {},
+                "peak_depth": 0,
+                "stall_count": 0,
+                "stall_seconds": 0.0,
+                "batch_count": 0,
+                "job_count": 0,
+                "error_count": 0,
+                "stalled": False,
+            }
+            writer_stage["thread"] = threading.Thread(target=run_market_writer, args=(market, writer_stage), name=f"ws-writer-{market}", daemon=True)
+            writer_stage["thread"].start()
+            MARKET_WRITERS[market] = writer_stage
+        return writer_stage
+
+
+def submit_write_job(context: dict, kind: str, payload=None) -> None:
+    """提交落盘任务，队列满时阻塞接收线程形成背压，超时或写入线程已判定阻塞时抛出写入阻塞异常。"""
+    if not WRITER_QUEUE_ENABLED:
+        run_write_job(context, kind, payload)
+        return
+    writer_stage = get_market_writer(context["market"])
+    job_queue = writer_stage["queue"]
+    try:
+        job_queue.put_nowait((context, kind, payload))
+    except queue.Full:
+        if writer_stage["stalled"]:
+            raise WriterStalledError("写入队列已满且写入线程未恢复") from None
+        started = time.monotonic()
+        try:
+            job_queue.put((context, kind, payload), timeout=WRITER_PUT_TIMEOUT_SECONDS)
+        except queue.Full:
+            writer_stage["stalled"] = True
+            raise WriterStalledError(f"写入队列满 {WRITER_PUT_TIMEOUT_SECONDS} 秒未腾出空位") from None
+        finally:
+            writer_stage["stall_count"] += 1
+            writer_stage["stall_seconds"] += time.monotonic() - started
+    depth = job_queue.qsize()
+    if depth > writer_stage["peak_depth"]:
+        writer_stage["peak_depth"] = depth
+
+
+def has_writer_room(market: str, job_count: int = WRITER_JOBS_PER_MESSAGE) -> bool:
+    """判断指定市场写入队列能否无阻塞接收指定数量的落盘任务，默认为一条消息产生的全部任务。"""
+    if not WRITER_QUEUE_ENABLED:
+        return True
+    job_queue = get_market_writer(market)["queue"]
+    return job_queue.maxsize - job_queue.qsize() >= job_count
+
+
+def wait_writer_room(market: str) -> None:
+    """阻塞等待写入队列腾出一条消息所需的空位并计入背压统计，供异步引擎在线程中调用。"""
+    writer_stage = get_market_writer(market)
+    started = time.monotonic()
+    try:
+        while not has_writer_room(market):
+            if writer_stage["stalled"] or time.monotonic() - started >= WRITER_PUT_TIMEOUT_SECONDS:
+                writer_stage["stalled"] = True
+                raise WriterStalledError(f"写入队列满 {WRITER_PUT_TIMEOUT_SECONDS} 秒未腾出空位")
+            time.sleep(WRITER_ROOM_POLL_SECONDS)
+    finally:
+        writer_stage["stall_count"] += 1
+        writer_stage["stall_seconds"] += time.monotonic() - started
+
+
+def run_write_job(context: dict, kind: str, payload) -> None:
+    """执行单个落盘任务。"""
+    if kind == "records":
+        persist_session_records(context, *payload)
+    elif kind == "batch":
+        for raw_records, snapshots, collect_ts in payload:
+            persist_session_records(context, raw_records, snapshots, collect_ts)
+    elif kind == "close":
+        close_session_writers(context)
+    elif kind == "finish":
+        finish_session_context(context, payload)
+
+
+def flush_idle_writers(contexts: dict) -> None:
+    """按时间阈值刷出活跃会话中停留过久的写入缓冲。"""
+    now_ts = time.monotonic()
+    for context in contexts.values():
+        for writer_key in ("rt_writer", "rt_ss_writer", "rt_ss_1s_writer"):
+            writer = context[writer_key]
+            if writer and writer[3] and writer[6] not in COLUMNAR_FORMATS and now_ts - writer[5] >= WRITE_BUFFER_INTERVAL_SECONDS:
+                flush_writer_buffer(writer)
+
+
+def record_writer_error(market: str, writer_stage: dict, label: str, exc: Exception) -> None:
+    """累计并定期记录写入线程捕获的异常，写入线程记录后继续处理后续任务。"""
+    writer_stage["error_count"] += 1
+    error_count = writer_stage["error_count"]
+    if error_count == 1 or error_count % WRITER_ERROR_LOG_INTERVAL == 0:
+        log(f"{label} 写入失败: {type(exc).__name__}: {exc}，累计 {error_count} 次", market)
+
+
+def run_market_writer_batch(market: str, writer_stage: dict, batch: list) -> None:
+    """执行一批落盘任务，单个任务失败只记录日志，不影响同批其余任务。"""
+    contexts = writer_stage["contexts"]
+    for context, kind, payload in batch:
+        if kind == "release":
+            for registered in list(contexts.values()):
+                try:
+                    close_session_writers(registered)
+                except Exception as exc:
+                    record_writer_error(market, writer_stage, f"{registered['exchange']} {market} {registered['symbol']}", exc)
+            continue
+        context_key = id(context)
+        if kind == "finish":
+            contexts.pop(context_key, None)
+        else:
+            contexts[context_key] = context
+        try:
+            run_write_job(context, kind, payload)
+        except Exception as exc:
+            record_writer_error(market, writer_stage, f"{context['exchange']} {market} {context['symbol']}", exc)
+
+
+def flush_market_idle_writers(market: str, writer_stage: dict) -> None:
+    """刷出停留过久的写入缓冲，失败只记录日志。"""
+    try:
+        flush_idle_writers(writer_stage["contexts"])
+    except Exception as exc:
+        record_writer_error(market, writer_stage, f"{market} 定时刷盘", exc)
+
+
+def run_market_writer(market: str, writer_stage: dict) -> None:
+    """写入线程主循环，按批次消费落盘任务并统一刷出缓冲，任务异常不会终止线程。"""
+    job_queue = writer_stage["queue"]
+    while True:
+        try:
+            batch = [job_queue.get(timeout=WRITE_BUFFER_INTERVAL_SECONDS)]
+        except queue.Empty:
+            flush_market_idle_writers(market, writer_stage)
+            continue
+        while len(batch) < WRITER_BATCH_MAX_ITEMS:
+            try:
+                batch.append(job_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            run_market_writer_batch(market, writer_stage, batch)
+            flush_market_idle_writers(market, writer_stage)
+        finally:
+            writer_stage["batch_count"] += 1
+            writer_stage["job_count"] += len(batch)
+            writer_stage["stalled"] = False
+            for _job in batch:
+                job_queue.task_done()
+
+
+def drain_market_writer(market: str) -> None:
+    """等待指定市场写入队列中的任务全部落盘。"""
+    writer_stage = MARKET_WRITERS[market]
+    if writer_stage is not None:
+        writer_stage["queue"].join()
+
+
+def get_market_writer_snapshot(market: str) -> dict:
+    """返回指定市场写入队列的积压与背压观测。"""
+    writer_stage = MARKET_WRITERS[market]
+    if writer_stage is None:
+        return {"queue_depth": 0, "peak_depth": 0, "stall_count": 0, "stall_seconds": 0.0, "job_count": 0, "batch_count": 0}
+    return {
+        "queue_depth": writer_stage["queue"].qsize(),
+        "peak_depth": writer_stage["peak_depth"],
+        "stall_count": writer_stage["stall_count"],
+        "stall_seconds": writer_stage["stall_seconds"],
+        "job_count": writer_stage["job_count"],
+        "batch_count": writer_stage["batch_count"],
+    }
+
+
+def release_market_writes() -> dict | None:
+    """交出落盘权：停止本进程写入并关闭全部写入器，返回各分段文件最后写入的去重键与大小。"""
+    if not WRITER_QUEUE_ENABLED or any(MARKET_CONTROL_HOOK.values()):
+        return None
+    WRITES_RELEASED.set()
+    for market, writer_stage in MARKET_WRITERS.items():
+        if writer_stage is None:
+            continue
+        writer_stage["queue"].put((None, "release", None))
+        drain_market_writer(market)
+    files = {}
+    for file_key, dedupe_key in list(LAST_WRITTEN_KEYS.items()):
+        file_path = Path(file_key)
+        files[file_key] = {"last_key": list(dedupe_key), "size": file_path.stat().st_size if file_path.exists() else None}
+    return files
+
+
+def apply_handover_cursors(files: dict) -> None:
+    """登记旧进程报告的续写位置，补写缓存时从对应位置之后开始写入。"""
+    for file_key, cursor in files.items():
+        HANDOVER_CURSORS[file_key] = {"last_key": tuple(cursor["last_key"]), "size": cursor["size"]}
+
+
+def close_session_context(context: dict) -> None:
+    """结束会话时提交合并窗口内未输出的最新快照、最后一秒快照补写与写入器关闭。"""
+    if context["pending_snapshot"] is not None:
+        submit_session_snapshot(context, flush_pending_snapshot(context))
+    if PRIMARY_BACKUP_MERGE:
+        close_merge_output(context)
+        return
+    submit_write_job(context, "finish", is_active_role(context["state"], context["role"]))
+
+
+def finish_session_context(context: dict, active: bool) -> None:
+    """补写最后一秒快照并关闭写入器。"""
+    last_snapshot = context["last_snapshot"]
+    market = context["market"]
+    if last_snapshot and active and not WRITES_RELEASED.is_set():
+        if is_market_write_enabled(market):
+            context["rt_ss_1s_writer"] = flush_second_snapshot(
+                last_snapshot,
+                context["rt_ss_1s_writer"],
+                context["rt_ss_1s_dir"],
+                context["rt_ss_1s_tag"],
+                context["symbol"],
+                context["rt_ss_1s_writer_codec"],
+            )
+        else:
+            second_path = build_snapshot_file_path(
+                context["rt_ss_1s_dir"], context["symbol"], context["rt_ss_1s_tag"], last_snapshot, context["rt_ss_1s_writer_codec"]
+            )
+            buffer_json_line(market, second_path, last_snapshot)
+    close_session_writers(context)
+
+
+def close_session_contexts(contexts: dict[str, dict]) -> None:
+    """结束连接时收尾其下全部交易对的会话上下文，写入阻塞时跳过无法提交的收尾任务。"""
+    for context in contexts.values():
+        try:
+            close_session_context(context)
+        except WriterStalledError as exc:
+            log(f"{context['exchange']} {context['market']} {context['symbol']} 收尾任务未提交: {exc}", context["market"])
+
+
+def run_session(
+    exchange: str, market: str, symbols: tuple[str, ...], role: str, ws_url: str, stop_event: threading.Event, states: dict
+) -> None:
+    """运行单个角色的一次WS会话。"""
     try:
         ws = connect_ws(ws_url)
-        send_subscribe(ws, exchange, market, symbol, depth)
-        update_shared_status(state, exchange, market, symbol, role, connected=True, status_text="已连接 0", recv_count=0)
+        send_subscribe(ws, exchange, market, symbols, market_depth(market))
+        update_group_status(states, exchange, market, symbols, role, connected=True, status_text="已连接 0", recv_count=0)
     except websocket.WebSocketException as exc:
-        update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="连接异常")
-        switch_active_role(state, exchange, market, symbol, role)
-        log(f"{exchange} {market} {symbol} {role_label(role)}连接异常，准备重连: {exc}", market)
+        handle_session_error(states, exchange, market, symbols, role, "连接异常", exc)
         return
     except TimeoutError as exc:
-        update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="连接超时")
-        switch_active_role(state, exchange, market, symbol, role)
-        log(f"{exchange} {market} {symbol} {role_label(role)}连接超时，准备重连: {exc}", market)
+        handle_session_error(states, exchange, market, symbols, role, "连接超时", exc)
         return
     except OSError as exc:
-        update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="网络错误")
-        switch_active_role(state, exchange, market, symbol, role)
-        log(f"{exchange} {market} {symbol} {role_label(role)}网络错误，准备重连: {exc}", market)
+        handle_session_error(states, exchange, market, symbols, role, "网络错误", exc)
         return
 
-    orderbook = {"bids": {}, "asks": {}}
-    rt_writer = None
-    rt_ss_writer = None
-    rt_ss_1s_writer = None
-    recv_count = 0
-    last_status_ts = time.monotonic()
-    last_second = None
-    last_snapshot = None
+    contexts = build_session_contexts(exchange, market, symbols, role, states)
     heartbeat_closed = threading.Event()
 
     def keepalive() -> None:
@@ -962,156 +2272,119 @@ def run_session(exchange: str, market: str, symbol: str, role: str, ws_url: str,
 
     keepalive_thread = threading.Thread(target=keepalive, daemon=True)
     keepalive_thread.start()
+    tick_seconds = session_tick_seconds()
+    if tick_seconds > 0:
+        ws.settimeout(tick_seconds)
+    last_recv_ts = last_tick_ts = time.monotonic()
 
     while not stop_event.is_set():
         try:
             raw = ws.recv()
+        except (websocket.WebSocketTimeoutException, TimeoutError) as exc:
+            if tick_seconds > 0 and time.monotonic() - last_recv_ts < RECV_TIMEOUT_SECONDS:
+                try:
+                    tick_session_contexts(contexts)
+                except WriterStalledError as stall_exc:
+                    handle_session_error(states, exchange, market, symbols, role, "写入阻塞", stall_exc)
+                    break
+                last_tick_ts = time.monotonic()
+                continue
+            handle_session_error(states, exchange, market, symbols, role, "连接超时", exc)
+            break
         except websocket.WebSocketException as exc:
-            update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="连接异常")
-            switch_active_role(state, exchange, market, symbol, role)
-            log(f"{exchange} {market} {symbol} {role_label(role)}连接异常，准备重连: {exc}", market)
+            handle_session_error(states, exchange, market, symbols, role, "连接异常", exc)
             break
-        except TimeoutError as exc:
-            update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="连接超时")
-            switch_active_role(state, exchange, market, symbol, role)
-            log(f"{exchange} {market} {symbol} {role_label(role)}连接超时，准备重连: {exc}", market)
+        except OSError as exc:
+            handle_session_error(states, exchange, market, symbols, role, "网络错误", exc)
+            break
+        last_recv_ts = time.monotonic()
+        try:
+            if tick_seconds > 0 and last_recv_ts - last_tick_ts >= tick_seconds:
+                tick_session_contexts(contexts)
+                last_tick_ts = last_recv_ts
+            for payload in handle_session_message(exchange, contexts, raw):
+                ws.send(payload)
+        except WriterStalledError as exc:
+            handle_session_error(states, exchange, market, symbols, role, "写入阻塞", exc)
+            break
+        except websocket.WebSocketException as exc:
+            handle_session_error(states, exchange, market, symbols, role, "连接异常", exc)
             break
         except OSError as exc:
-            update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="网络错误")
-            switch_active_role(state, exchange, market, symbol, role)
-            log(f"{exchange} {market} {symbol} {role_label(role)}网络错误，准备重连: {exc}", market)
+            handle_session_error(states, exchange, market, symbols, role, "网络错误", exc)
             break
-        if raw == "pong":
-            continue
-        recv_count += 1
-        now_status_ts = time.monotonic()
-        if now_status_ts - last_status_ts >= STATUS_INTERVAL_SECONDS:
-            update_shared_status(state, exchange, market, symbol, role, connected=True, status_text=f"已连接 {recv_count}", recv_count=recv_count)
-            last_status_ts = now_status_ts
-        collect_ts = int(datetime.now(tz=timezone.utc).timestamp() * 1000)
-        message = json.loads(raw)
-        snapshots = []
-        if exchange == "bybit":
-            raw_record, snapshot = apply_bybit_message(orderbook, market, symbol, message, collect_ts, depth)
-            if snapshot:
-                snapshots.append(snapshot)
-            raw_records = [raw_record]
-        elif exchange == "binance":
-            raw_record, snapshot = apply_binance_message(orderbook, market, symbol, message, collect_ts, depth)
-            snapshots.append(snapshot)
-            raw_records = [raw_record]
-        elif exchange == "bitget":
-            raw_records, snapshots = apply_bitget_message(orderbook, market, symbol, message, collect_ts, depth)
-        else:
-            raw_records, snapshots = apply_okx_message(orderbook, market, symbol, message, collect_ts, depth)
-
-        active_now = is_active_role(state, role)
-        write_enabled = is_market_write_enabled(market)
-        if not active_now:
-            rt_writer, rt_ss_writer, rt_ss_1s_writer = close_writers(rt_writer, rt_ss_writer, rt_ss_1s_writer)
-        else:
-            if not write_enabled:
-                rt_writer, rt_ss_writer, rt_ss_1s_writer = close_writers(rt_writer, rt_ss_writer, rt_ss_1s_writer)
-                raw_path = build_file_path(rt_dir, symbol, hour_str_from_ms(collect_ts), rt_tag)
-                for raw_record in raw_records:
-                    buffer_json_line(market, raw_path, raw_record)
-                for snapshot in snapshots:
-                    buffer_json_line(market, build_snapshot_file_path(rt_ss_dir, symbol, rt_ss_tag, snapshot), snapshot)
-                    second_bucket = int(snapshot["collect_ts"] / 1000)
-                    if last_second is None:
-                        last_second = second_bucket
-                    if second_bucket != last_second and last_snapshot:
-                        buffer_json_line(
-                            market,
-                            build_snapshot_file_path(rt_ss_1s_dir, symbol, rt_ss_1s_tag, last_snapshot),
-                            last_snapshot,
-                        )
-                        last_second = second_bucket
-                    last_snapshot = snapshot
-            else:
-                flush_market_buffer(market)
-                hour_str = hour_str_from_ms(collect_ts)
-                rt_writer = ensure_writer(rt_dir, symbol, hour_str, rt_tag, rt_writer)
-                for raw_record in raw_records:
-                    rt_writer = write_json_line(rt_writer, raw_record)
-                for snapshot in snapshots:
-                    snapshot_hour = hour_str_from_ms(snapshot["collect_ts"])
-                    rt_ss_writer = ensure_writer(rt_ss_dir, symbol, snapshot_hour, rt_ss_tag, rt_ss_writer)
-                    rt_ss_writer = write_json_line(rt_ss_writer, snapshot)
-                    second_bucket = int(snapshot["collect_ts"] / 1000)
-                    if last_second is None:
-                        last_second = second_bucket
-                    if second_bucket != last_second and last_snapshot:
-                        rt_ss_1s_writer = flush_second_snapshot(last_snapshot, rt_ss_1s_writer, rt_ss_1s_dir, rt_ss_1s_tag, symbol)
-                        last_second = second_bucket
-                    last_snapshot = snapshot
 
     heartbeat_closed.set()
-    if last_snapshot and is_active_role(state, role):
-        if is_market_write_enabled(market):
-            rt_ss_1s_writer = flush_second_snapshot(last_snapshot, rt_ss_1s_writer, rt_ss_1s_dir, rt_ss_1s_tag, symbol)
-        else:
-            buffer_json_line(
-                market,
-                build_snapshot_file_path(rt_ss_1s_dir, symbol, rt_ss_1s_tag, last_snapshot),
-                last_snapshot,
-            )
-    rt_writer, rt_ss_writer, rt_ss_1s_writer = close_writers(rt_writer, rt_ss_writer, rt_ss_1s_writer)
+    close_session_contexts(contexts)
     ws.close()
-    update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="连接关闭")
-    switch_active_role(state, exchange, market, symbol, role)
+    update_group_status(states, exchange, market, symbols, role, connected=False, status_text="连接关闭")
+    switch_group_role(states, exchange, market, symbols, role)
 
 
-def run_role_loop(exchange: str, market: str, symbol: str, role: str, ws_url: str, stop_event: threading.Event, state: dict) -> None:
+def run_role_loop(
+    exchange: str, market: str, symbols: tuple[str, ...], role: str, ws_url: str, stop_event: threading.Event, states: dict
+) -> None:
     """持续维护单个角色的WS连接。"""
-    update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="准备连接", recv_count=0)
+    update_group_status(states, exchange, market, symbols, role, connected=False, status_text="准备连接", recv_count=0)
     while not stop_event.is_set():
-        run_session(exchange, market, symbol, role, ws_url, stop_event, state)
+        run_session(exchange, market, symbols, role, ws_url, stop_event, states)
         if stop_event.is_set():
             break
         time.sleep(RECONNECT_INTERVAL_SECONDS)
-    update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="已停止")
+    update_group_status(states, exchange, market, symbols, role, connected=False, status_text="已停止")
 
 
-def run_symbol_loop(exchange: str, market: str, symbol: str, stop_event: threading.Event) -> None:
-    """持续维护单个交易对的主备WS连接。"""
-    log(f"{exchange} {market} {symbol} 主备订阅启动", market)
-    state = build_session_state()
-    primary_url, backup_url = build_ws_urls(exchange, market, symbol)
+def run_group_loop(exchange: str, market: str, symbols: tuple[str, ...], stop_event: threading.Event) -> None:
+    """持续维护一个连接分组的主备WS连接。"""
+    log(f"{exchange} {market} {group_label(symbols)} 主备订阅启动", market)
+    states = {symbol: build_session_state() for symbol in symbols}
+    primary_url, backup_url = build_ws_urls(exchange, market, symbols[0])
     primary_thread = threading.Thread(
         target=run_role_loop,
-        args=(exchange, market, symbol, PRIMARY_ROLE, primary_url, stop_event, state),
+        args=(exchange, market, symbols, PRIMARY_ROLE, primary_url, stop_event, states),
         daemon=True,
     )
     backup_thread = threading.Thread(
         target=run_role_loop,
-        args=(exchange, market, symbol, BACKUP_ROLE, backup_url, stop_event, state),
+        args=(exchange, market, symbols, BACKUP_ROLE, backup_url, stop_event, states),
         daemon=True,
     )
     primary_thread.start()
     backup_thread.start()
     primary_thread.join()
     backup_thread.join()
-    status_update(exchange, market, symbol, None)
-    log(f"{exchange} {market} {symbol} 主备订阅停止", market)
+    for symbol in symbols:
+        status_update(exchange, market, symbol, None)
+    log(f"{exchange} {market} {group_label(symbols)} 主备订阅停止", market)
 
 
-def run_exchange_supervisor(exchange: str, market: str) -> None:
-    """按交易所维护全部交易对子线程。"""
+def is_symbol_in_shard(symbol: str, shard_index: int, shard_count: int) -> bool:
+    """判断交易对是否归属指定进程分片。"""
+    if shard_count <= 1:
+        return True
+    return zlib.crc32(symbol.encode("utf-8")) % shard_count == shard_index
+
+
+def run_exchange_supervisor(
+    exchange: str, market: str, stop_event: threading.Event | None = None, shard_index: int = 0, shard_count: int = 1
+) -> None:
+    """按交易所维护全部连接分组子线程。"""
     dataset_id = "D10002-4" if market == "future" else "D10006-8"
     if not cex_config.is_supported(dataset_id, exchange):
         symbol_list = cex_config.get_future_symbols(exchange) if market == "future" else cex_config.get_spot_symbols(exchange)
         for symbol in symbol_list:
             status_update(exchange, market, symbol, cex_config.UNSUPPORTED_STATUS_TEXT)
         return
-    workers: dict[str, tuple[threading.Event, threading.Thread]] = {}
+    workers: dict[tuple[str, ...], tuple[threading.Event, threading.Thread]] = {}
     fallback_symbols = cex_config.get_future_symbols(exchange) if market == "future" else cex_config.get_spot_symbols(exchange)
-    while True:
+    fallback_symbols = [symbol for symbol in fallback_symbols if is_symbol_in_shard(symbol, shard_index, shard_count)]
+    group_size = symbols_per_connection(exchange)
+    while stop_event is None or not stop_event.is_set():
         if cex_config.apply_pause_if_requested(dataset_id, exchange):
-            paused_symbols = set(workers) | set(fallback_symbols)
-            for symbol in sorted(workers):
-                stop_event, _thread = workers.pop(symbol)
-                stop_event.set()
+            paused_symbols = {symbol for group in workers for symbol in group} | set(fallback_symbols)
+            for group in sorted(workers):
+                group_stop_event, _thread = workers.pop(group)
+                group_stop_event.set()
             for symbol in sorted(paused_symbols):
                 status_update(exchange, market, symbol, cex_config.PAUSED_STATUS_TEXT)
             cex_config.wait_with_task_control(1)
@@ -1121,21 +2394,39 @@ def run_exchange_supervisor(exchange: str, market: str) -> None:
         except NetworkRequestError as exc:
             desired_symbols = fallback_symbols
             log(f"{exchange} {market} 动态合约刷新失败，继续使用静态列表: {exc}", market)
-        desired_set = set(desired_symbols)
-        for symbol in sorted(desired_set - set(workers)):
-            stop_event = threading.Event()
-            thread = threading.Thread(target=run_symbol_loop, args=(exchange, market, symbol, stop_event), daemon=True)
-            workers[symbol] = (stop_event, thread)
+        desired_symbols = [symbol for symbol in desired_symbols if is_symbol_in_shard(symbol, shard_index, shard_count)]
+        refresh_instrument_scales(exchange, market, desired_symbols)
+        desired_groups = plan_symbol_groups(list(workers), desired_symbols, group_size)
+        for group in sorted(set(workers) - set(desired_groups)):
+            group_stop_event, _thread = workers.pop(group)
+            group_stop_event.set()
+        for group in sorted(set(desired_groups) - set(workers)):
+            group_stop_event = threading.Event()
+            thread = threading.Thread(target=run_group_loop, args=(exchange, market, group, group_stop_event), daemon=True)
+            workers[group] = (group_stop_event, thread)
             thread.start()
-        for symbol in sorted(set(workers) - desired_set):
-            stop_event, _thread = workers.pop(symbol)
-            stop_event.set()
         wait_seconds = DELIVERY_REFRESH_SECONDS if market == "future" else max(DELIVERY_REFRESH_SECONDS, 60)
         cex_config.wait_with_task_control(wait_seconds)
+    for group_stop_event, _thread in workers.values():
+        group_stop_event.set()
+    for _group_stop_event, thread in workers.values():
+        thread.join(timeout=RECV_TIMEOUT_SECONDS)
 
 
 def run_market_ws(market: str) -> None:
     """运行指定市场的多交易所订单簿WS。"""
+    if app_config.WS_PROCESS_MODE:
+        from cex import cex_orderbook_ws_process_common
+
+        cex_orderbook_ws_process_common.run_market_ws(market)
+        return
+    if PUBSUB_ENABLED:
+        pubsub.start_pubsub_server("main")
+    if app_config.WS_ENGINE == "asyncio":
+        from cex import cex_orderbook_ws_async_common
+
+        cex_orderbook_ws_async_common.run_market_ws(market)
+        return
     supervisors = []
     for exchange in cex_config.list_exchanges():
         thread = threading.Thread(target=run_exchange_supervisor, args=(exchange, market), daemon=True)
@@ -0,0 +1,214 @@
+from pathlib import Path
+import multiprocessing
+import queue
+import threading
+import time
+
+import app_config
+from cex import cex_config
+from cex import cex_orderbook_pubsub_common as pubsub
+from cex import cex_orderbook_ws_common as ws_common
+from cex.cex_common import upload_file_to_s3
+
+PROCESS_SHARDS = app_config.WS_PROCESS_SHARDS  # 每交易所采集进程分片数映射，映射
+EVENT_POLL_SECONDS = 0.5  # 子进程事件队列轮询间隔，秒
+METRICS_INTERVAL_SECONDS = 1.0  # 子进程运行观测上报间隔，秒
+SUPERVISOR_CHECK_SECONDS = 1  # 子进程存活巡检间隔，秒
+WORKER_STOP_TIMEOUT_SECONDS = ws_common.RECV_TIMEOUT_SECONDS + 5  # 子进程优雅退出等待时长，秒
+PROCESS_CONTEXT = multiprocessing.get_context("spawn")  # 子进程启动上下文，上下文
+
+
+def build_runtime_config(market: str) -> dict:
+    """收集需要同步到子进程的运行时配置。"""
+    return {
+        "data_storage_mode": app_config.DATA_STORAGE_MODE,
+        "ws_engine": app_config.WS_ENGINE,
+        "runtime_target_mode": cex_config.RUNTIME_TARGET_MODE,
+        "runtime_target_scope": dict(cex_config.RUNTIME_TARGET_SCOPE),
+        "write_enabled": ws_common.is_market_write_enabled(market),
+    }
+
+
+def apply_runtime_config(market: str, runtime_config: dict) -> None:
+    """在子进程内恢复父进程的运行时配置。"""
+    app_config.DATA_STORAGE_MODE = runtime_config["data_storage_mode"]
+    app_config.WS_ENGINE = runtime_config["ws_engine"]
+    cex_config.set_runtime_target_mode(runtime_config["runtime_target_mode"])
+    scope = runtime_config["runtime_target_scope"]
+    cex_config.set_runtime_target_scope(scope["exchanges"], scope["base_coin"], scope["start_date"], scope["end_date"])
+    ws_common.MARKET_WRITE_ENABLED[market] = bool(runtime_config["write_enabled"])
+
+
+def run_worker_control_loop(market: str, control_queue, stop_event: threading.Event) -> None:
+    """在子进程内执行父进程下发的控制命令。"""
+    while not stop_event.is_set():
+        try:
+            command, value = control_queue.get(timeout=EVENT_POLL_SECONDS)
+        except queue.Empty:
+            continue
+        if command == "write_enabled":
+            ws_common.set_market_write_enabled(market, bool(value))
+        elif command == "flush":
+            ws_common.flush_market_buffer(market)
+        elif command == "clear":
+            ws_common.clear_market_buffer(market)
+        elif command == "stop":
+            stop_event.set()
+            cex_config.TASK_CONTROL_EVENT.set()
+
+
+def run_worker_metrics_loop(market: str, event_queue, stop_event: threading.Event) -> None:
+    """在子进程内周期上报缓存与延迟观测。"""
+    while not stop_event.wait(METRICS_INTERVAL_SECONDS):
+        metrics = {
+            "buffer": ws_common.get_local_market_buffer_snapshot(market),
+            "latency": ws_common.get_local_latency_snapshot(market),
+            "thread_count": threading.active_count(),
+            "writer": ws_common.get_market_writer_snapshot(market),
+        }
+        event_queue.put(("metrics", metrics))
+
+
+def run_exchange_worker(exchange: str, market: str, shard_index: int, shard_count: int, runtime_config: dict, event_queue, control_queue) -> None:
+    """子进程入口，按父进程选择的采集引擎运行单个交易所分片的采集监督。"""
+    apply_runtime_config(market, runtime_config)
+    ws_common.configure_market_runtime(
+        market,
+        True,
+        lambda key, value: event_queue.put(("status", key, value)),
+        lambda message: event_queue.put(("log", message)),
+    )
+    ws_common.UPLOAD_HOOK = lambda file_path: event_queue.put(("upload", str(file_path)))
+    if ws_common.PUBSUB_ENABLED:
+        pubsub.start_pubsub_server(f"{market}-{exchange}-{shard_index}")
+    stop_event = threading.Event()
+    threading.Thread(target=run_worker_control_loop, args=(market, control_queue, stop_event), daemon=True).start()
+    threading.Thread(target=run_worker_metrics_loop, args=(market, event_queue, stop_event), daemon=True).start()
+    if app_config.WS_ENGINE == "asyncio":
+        from cex import cex_orderbook_ws_async_common
+
+        cex_orderbook_ws_async_common.run_exchange_ws(exchange, market, stop_event, shard_index, shard_count)
+    else:
+        ws_common.run_exchange_supervisor(exchange, market, stop_event, shard_index, shard_count)
+    ws_common.drain_market_writer(market)
+    stop_event.set()
+    event_queue.put(("exit", None))
+
+
+def pump_worker_events(market: str, worker: dict) -> None:
+    """在父进程内消费子进程事件并转发到状态、日志与上传。"""
+    event_queue = worker["event_queue"]
+    while True:
+        try:
+            event, *payload = event_queue.get(timeout=EVENT_POLL_SECONDS)
+        except queue.Empty:
+            if not worker["process"].is_alive():
+                break
+            continue
+        if event == "status":
+            key, value = payload
+            if value is None:
+                worker["status_keys"].discard(key)
+            else:
+                worker["status_keys"].add(key)
+            ws_common.emit_status(market, key, value)
+        elif event == "log":
+            ws_common.log(payload[0], market)
+        elif event == "metrics":
+            ws_common.MARKET_WORKER_METRICS[market][worker["name"]] = payload[0]
+        elif event == "upload":
+            upload_file_to_s3(Path(payload[0]))
+        elif event == "exit":
+            break
+    ws_common.MARKET_WORKER_METRICS[market].pop(worker["name"], None)
+
+
+def start_exchange_worker(exchange: str, market: str, shard_index: int, shard_count: int) -> dict:
+    """启动单个交易所分片的采集子进程。"""
+    name = f"ws-{market}-{exchange}-{shard_index}"
+    event_queue = PROCESS_CONTEXT.Queue()
+    control_queue = PROCESS_CONTEXT.Queue()
+    process = PROCESS_CONTEXT.Process(
+        target=run_exchange_worker,
+        args=(exchange, market, shard_index, shard_count, build_runtime_config(market), event_queue, control_queue),
+        name=name,
+        daemon=True,
+    )
+    process.start()
+    worker = {
+        "name": name,
+        "process": process,
+        "event_queue": event_queue,
+        "control_queue": control_queue,
+        "status_keys": set(),
+    }
+    worker["pump_thread"] = threading.Thread(target=pump_worker_events, args=(market, worker), daemon=True)
+    worker["pump_thread"].start()
+    return worker
+
+
+def stop_exchange_worker(worker: dict) -> None:
+    """通知子进程优雅退出，超时后强制结束。"""
+    worker["control_queue"].put(("stop", None))
+    worker["process"].join(timeout=WORKER_STOP_TIMEOUT_SECONDS)
+    if worker["process"].is_alive():
+        worker["process"].terminate()
+        worker["process"].join()
+    worker["pump_thread"].join(timeout=WORKER_STOP_TIMEOUT_SECONDS)
+
+
+def build_market_control_hook(market: str, workers: dict):
+    """构造把缓存控制命令广播到全部子进程的回调。"""
+
+    def forward(command: str, value) -> None:
+        """向全部存活子进程下发控制命令。"""
+        for worker in list(workers.values()):
+            if worker["process"].is_alive():
+                worker["control_queue"].put((command, value))
+
+    return forward
+
+
+def run_exchange_process_supervisor(exchange: str, market: str, workers: dict) -> None:
+    """按交易所维护采集子进程，处理暂停与异常重启。"""
+    dataset_id = "D10002-4" if market == "future" else "D10006-8"
+    if not cex_config.is_supported(dataset_id, exchange):
+        ws_common.run_exchange_supervisor(exchange, market)
+        return
+    fallback_symbols = cex_config.get_future_symbols(exchange) if market == "future" else cex_config.get_spot_symbols(exchange)
+    shard_count = max(1, int(PROCESS_SHARDS.get(exchange, 1)))
+    shard_keys = [(exchange, shard_index) for shard_index in range(shard_count)]
+    while True:
+        if cex_config.apply_pause_if_requested(dataset_id, exchange):
+            status_keys = {cex_config.get_status_key(exchange, market, symbol) for symbol in fallback_symbols}
+            for shard_key in shard_keys:
+                worker = workers.pop(shard_key, None)
+                if worker is not None:
+                    stop_exchange_worker(worker)
+                    status_keys |= worker["status_keys"]
+            for key in sorted(status_keys):
+                ws_common.emit_status(market, key, cex_config.PAUSED_STATUS_TEXT)
+            cex_config.wait_with_task_control(1)
+            continue
+        for shard_index, shard_key in enumerate(shard_keys):
+            worker = workers.get(shard_key)
+            if worker is not None and worker["process"].is_alive():
+                continue
+            if worker is not None:
+                ws_common.log(f"{exchange} {market} 采集进程{shard_index}退出，退出码 {worker['process'].exitcode}，准备重启", market)
+                worker["pump_thread"].join(timeout=EVENT_POLL_SECONDS)
+            workers[shard_key] = start_exchange_worker(exchange, market, shard_index, shard_count)
+        cex_config.wait_with_task_control(SUPERVISOR_CHECK_SECONDS)
+
+
+def run_market_ws(market: str) -> None:
+    """按交易所多进程运行指定市场的订单簿WS。"""
+    workers: dict[tuple[str, int], dict] = {}
+    ws_common.MARKET_CONTROL_HOOK[market] = build_market_control_hook(market, workers)
+    supervisors = []
+    for exchange in cex_config.list_exchanges():
+        thread = threading.Thread(target=run_exchange_process_supervisor, args=(exchange, market, workers), daemon=True)
+        supervisors.append(thread)
+        thread.start()
+    for thread in supervisors:
+        thread.join()
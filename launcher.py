@@ -17,6 +17,7 @@ import app_config
 import clear_data
 from cex import cex_common
 from cex import cex_config
+from cex import cex_orderbook_handover_common
 from cex import cex_orderbook_ws_common
 import D10001.d10001download as d10001download
 import D10005.d10005download as d10005download
@@ -34,7 +35,16 @@ def apply_storage_mode_from_argv() -> None:
     app_config.DATA_STORAGE_MODE = "s3" if "-s3" in sys.argv else "local"
 
 
+def apply_ws_engine_from_argv() -> None:
+    """根据启动参数选择WS采集引擎。"""
+    if "-wsasync" in sys.argv:
+        app_config.WS_ENGINE = "asyncio"
+    if "-wsproc" in sys.argv:
+        app_config.WS_PROCESS_MODE = True
+
+
 apply_storage_mode_from_argv()
+apply_ws_engine_from_argv()
 
 
 def has_remove_flag() -> bool:
@@ -185,6 +195,8 @@ ATTACHED_TASK_PARENTS = {
 WS_TASK_IDS = {"D10002-4", "D10006-8"}  # WS任务标识集合，个数
 EXIT_REQUESTED = threading.Event()  # 退出请求事件，事件
 RUNTIME_OBSERVE_CACHE = {"ts": 0.0, "text": "", "download_speed": -1.0}  # 运行时观测缓存，映射
+PROCESS_CPU_LOCK = threading.Lock()  # 进程CPU采样锁，锁
+PROCESS_CPU_SAMPLE = {"wall_ts": 0.0, "cpu_ts": 0.0, "percent": 0.0}  # 进程CPU采样状态，映射
 DISK_GUARD_LOCK = threading.Lock()  # 磁盘保护状态锁，锁
 DISK_GUARD_STATE = {"free_bytes": 0, "upload_only": False}  # 磁盘保护状态，映射
 DISK_GUARD_THREAD_STARTED = False  # 磁盘保护线程是否已启动，开关
@@ -772,6 +784,35 @@ def read_process_peak_rss_bytes() -> int:
     return read_ru_maxrss_bytes()
 
 
+def read_process_cpu_percent() -> float:
+    """按相邻两次采样计算当前进程CPU占用百分比。"""
+    now_wall = time.monotonic()
+    now_cpu = time.process_time()
+    with PROCESS_CPU_LOCK:
+        elapsed = now_wall - PROCESS_CPU_SAMPLE["wall_ts"]
+        if elapsed < 1.0:
+            return PROCESS_CPU_SAMPLE["percent"]
+        if PROCESS_CPU_SAMPLE["wall_ts"] > 0:
+            PROCESS_CPU_SAMPLE["percent"] = (now_cpu - PROCESS_CPU_SAMPLE["cpu_ts"]) / elapsed * 100
+        PROCESS_CPU_SAMPLE["wall_ts"] = now_wall
+        PROCESS_CPU_SAMPLE["cpu_ts"] = now_cpu
+        return PROCESS_CPU_SAMPLE["percent"]
+
+
+def build_ws_engine_observe_text(market: str) -> str:
+    """构造WS采集引擎的线程、CPU与延迟观测文本。"""
+    snapshot = cex_orderbook_ws_common.get_market_runtime_snapshot(market)
+    return (
+        f"引擎 {snapshot['engine']} | "
+        f"进程 {snapshot['process_count']} | "
+        f"线程 {snapshot['thread_count']} | "
+        f"CPU {read_process_cpu_percent():.1f}% | "
+        f"延迟 {snapshot['latency_avg_ms']:.0f}/{snapshot['latency_max_ms']}ms | "
+        f"写队列 {snapshot['writer_queue_depth']}/{snapshot['writer_peak_depth']} | "
+        f"背压 {snapshot['writer_stall_count']}次/{snapshot['writer_stall_seconds']:.1f}秒"
+    )
+
+
 def read_ru_maxrss_bytes() -> int:
     """按当前平台解释ru_maxrss的单位。"""
     rss_value = int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
@@ -819,14 +860,16 @@ def build_task_runtime_observe_text(task_id: str, exchange: str, max_cells: int)
         snapshot = cex_orderbook_ws_common.get_market_buffer_snapshot("future")
         text = (
             f"任务观测: WS缓存 future {snapshot['file_count']}文件/{snapshot['line_count']}行"
-            f" | 丢弃 {snapshot['dropped_count']}行"
+            f" | 溢写 {snapshot['spilled_count']}行 | 丢弃 {snapshot['dropped_count']}行"
+            f" | {build_ws_engine_observe_text('future')}"
         )
         return truncate_by_cells(text, max_cells)
     if task_id == "D10006-8":
         snapshot = cex_orderbook_ws_common.get_market_buffer_snapshot("spot")
         text = (
             f"任务观测: WS缓存 spot {snapshot['file_count']}文件/{snapshot['line_count']}行"
-            f" | 丢弃 {snapshot['dropped_count']}行"
+            f" | 溢写 {snapshot['spilled_count']}行 | 丢弃 {snapshot['dropped_count']}行"
+            f" | {build_ws_engine_observe_text('spot')}"
         )
         return truncate_by_cells(text, max_cells)
     metrics = cex_config.get_runtime_memory_metrics(task_id, exchange)
@@ -1412,21 +1455,34 @@ def start_tasks(selected: list | None = None, startup_progress: dict | None = No
             status_hook, log_hook = task_hooks[task.task_id]
             task.start(thread_task_map, True, status_hook, log_hook)
 
-    def start_deferred_tasks_after_handover(task_list: list[Task]) -> None:
-        """等待旧版本退出后切换WS并启动剩余任务。"""
-        while list_other_launcher_processes():
-            time.sleep(app_config.OLD_LAUNCHER_CHECK_INTERVAL_SECONDS)
-        if app_config.DATA_STORAGE_MODE == "s3":
-            update_startup_progress(startup_progress, "初始化上传池", 0, len(tasks), "旧版本已退出，开始检查S3启动状态")
-            cex_common.ensure_upload_workers_started()
+    def switch_ws_to_write_mode(message: str) -> None:
+        """将已启动的WS任务切换为落盘模式并补写缓存。"""
         if any(task.task_id == "D10002-4" for task in tasks):
             cex_orderbook_ws_common.set_market_write_enabled("future", True)
             cex_orderbook_ws_common.flush_market_buffer("future")
-            log_to_task("D10002-4", "检测到旧版本已退出，已切换为落盘模式并补写缓存")
+            log_to_task("D10002-4", message)
         if any(task.task_id == "D10006-8" for task in tasks):
             cex_orderbook_ws_common.set_market_write_enabled("spot", True)
             cex_orderbook_ws_common.flush_market_buffer("spot")
-            log_to_task("D10006-8", "检测到旧版本已退出，已切换为落盘模式并补写缓存")
+            log_to_task("D10006-8", message)
+
+    def start_deferred_tasks_after_handover(task_list: list[Task]) -> None:
+        """通过本地套接字接管旧版本落盘，等待旧版本退出后启动剩余任务。"""
+        time.sleep(app_config.WS_HANDOVER_WARMUP_SECONDS)
+        files = cex_orderbook_handover_common.request_handover()
+        if files is not None:
+            if app_config.DATA_STORAGE_MODE == "s3":
+                cex_common.ensure_upload_workers_started()
+            cex_orderbook_ws_common.apply_handover_cursors(files)
+            switch_ws_to_write_mode("旧版本已交出落盘权，已按其续写位置切换为落盘模式")
+        while list_other_launcher_processes():
+            time.sleep(app_config.OLD_LAUNCHER_CHECK_INTERVAL_SECONDS)
+        if app_config.DATA_STORAGE_MODE == "s3":
+            update_startup_progress(startup_progress, "初始化上传池", 0, len(tasks), "旧版本已退出，开始检查S3启动状态")
+            cex_common.ensure_upload_workers_started()
+        if files is None:
+            switch_ws_to_write_mode("检测到旧版本已退出，已切换为落盘模式并补写缓存")
+        cex_orderbook_handover_common.start_handover_server(EXIT_REQUESTED.set)
         for task in task_list:
             task.waiting_start = False
         start_task_list(task_list)
@@ -1453,14 +1509,13 @@ def start_tasks(selected: list | None = None, startup_progress: dict | None = No
         for index, task in enumerate(immediate_tasks, start=1):
             update_startup_progress(startup_progress, "启动WS待切换", index, len(immediate_tasks), task.name)
         start_task_list(immediate_tasks)
-        if deferred_tasks:
-            monitor_thread = threading.Thread(
-                target=start_deferred_tasks_after_handover,
-                args=(deferred_tasks,),
-                name="launcher-handover-monitor",
-                daemon=True,
-            )
-            monitor_thread.start()
+        monitor_thread = threading.Thread(
+            target=start_deferred_tasks_after_handover,
+            args=(deferred_tasks,),
+            name="launcher-handover-monitor",
+            daemon=True,
+        )
+        monitor_thread.start()
         update_startup_progress(startup_progress, "启动完成", len(immediate_tasks), len(tasks), "WS已启动，等待旧版本退出后切换")
         return tasks, status_counts, status_times, status_meta, logs, pending
 
@@ -1485,6 +1540,8 @@ def start_tasks(selected: list | None = None, startup_progress: dict | None = No
     for index, task in enumerate(tasks, start=1):
         update_startup_progress(startup_progress, "启动任务", index, len(tasks), task.name)
     start_task_list(tasks)
+    if any(task.task_id in WS_TASK_IDS for task in tasks):
+        cex_orderbook_handover_common.start_handover_server(EXIT_REQUESTED.set)
     update_startup_progress(startup_progress, "启动完成", len(tasks), len(tasks), "准备进入界面")
     return tasks, status_counts, status_times, status_meta, logs, pending
 
@@ -1,25 +1,34 @@
 from collections import deque
 from datetime import datetime, timezone
 from functools import lru_cache
+from itertools import islice
+from operator import neg
 from pathlib import Path
 from urllib.error import HTTPError, URLError
 from urllib.parse import urlencode
 from urllib.request import Request, urlopen
+import asyncio
 import boto3
 from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from botocore.exceptions import ClientError, ConnectTimeoutError, ConnectionClosedError, EndpointConnectionError, NoCredentialsError, PartialCredentialsError, ReadTimeoutError
+from sortedcontainers import SortedDict
+import fcntl
 import json
+import multiprocessing
 import queue
 import resource
 import shutil
 import signal
 import socket
+import struct
 import sys
+import termios
 import threading
 import time
 import traceback
 import websocket
+import zlib
 
 
 def normalize_s3_prefix(text: str) -> str:
@@ -42,11 +51,6 @@ def build_time_partition_format(segment_seconds: int) -> str:
     return "%Y%m%d%H%M%S"
 
 
-def build_current_hour_bucket() -> str:
-    """返回当前UTC整点分区字符串。"""
-    return datetime.now(tz=timezone.utc).strftime("%Y%m%d%H")
-
-
 def apply_wss_config(config: dict) -> None:
     """将配置字典应用到运行时全局变量。"""
     global WSS_CONFIG
@@ -62,6 +66,12 @@ def apply_wss_config(config: dict) -> None:
     global FUTURE_PERPETUAL_SYMBOLS
     global FUTURE_DELIVERY_FAMILIES
     global DATASET_SUPPORT
+    global SEGMENT_COMPRESSION
+    global OVERLOAD_ENABLED
+    global OVERLOAD_STEPS
+    global OVERLOAD_RECOVER_SECONDS
+    global OVERLOAD_COALESCE_MS
+    global OVERLOAD_REDUCED_DEPTH
     WSS_CONFIG = config
     S3_BUCKET_NAME = str(config["s3"]["bucket_name"]).strip()
     S3_PREFIX = normalize_s3_prefix(str(config["s3"]["prefix"]))
@@ -70,53 +80,89 @@ def apply_wss_config(config: dict) -> None:
     WS_WRITE_BUFFER_INTERVAL_SECONDS = float(config["write"]["buffer_interval_seconds"])
     FILE_SEGMENT_SECONDS = int(config["write"]["file_segment_seconds"])
     FILE_SEGMENT_FORMAT = build_time_partition_format(FILE_SEGMENT_SECONDS)
+    SEGMENT_COMPRESSION = dict(config["write"].get("compression", {}))
     EXCHANGE_ENABLED = dict(config["exchange_enabled"])
     SPOT_SYMBOLS = dict(config["spot_symbols"])
     FUTURE_PERPETUAL_SYMBOLS = dict(config["future_perpetual_symbols"])
     FUTURE_DELIVERY_FAMILIES = dict(config["future_delivery_families"])
     DATASET_SUPPORT = dict(config["dataset_support"])
+    overload = dict(config.get("overload", {}))
+    OVERLOAD_ENABLED = bool(overload.get("enabled", False))
+    OVERLOAD_STEPS = [dict(step) for step in overload.get("steps", [])]
+    OVERLOAD_RECOVER_SECONDS = float(overload.get("recover_seconds", 0.0))
+    OVERLOAD_COALESCE_MS = int(overload.get("coalesce_ms", 0))
+    OVERLOAD_REDUCED_DEPTH = int(overload.get("reduced_depth", 0))
+    for step in OVERLOAD_STEPS:
+        if step["action"] not in OVERLOAD_ACTION_LABELS:
+            raise ValueError(f"未知的过载降级动作: {step['action']}")
 
 
 def initialize_wss_config() -> None:
     """初始化WSS配置及热加载状态。"""
     global WSS_CONFIG_MTIME_NS
-    global WSS_CONFIG_ACTIVE_HOUR
     config = load_wss_config()
     apply_wss_config(config)
     WSS_CONFIG_MTIME_NS = WSS_CONFIG_PATH.stat().st_mtime_ns
-    WSS_CONFIG_ACTIVE_HOUR = build_current_hour_bucket()
 
 
-def reload_wss_config_if_needed() -> bool:
-    """按需重读配置并在整点切换到新配置。"""
-    global WSS_CONFIG_LAST_CHECK_TS
+def segment_start_ms(ts_ms: int) -> int:
+    """返回毫秒时间戳所在分段的起始时间。"""
+    return ts_ms - ts_ms % (FILE_SEGMENT_SECONDS * 1000)
+
+
+def check_wss_config_file() -> None:
+    """检查配置文件是否变更，变更时读入待生效配置，等到下一个分段边界再切换。"""
     global WSS_CONFIG_MTIME_NS
     global WSS_CONFIG_PENDING
-    global WSS_CONFIG_ACTIVE_HOUR
-    now_ts = time.monotonic()
-    pending_message = ""
-    activated_message = ""
-    activated = False
+    global WSS_CONFIG_PENDING_SEGMENT_MS
+    current_mtime_ns = WSS_CONFIG_PATH.stat().st_mtime_ns
+    if current_mtime_ns == WSS_CONFIG_MTIME_NS:
+        return
+    try:
+        config = load_wss_config()
+    except ValueError as exc:
+        log(f"配置文件解析失败，稍后重试: {exc}")
+        return
+    with WSS_CONFIG_LOCK:
+        WSS_CONFIG_MTIME_NS = current_mtime_ns
+        WSS_CONFIG_PENDING = config
+        WSS_CONFIG_PENDING_SEGMENT_MS = segment_start_ms(int(time.time() * 1000))
+    log("检测到配置文件变更，将在下一个分段边界生效")
+
+
+def watch_wss_config_loop() -> None:
+    """后台周期检查配置文件变更。"""
+    while not EXIT_REQUESTED.wait(CONFIG_RELOAD_CHECK_INTERVAL_SECONDS):
+        try:
+            check_wss_config_file()
+        except OSError as exc:
+            log(f"配置文件检查失败: {exc}")
+
+
+def start_wss_config_watcher() -> None:
+    """启动配置文件后台检查线程。"""
+    threading.Thread(target=watch_wss_config_loop, name="wss-config-watcher", daemon=True).start()
+
+
+def activate_pending_wss_config(ts_ms: int) -> bool:
+    """时间进入待生效配置登记后的下一个分段时切换配置，返回本次是否切换。"""
+    global WSS_CONFIG_PENDING
+    global SEGMENT_CLOCK
+    if WSS_CONFIG_PENDING is None:
+        return False
     with WSS_CONFIG_LOCK:
-        if now_ts - WSS_CONFIG_LAST_CHECK_TS >= CONFIG_RELOAD_CHECK_INTERVAL_SECONDS:
-            WSS_CONFIG_LAST_CHECK_TS = now_ts
-            current_mtime_ns = WSS_CONFIG_PATH.stat().st_mtime_ns
-            if current_mtime_ns != WSS_CONFIG_MTIME_NS:
-                WSS_CONFIG_MTIME_NS = current_mtime_ns
-                WSS_CONFIG_PENDING = load_wss_config()
-                pending_message = "检测到配置文件变更，将在下一个整点生效"
-        current_hour = build_current_hour_bucket()
-        if WSS_CONFIG_PENDING is not None and current_hour != WSS_CONFIG_ACTIVE_HOUR:
-            apply_wss_config(WSS_CONFIG_PENDING)
-            WSS_CONFIG_PENDING = None
-            WSS_CONFIG_ACTIVE_HOUR = current_hour
-            activated = True
-            activated_message = "配置文件变更已生效"
-    if pending_message:
-        log(pending_message)
-    if activated_message:
-        log(activated_message)
-    return activated
+        if WSS_CONFIG_PENDING is None or segment_start_ms(ts_ms) <= WSS_CONFIG_PENDING_SEGMENT_MS:
+            return False
+        apply_wss_config(WSS_CONFIG_PENDING)
+        WSS_CONFIG_PENDING = None
+        SEGMENT_CLOCK = (0, 0, "")
+    log("配置文件变更已生效")
+    return True
+
+
+def activate_pending_wss_config_now() -> bool:
+    """按当前时间检查并切换待生效配置，供无消息时的监督循环调用。"""
+    return activate_pending_wss_config(int(time.time() * 1000))
 
 
 WSS_CONFIG_PATH = Path(__file__).with_name("launcher_wss_config.json")  # WSS配置文件路径，路径
@@ -124,12 +170,14 @@ CONFIG_RELOAD_CHECK_INTERVAL_SECONDS = 5  # 配置文件热加载检查间隔，
 WSS_CONFIG = {}  # WSS当前生效配置，映射
 WSS_CONFIG_PENDING = None  # WSS待生效配置，映射
 WSS_CONFIG_MTIME_NS = 0  # WSS配置文件修改时间戳，纳秒
-WSS_CONFIG_LAST_CHECK_TS = 0.0  # WSS配置最近检查时间戳，秒
-WSS_CONFIG_ACTIVE_HOUR = ""  # WSS配置当前生效整点分区，字符串
+WSS_CONFIG_PENDING_SEGMENT_MS = 0  # WSS待生效配置登记时所在分段起始时间，毫秒
+SEGMENT_CLOCK = (0, 0, "")  # 当前分段起止时间与分区字符串缓存，整体替换保证多线程读取一致，元组
 WSS_CONFIG_LOCK = threading.Lock()  # WSS配置热加载锁，锁
 S3_BUCKET_NAME = ""  # S3桶名称，字符串
 S3_PREFIX = ""  # S3目录前缀，路径
 DATA_STORAGE_MODE = "local"  # 数据存储模式，可选local或s3，字符串
+WS_ENGINE = "thread"  # WS采集引擎，可选thread或asyncio，字符串
+WS_PROCESS_MODE = False  # WS按交易所多进程采集开关，开关
 
 DATA_ROOT = Path("data")  # 数据根目录，路径
 KEEP_SUBDIRS = ("src", "dwd", "dws")  # 本地重置保留的一级目录列表，个数
@@ -158,6 +206,22 @@ WS_WRITE_BUFFER_BYTES = 0  # WS单文件写入缓冲字节阈值，字节
 WS_WRITE_BUFFER_INTERVAL_SECONDS = 0.0  # WS单文件写入缓冲刷新间隔，秒
 FILE_SEGMENT_SECONDS = 0  # WS文件切分间隔，秒
 FILE_SEGMENT_FORMAT = ""  # WS文件分区格式，字符串
+OVERLOAD_ENABLED = False  # WS过载降级开关，开关
+OVERLOAD_STEPS = []  # WS过载降级档位列表，按顺序逐级叠加动作，个数
+OVERLOAD_RECOVER_SECONDS = 0.0  # WS过载解除后持续多久回退一档，秒
+OVERLOAD_COALESCE_MS = 0  # WS过载合并档位下rt_ss最小写入间隔，毫秒
+OVERLOAD_REDUCED_DEPTH = 0  # WS过载缩减深度档位下的快照输出深度，档位
+OVERLOAD_LAG_EWMA_ALPHA = 0.2  # WS单会话滞后指数平均系数，比例
+OVERLOAD_ACTION_LABELS = {
+    "coalesce": "合并rt_ss",  # 按最小间隔合并rt_ss写入
+    "reduce_depth": "缩减深度",  # 缩减rt_ss与rt_ss_1s快照深度
+    "disable_rt_ss": "停写rt_ss",  # 停写rt_ss，rt_ss_1s照常输出
+}  # WS过载降级动作显示名称映射，映射
+SEGMENT_COMPRESSION = {}  # WS分段文件按阶段压缩方式映射，可选none、gzip或zstd，映射
+SEGMENT_SUFFIXES = {"none": ".json", "gzip": ".json.gz", "zstd": ".json.zst"}  # 分段压缩方式到文件后缀映射，映射
+SEGMENT_GZIP_LEVEL = 6  # 分段gzip压缩级别，级别
+SEGMENT_ZSTD_LEVEL = 3  # 分段zstd压缩级别，需安装zstandard，级别
+SEGMENT_ZSTD_LOCAL = threading.local()  # 线程内zstd压缩器缓存，对象
 DELIVERY_REFRESH_SECONDS = 15 * 60  # 动态合约刷新间隔，秒
 ORDERBOOK_DEPTH_FUTURE = 200  # 期货订单簿深度，档位
 ORDERBOOK_DEPTH_SPOT = 50  # 现货订单簿深度，档位
@@ -216,6 +280,20 @@ STATUS_TIMES = {
     "upload": 0.0,  # 上传最近更新时间戳，秒
 }  # 任务更新时间映射，映射
 RUNTIME_OBSERVE_CACHE = {"ts": 0.0, "text": ""}  # 运行时观测缓存，映射
+PROCESS_CPU_SAMPLE = {"wall_ts": 0.0, "cpu_ts": 0.0, "percent": 0.0}  # 进程CPU采样状态，映射
+LATENCY_EWMA_ALPHA = 0.01  # 消息延迟指数平均系数，比例
+LATENCY_MAX_WINDOW_SECONDS = 60  # 消息延迟峰值统计窗口，秒
+MARKET_LATENCY_LOCK = threading.Lock()  # 分市场消息延迟统计锁，锁
+MARKET_LATENCY_STATS = {
+    "future": {"count": 0, "ewma_ms": 0.0, "max_ms": 0, "window_start": 0.0},  # 期货消息延迟统计，映射
+    "spot": {"count": 0, "ewma_ms": 0.0, "max_ms": 0, "window_start": 0.0},  # 现货消息延迟统计，映射
+}  # 分市场消息延迟统计映射，映射
+PROCESS_CONTEXT = multiprocessing.get_context("spawn")  # 采集子进程启动上下文，上下文
+WORKER_EVENT_QUEUE = None  # 子进程向主进程上报事件的队列，为空表示主进程，队列
+WORKER_EVENT_POLL_SECONDS = 0.5  # 子进程事件队列轮询间隔，秒
+WORKER_METRICS_INTERVAL_SECONDS = 1.0  # 子进程运行观测上报间隔，秒
+WORKER_STOP_TIMEOUT_SECONDS = 10  # 子进程优雅退出等待时长，秒
+WORKER_METRICS = {}  # 采集子进程运行观测映射，映射
 
 initialize_wss_config()
 
@@ -285,6 +363,114 @@ class Task:
         return self.thread is not None and self.thread.is_alive()
 
 
+class SortedOrderBook:
+    """按价格有序维护的实时内存盘口。"""
+
+    def __init__(self, depth: int, keep_levels: int, formatter=None):
+        """初始化有序盘口。"""
+        self.depth = depth
+        self.keep_levels = max(depth, keep_levels)
+        self.formatter = formatter or format_number
+        self.bids = SortedDict(neg)
+        self.asks = SortedDict()
+        self.bid_texts = {}
+        self.ask_texts = {}
+        self.bid_prices = []
+        self.ask_prices = []
+        self.bid_levels = []
+        self.ask_levels = []
+        self.bid_dirty = True
+        self.ask_dirty = True
+
+    def replace(self, bids: list, asks: list) -> None:
+        """用快照整体替换盘口。"""
+        self.bids = SortedDict(neg, {float(price): float(size) for price, size in bids})
+        self.asks = SortedDict({float(price): float(size) for price, size in asks})
+        self.bids = self.trim_side(self.bids)
+        self.asks = self.trim_side(self.asks)
+        self.bid_texts = {}
+        self.ask_texts = {}
+        self.bid_dirty = True
+        self.ask_dirty = True
+
+    def apply_delta(self, bids: list, asks: list) -> None:
+        """将增量档位应用到盘口。"""
+        bid_boundary = self.view_boundary(self.bid_prices)
+        ask_boundary = self.view_boundary(self.ask_prices)
+        for price_text, size_text in bids:
+            price = float(price_text)
+            size = float(size_text)
+            if size == 0:
+                self.bids.pop(price, None)
+            else:
+                self.bids[price] = size
+            self.bid_texts.pop(price, None)
+            if bid_boundary is None or price >= bid_boundary:
+                self.bid_dirty = True
+        for price_text, size_text in asks:
+            price = float(price_text)
+            size = float(size_text)
+            if size == 0:
+                self.asks.pop(price, None)
+            else:
+                self.asks[price] = size
+            self.ask_texts.pop(price, None)
+            if ask_boundary is None or price <= ask_boundary:
+                self.ask_dirty = True
+        if len(self.bids) > self.keep_levels:
+            self.bids = self.trim_side(self.bids, self.bid_texts)
+        if len(self.asks) > self.keep_levels:
+            self.asks = self.trim_side(self.asks, self.ask_texts)
+
+    def trim_side(self, side: SortedDict, texts: dict | None = None) -> SortedDict:
+        """从远端弹出超出保留层数的档位。"""
+        while len(side) > self.keep_levels:
+            price, _size = side.popitem(-1)
+            if texts is not None:
+                texts.pop(price, None)
+        return side
+
+    def view_boundary(self, prices: list) -> float | None:
+        """返回缓存视图最末档价格，视图未满时返回空。"""
+        if self.depth <= 0 or len(prices) < self.depth:
+            return None
+        return prices[-1]
+
+    def build_side_view(self, side: SortedDict, texts: dict, depth: int) -> tuple[list, list]:
+        """构造单侧前N档价格列表与格式化档位列表。"""
+        prices = list(islice(side, depth))
+        levels = []
+        for price in prices:
+            level = texts.get(price)
+            if level is None:
+                level = [self.formatter(price), self.formatter(side[price])]
+                texts[price] = level
+            levels.append(level)
+        return prices, levels
+
+    def refresh_view(self) -> None:
+        """按需重建缓存的前N档视图。"""
+        if self.bid_dirty:
+            self.bid_prices, self.bid_levels = self.build_side_view(self.bids, self.bid_texts, self.depth)
+            self.bid_dirty = False
+        if self.ask_dirty:
+            self.ask_prices, self.ask_levels = self.build_side_view(self.asks, self.ask_texts, self.depth)
+            self.ask_dirty = False
+
+    def top_levels(self, depth: int) -> tuple[list, list, list, list]:
+        """返回买卖两侧前N档价格与格式化档位。"""
+        if depth == self.depth:
+            self.refresh_view()
+            return self.bid_prices, self.bid_levels, self.ask_prices, self.ask_levels
+        bid_prices, bid_levels = self.build_side_view(self.bids, self.bid_texts, depth)
+        ask_prices, ask_levels = self.build_side_view(self.asks, self.ask_texts, depth)
+        return bid_prices, bid_levels, ask_prices, ask_levels
+
+    def __len__(self) -> int:
+        """返回盘口总档位数。"""
+        return len(self.bids) + len(self.asks)
+
+
 def normalize_symbol_list(symbols: list[str]) -> list[str]:
     """对交易对列表去重并排序。"""
     return sorted(set(symbols))
@@ -296,6 +482,13 @@ def apply_storage_mode_from_argv() -> None:
     DATA_STORAGE_MODE = "s3" if "-s3" in sys.argv else "local"
 
 
+def apply_ws_engine_from_argv() -> None:
+    """根据启动参数选择WS采集引擎。"""
+    global WS_ENGINE, WS_PROCESS_MODE
+    WS_ENGINE = "asyncio" if "-wsasync" in sys.argv else "thread"
+    WS_PROCESS_MODE = "-wsproc" in sys.argv
+
+
 def has_remove_flag() -> bool:
     """判断是否启用清理启动参数。"""
     return "-rm" in sys.argv
@@ -307,6 +500,7 @@ def is_s3_storage_mode() -> bool:
 
 
 apply_storage_mode_from_argv()
+apply_ws_engine_from_argv()
 
 
 def market_task_id(market: str | None) -> str:
@@ -377,6 +571,9 @@ def write_error_line(source: str, text: str) -> None:
 
 def log(message: str, market: str | None = None) -> None:
     """输出运行日志并按需记录错误。"""
+    if WORKER_EVENT_QUEUE is not None:
+        WORKER_EVENT_QUEUE.put(("log", market, message))
+        return
     task_id = market_task_id(market)
     LOG_LINES[task_id].append(message)
     STATUS_TIMES[task_id] = time.time()
@@ -504,6 +701,20 @@ def read_process_peak_rss_bytes() -> int:
     return read_ru_maxrss_bytes()
 
 
+def read_process_cpu_percent() -> float:
+    """按相邻两次采样计算当前进程CPU占用百分比。"""
+    now_wall = time.monotonic()
+    now_cpu = time.process_time()
+    elapsed = now_wall - PROCESS_CPU_SAMPLE["wall_ts"]
+    if elapsed < 1.0:
+        return PROCESS_CPU_SAMPLE["percent"]
+    if PROCESS_CPU_SAMPLE["wall_ts"] > 0:
+        PROCESS_CPU_SAMPLE["percent"] = (now_cpu - PROCESS_CPU_SAMPLE["cpu_ts"]) / elapsed * 100
+    PROCESS_CPU_SAMPLE["wall_ts"] = now_wall
+    PROCESS_CPU_SAMPLE["cpu_ts"] = now_cpu
+    return PROCESS_CPU_SAMPLE["percent"]
+
+
 def read_ru_maxrss_bytes() -> int:
     """按当前平台解释ru_maxrss的单位。"""
     rss_value = int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
@@ -634,6 +845,9 @@ def enqueue_file_for_s3_upload(file_path: Path) -> None:
         return
     if not file_path.exists() or not file_path.is_file():
         return
+    if WORKER_EVENT_QUEUE is not None:
+        WORKER_EVENT_QUEUE.put(("upload", str(file_path)))
+        return
     file_key = str(file_path.resolve())
     with UPLOAD_QUEUE_LOCK:
         if file_key in UPLOAD_PENDING_PATHS:
@@ -788,19 +1002,55 @@ def build_dirs(exchange: str, market: str) -> tuple[Path, Path, Path, str, str,
     return rt_dir, rt_ss_dir, rt_ss_1s_dir, rt_tag, rt_ss_tag, rt_ss_1s_tag
 
 
+def segment_codec_for_tag(tag: str) -> str:
+    """按文件标签中的输出阶段返回分段压缩方式。"""
+    codec = SEGMENT_COMPRESSION.get(tag.rsplit("_orderbook_", 1)[-1], "none")
+    if codec not in SEGMENT_SUFFIXES:
+        raise RuntimeError(f"未支持的分段压缩方式: {codec}")
+    return codec
+
+
+def encode_segment_frame(codec: str, text: str) -> bytes:
+    """将一批行压缩为可独立解压的完整帧。"""
+    data = text.encode("utf-8")
+    if codec == "gzip":
+        compressor = zlib.compressobj(SEGMENT_GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    compressor = getattr(SEGMENT_ZSTD_LOCAL, "compressor", None)
+    if compressor is None:
+        try:
+            import zstandard
+        except ImportError as exc:
+            raise RuntimeError("zstd分段压缩需要安装zstandard") from exc
+        compressor = zstandard.ZstdCompressor(level=SEGMENT_ZSTD_LEVEL)
+        SEGMENT_ZSTD_LOCAL.compressor = compressor
+    return compressor.compress(data)
+
+
 def build_file_path(base_dir: Path, symbol: str, bucket_str: str, tag: str) -> Path:
-    """构造实时分区文件路径。"""
-    file_name = f"{symbol}-{tag}-{bucket_str}.json"
+    """构造实时分区文件路径，压缩分段追加压缩后缀。"""
+    file_name = f"{symbol}-{tag}-{bucket_str}{SEGMENT_SUFFIXES[segment_codec_for_tag(tag)]}"
     hour_dir = bucket_str[:10]
     return base_dir / symbol / hour_dir / file_name
 
 
 def hour_str_from_ms(ts_ms: int) -> str:
-    """将毫秒时间戳转换为分区字符串。"""
-    reload_wss_config_if_needed()
-    bucket_ms = FILE_SEGMENT_SECONDS * 1000
-    normalized_ts_ms = ts_ms - (ts_ms % bucket_ms)
-    return datetime.fromtimestamp(normalized_ts_ms / 1000, tz=timezone.utc).strftime(FILE_SEGMENT_FORMAT)
+    """将毫秒时间戳转换为分区字符串，落在当前分段内时只做整数比较。"""
+    start_ms, end_ms, text = SEGMENT_CLOCK
+    if start_ms <= ts_ms < end_ms:
+        return text
+    return advance_segment_clock(ts_ms)
+
+
+def advance_segment_clock(ts_ms: int) -> str:
+    """跨越分段边界时切换待生效配置并重算分区字符串，早于当前分段的时间戳只计算不缓存。"""
+    global SEGMENT_CLOCK
+    activate_pending_wss_config(ts_ms)
+    start_ms = segment_start_ms(ts_ms)
+    text = datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc).strftime(FILE_SEGMENT_FORMAT)
+    if start_ms >= SEGMENT_CLOCK[0]:
+        SEGMENT_CLOCK = (start_ms, start_ms + FILE_SEGMENT_SECONDS * 1000, text)
+    return text
 
 
 def ensure_writer(base_dir: Path, symbol: str, hour_str: str, tag: str, writer):
@@ -811,9 +1061,11 @@ def ensure_writer(base_dir: Path, symbol: str, hour_str: str, tag: str, writer):
     if writer:
         close_writer(writer)
     ensure_parent(target_path)
+    codec = segment_codec_for_tag(tag)
     return {
         "path": target_path,
-        "file": target_path.open("a", encoding="utf-8"),
+        "codec": codec,
+        "file": target_path.open("a", encoding="utf-8") if codec == "none" else target_path.open("ab"),
         "buffer": [],
         "buffer_bytes": 0,
         "last_flush": time.monotonic(),
@@ -824,7 +1076,11 @@ def flush_writer_buffer(writer) -> None:
     """将写入缓冲刷到磁盘。"""
     if not writer or not writer["buffer"]:
         return
-    writer["file"].write("".join(writer["buffer"]))
+    text = "".join(writer["buffer"])
+    if writer["codec"] == "none":
+        writer["file"].write(text)
+    else:
+        writer["file"].write(encode_segment_frame(writer["codec"], text))
     writer["file"].flush()
     writer["buffer"].clear()
     writer["buffer_bytes"] = 0
@@ -853,43 +1109,24 @@ def format_number(value: float) -> str:
     return format(value, "f").rstrip("0").rstrip(".") if "." in format(value, "f") else str(value)
 
 
-def replace_orderbook(orderbook: dict, bids: list, asks: list) -> None:
-    """用完整快照替换当前盘口。"""
-    orderbook["bids"] = {float(price): float(size) for price, size in bids}
-    orderbook["asks"] = {float(price): float(size) for price, size in asks}
+def build_orderbook(depth: int) -> SortedOrderBook:
+    """构造带前N档缓存的内存盘口。"""
+    return SortedOrderBook(depth, KEEP_ORDERBOOK_LEVELS)
 
 
-def apply_orderbook_delta(orderbook: dict, bids: list, asks: list) -> None:
-    """将增量消息应用到当前盘口。"""
-    for price, size in bids:
-        price_value = float(price)
-        size_value = float(size)
-        if size_value == 0:
-            orderbook["bids"].pop(price_value, None)
-        else:
-            orderbook["bids"][price_value] = size_value
-    for price, size in asks:
-        price_value = float(price)
-        size_value = float(size)
-        if size_value == 0:
-            orderbook["asks"].pop(price_value, None)
-        else:
-            orderbook["asks"][price_value] = size_value
+def replace_orderbook(orderbook: SortedOrderBook, bids: list, asks: list) -> None:
+    """用完整快照替换当前盘口。"""
+    orderbook.replace(bids, asks)
 
 
-def trim_orderbook(orderbook: dict) -> None:
-    """裁剪内存盘口层数。"""
-    if len(orderbook["bids"]) > KEEP_ORDERBOOK_LEVELS:
-        bids_sorted = sorted(orderbook["bids"].items(), key=lambda item: item[0], reverse=True)[:KEEP_ORDERBOOK_LEVELS]
-        orderbook["bids"] = dict(bids_sorted)
-    if len(orderbook["asks"]) > KEEP_ORDERBOOK_LEVELS:
-        asks_sorted = sorted(orderbook["asks"].items(), key=lambda item: item[0])[:KEEP_ORDERBOOK_LEVELS]
-        orderbook["asks"] = dict(asks_sorted)
+def apply_orderbook_delta(orderbook: SortedOrderBook, bids: list, asks: list) -> None:
+    """将增量消息应用到当前盘口。"""
+    orderbook.apply_delta(bids, asks)
 
 
 def build_snapshot(
     symbol: str,
-    orderbook: dict,
+    orderbook: SortedOrderBook,
     update_type: str,
     ts_ms: int,
     cts_ms: int,
@@ -899,10 +1136,7 @@ def build_snapshot(
     depth: int,
 ) -> dict:
     """构造统一快照结构。"""
-    bids_sorted = sorted(orderbook["bids"].items(), key=lambda item: item[0], reverse=True)[:depth]
-    asks_sorted = sorted(orderbook["asks"].items(), key=lambda item: item[0])[:depth]
-    best_bid = bids_sorted[0][0] if bids_sorted else None
-    best_ask = asks_sorted[0][0] if asks_sorted else None
+    bid_prices, bid_levels, ask_prices, ask_levels = orderbook.top_levels(depth)
     return {
         "symbol": symbol,
         "update_type": update_type,
@@ -911,12 +1145,12 @@ def build_snapshot(
         "collect_ts": collect_ts,
         "update_id": update_id,
         "seq": seq,
-        "best_bid": best_bid,
-        "best_ask": best_ask,
-        "bid_depth": len(bids_sorted),
-        "ask_depth": len(asks_sorted),
-        "bids": [[format_number(price), format_number(size)] for price, size in bids_sorted],
-        "asks": [[format_number(price), format_number(size)] for price, size in asks_sorted],
+        "best_bid": bid_prices[0] if bid_prices else None,
+        "best_ask": ask_prices[0] if ask_prices else None,
+        "bid_depth": len(bid_levels),
+        "ask_depth": len(ask_levels),
+        "bids": bid_levels,
+        "asks": ask_levels,
     }
 
 
@@ -977,17 +1211,23 @@ def build_ws_urls(exchange: str, market: str, symbol: str) -> list[str]:
     return [primary_url, primary_url]
 
 
-def send_subscribe(ws: websocket.WebSocket, exchange: str, market: str, symbol: str, depth: int) -> None:
-    """发送订阅请求。"""
+def build_subscribe_payload(exchange: str, market: str, symbol: str, depth: int) -> str | None:
+    """构造订阅请求内容。"""
     if exchange == "bitget":
         inst_type = "USDT-FUTURES" if market == "future" else "SPOT"
         payload = {"op": "subscribe", "args": [{"instType": inst_type, "channel": "books", "instId": symbol}]}
-        ws.send(json.dumps(payload, ensure_ascii=True, separators=(",", ":")))
-        return
+        return json.dumps(payload, ensure_ascii=True, separators=(",", ":"))
     if exchange == "okx":
         payload = {"op": "subscribe", "args": [{"channel": "books", "instId": symbol}]}
-        ws.send(json.dumps(payload, ensure_ascii=True, separators=(",", ":")))
-        return
+        return json.dumps(payload, ensure_ascii=True, separators=(",", ":"))
+    return None
+
+
+def send_subscribe(ws: websocket.WebSocket, exchange: str, market: str, symbol: str, depth: int) -> None:
+    """发送订阅请求。"""
+    payload = build_subscribe_payload(exchange, market, symbol, depth)
+    if payload is not None:
+        ws.send(payload)
 
 
 def ping_payload(exchange: str) -> str | None:
@@ -1005,6 +1245,7 @@ def build_session_state() -> dict:
         "connected": {PRIMARY_ROLE: False, BACKUP_ROLE: False},
         "recv_count": {PRIMARY_ROLE: 0, BACKUP_ROLE: 0},
         "status_text": {PRIMARY_ROLE: "准备连接", BACKUP_ROLE: "准备连接"},
+        "overload_level": {PRIMARY_ROLE: 0, BACKUP_ROLE: 0},
         "first_connected_logged": False,
     }
 
@@ -1051,13 +1292,20 @@ def build_ws_status_text(state: dict) -> tuple[int, str]:
     else:
         role_summary = "双断重连中"
     online_flag = 1 if state["connected"][active_role] else 0
-    return online_flag, f"{role_summary} | 主:{primary_short} 备:{backup_short} | 消息:{active_count}"
+    status_text = f"{role_summary} | 主:{primary_short} 备:{backup_short} | 消息:{active_count}"
+    overload_level = state["overload_level"][active_role]
+    if overload_level:
+        status_text += f" | 降级:L{overload_level}"
+    return online_flag, status_text
 
 
 def status_update(exchange: str, market: str, symbol: str, value) -> None:
     """更新统一状态键的状态值。"""
     task_id = market_task_id(market)
     key = get_status_key(exchange, market, symbol)
+    if WORKER_EVENT_QUEUE is not None:
+        WORKER_EVENT_QUEUE.put(("status", task_id, key, value))
+        return
     if value is None:
         STATUS_COUNTS[task_id].pop(key, None)
     else:
@@ -1088,7 +1336,8 @@ def update_shared_status(
             state["first_connected_logged"] = True
             first_connected = True
         online_flag, status_text_value = build_ws_status_text(state)
-    status_update(exchange, market, symbol, (online_flag, status_text_value))
+        overload_level = state["overload_level"][state["active_role"]]
+    status_update(exchange, market, symbol, (online_flag, status_text_value, overload_level))
     if first_connected:
         log(f"{exchange} {market} {symbol} 主备连接成功", market)
 
@@ -1182,11 +1431,12 @@ def normalize_okx_raw(message: dict, item: dict, collect_ts: int, symbol: str, d
     }
 
 
-def apply_binance_message(orderbook: dict, symbol: str, message: dict, collect_ts: int, depth: int) -> tuple[dict, dict]:
+def apply_binance_message(
+    orderbook: SortedOrderBook, symbol: str, message: dict, collect_ts: int, depth: int, snapshot_depth: int | None = None
+) -> tuple[dict, dict]:
     """处理Binance消息并生成快照。"""
     raw_record = normalize_binance_raw(message, collect_ts, message.get("s", symbol), depth)
     replace_orderbook(orderbook, message.get("b", []), message.get("a", []))
-    trim_orderbook(orderbook)
     snapshot = build_snapshot(
         message.get("s", symbol),
         orderbook,
@@ -1196,12 +1446,14 @@ def apply_binance_message(orderbook: dict, symbol: str, message: dict, collect_t
         collect_ts,
         int(message.get("u", "0") or 0),
         int(message.get("u", "0") or 0),
-        depth,
+        snapshot_depth or depth,
     )
     return raw_record, snapshot
 
 
-def apply_bitget_message(orderbook: dict, symbol: str, message: dict, collect_ts: int, depth: int) -> tuple[list, list]:
+def apply_bitget_message(
+    orderbook: SortedOrderBook, symbol: str, message: dict, collect_ts: int, depth: int, snapshot_depth: int | None = None
+) -> tuple[list, list]:
     """处理Bitget消息并生成快照列表。"""
     raw_records = []
     if message.get("event") == "subscribe":
@@ -1216,7 +1468,6 @@ def apply_bitget_message(orderbook: dict, symbol: str, message: dict, collect_ts
             apply_orderbook_delta(orderbook, item.get("bids", []), item.get("asks", []))
         else:
             continue
-        trim_orderbook(orderbook)
         ts_ms = int(item.get("ts", "0") or 0)
         seq = int(item.get("seq", "0") or 0)
         snapshots.append(
@@ -1229,13 +1480,15 @@ def apply_bitget_message(orderbook: dict, symbol: str, message: dict, collect_ts
                 collect_ts,
                 seq if seq else None,
                 seq if seq else None,
-                depth,
+                snapshot_depth or depth,
             )
         )
     return raw_records, snapshots
 
 
-def apply_okx_message(orderbook: dict, symbol: str, message: dict, collect_ts: int, depth: int) -> tuple[list, list]:
+def apply_okx_message(
+    orderbook: SortedOrderBook, symbol: str, message: dict, collect_ts: int, depth: int, snapshot_depth: int | None = None
+) -> tuple[list, list]:
     """处理OKX消息并生成快照列表。"""
     raw_records = []
     if message.get("event") == "subscribe":
@@ -1252,7 +1505,6 @@ def apply_okx_message(orderbook: dict, symbol: str, message: dict, collect_ts: i
             apply_orderbook_delta(orderbook, bids, asks)
         else:
             continue
-        trim_orderbook(orderbook)
         ts_ms = int(item.get("ts", "0") or 0)
         update_id = int(item.get("seqId", item.get("ts", "0")) or 0)
         previous_id = int(item.get("prevSeqId", update_id) or update_id)
@@ -1266,7 +1518,7 @@ def apply_okx_message(orderbook: dict, symbol: str, message: dict, collect_ts: i
                 collect_ts,
                 update_id if update_id else None,
                 previous_id if previous_id else None,
-                depth,
+                snapshot_depth or depth,
             )
         )
     return raw_records, snapshots
@@ -1308,38 +1560,276 @@ def is_active_role(state: dict, role: str) -> bool:
         return state["active_role"] == role
 
 
+def market_depth(market: str) -> int:
+    """返回指定市场的快照输出深度。"""
+    return ORDERBOOK_DEPTH_FUTURE if market == "future" else ORDERBOOK_DEPTH_SPOT
+
+
+def record_message_latency(market: str, latency_ms: int) -> None:
+    """记录交易所时间到本地采集时间的消息延迟。"""
+    now_ts = time.monotonic()
+    with MARKET_LATENCY_LOCK:
+        stats = MARKET_LATENCY_STATS[market]
+        if stats["count"] == 0:
+            stats["ewma_ms"] = float(latency_ms)
+        else:
+            stats["ewma_ms"] += (latency_ms - stats["ewma_ms"]) * LATENCY_EWMA_ALPHA
+        if now_ts - stats["window_start"] >= LATENCY_MAX_WINDOW_SECONDS:
+            stats["window_start"] = now_ts
+            stats["max_ms"] = latency_ms
+        else:
+            stats["max_ms"] = max(stats["max_ms"], latency_ms)
+        stats["count"] += 1
+
+
+def get_market_latency_snapshot(market: str) -> dict:
+    """返回指定市场的消息延迟统计快照。"""
+    with MARKET_LATENCY_LOCK:
+        return dict(MARKET_LATENCY_STATS[market])
+
+
+def merge_worker_latency(market: str) -> dict:
+    """合并主进程与采集子进程的消息延迟统计。"""
+    stats = get_market_latency_snapshot(market)
+    count = stats["count"]
+    latency_total = stats["ewma_ms"] * count
+    max_ms = stats["max_ms"]
+    for metrics in list(WORKER_METRICS.values()):
+        if metrics["market"] != market:
+            continue
+        count += metrics["latency"]["count"]
+        latency_total += metrics["latency"]["ewma_ms"] * metrics["latency"]["count"]
+        max_ms = max(max_ms, metrics["latency"]["max_ms"])
+    return {"count": count, "ewma_ms": latency_total / count if count else 0.0, "max_ms": max_ms}
+
+
+def handle_session_error(state: dict, exchange: str, market: str, symbol: str, role: str, status_text: str, exc: BaseException) -> None:
+    """记录单个角色的连接错误并触发主备切换。"""
+    update_shared_status(state, exchange, market, symbol, role, connected=False, status_text=status_text)
+    switch_active_role(state, exchange, market, symbol, role)
+    log(f"{exchange} {market} {symbol} {role_label(role)}{status_text}，准备重连: {exc}", market)
+
+
+def build_session_context(exchange: str, market: str, symbol: str, role: str, state: dict) -> dict:
+    """构造单次WS会话的处理上下文。"""
+    depth = market_depth(market)
+    rt_dir, rt_ss_dir, rt_ss_1s_dir, rt_tag, rt_ss_tag, rt_ss_1s_tag = build_dirs(exchange, market)
+    return {
+        "exchange": exchange,
+        "market": market,
+        "symbol": symbol,
+        "role": role,
+        "state": state,
+        "depth": depth,
+        "rt_dir": rt_dir,
+        "rt_ss_dir": rt_ss_dir,
+        "rt_ss_1s_dir": rt_ss_1s_dir,
+        "rt_tag": rt_tag,
+        "rt_ss_tag": rt_ss_tag,
+        "rt_ss_1s_tag": rt_ss_1s_tag,
+        "orderbook": build_orderbook(depth),
+        "rt_writer": None,
+        "rt_ss_writer": None,
+        "rt_ss_1s_writer": None,
+        "recv_count": 0,
+        "last_status_ts": time.monotonic(),
+        "last_second": None,
+        "last_snapshot": None,
+        "sock": None,
+        "lag_ewma_ms": None,
+        "backlog_bytes": 0,
+        "overload_level": 0,
+        "overload_actions": set(),
+        "overload_calm_since": None,
+        "last_rt_ss_ts": 0,
+    }
+
+
+def apply_exchange_message(context: dict, message: dict, collect_ts: int) -> tuple[list, list]:
+    """按交易所处理单条消息并返回原始记录与快照，缩减深度档位下直接按缩减后的深度构造快照。"""
+    exchange = context["exchange"]
+    symbol = context["symbol"]
+    orderbook = context["orderbook"]
+    depth = context["depth"]
+    snapshot_depth = None
+    if "reduce_depth" in context["overload_actions"] and OVERLOAD_REDUCED_DEPTH > 0:
+        snapshot_depth = min(depth, OVERLOAD_REDUCED_DEPTH)
+    if exchange == "binance":
+        raw_record, snapshot = apply_binance_message(orderbook, symbol, message, collect_ts, depth, snapshot_depth)
+        return [raw_record], [snapshot]
+    if exchange == "bitget":
+        return apply_bitget_message(orderbook, symbol, message, collect_ts, depth, snapshot_depth)
+    return apply_okx_message(orderbook, symbol, message, collect_ts, depth, snapshot_depth)
+
+
+def read_socket_backlog_bytes(sock) -> int:
+    """读取套接字内核接收队列中尚未读取的字节数，无法读取时返回0。"""
+    if sock is None:
+        return 0
+    try:
+        backlog = struct.unpack("i", fcntl.ioctl(sock.fileno(), termios.FIONREAD, b"\0\0\0\0"))[0]
+    except (OSError, ValueError):
+        return 0
+    pending = getattr(sock, "pending", None)
+    return backlog + (pending() if pending else 0)
+
+
+def record_session_lag(context: dict, lag_ms: int) -> None:
+    """更新单个会话交易所时间到本地采集时间的滞后指数平均。"""
+    if context["lag_ewma_ms"] is None:
+        context["lag_ewma_ms"] = float(lag_ms)
+    else:
+        context["lag_ewma_ms"] += (lag_ms - context["lag_ewma_ms"]) * OVERLOAD_LAG_EWMA_ALPHA
+
+
+def find_overload_target(context: dict) -> int:
+    """按滞后与接收积压返回应进入的降级档位，0表示正常。"""
+    if not OVERLOAD_ENABLED:
+        return 0
+    lag_ms = context["lag_ewma_ms"] or 0.0
+    backlog_bytes = context["backlog_bytes"]
+    target = 0
+    for index, step in enumerate(OVERLOAD_STEPS):
+        if lag_ms >= step["lag_ms"] or backlog_bytes >= step["backlog_bytes"]:
+            target = index + 1
+    return target
+
+
+def set_overload_level(context: dict, level: int) -> None:
+    """切换会话降级档位并记录日志。"""
+    previous = context["overload_level"]
+    context["overload_level"] = level
+    context["overload_actions"] = {step["action"] for step in OVERLOAD_STEPS[:level]}
+    with context["state"]["lock"]:
+        context["state"]["overload_level"][context["role"]] = level
+    actions_text = "、".join(OVERLOAD_ACTION_LABELS[step["action"]] for step in OVERLOAD_STEPS[:level]) or "全部恢复"
+    lag_ms = context["lag_ewma_ms"] or 0.0
+    direction = "过载降级" if level > previous else "降级回退"
+    log(
+        f"{context['exchange']} {context['market']} {context['symbol']} {role_label(context['role'])}连接{direction} L{previous}->L{level}"
+        f" | 滞后 {lag_ms:.0f}ms | 接收积压 {format_bytes_text(context['backlog_bytes'])} | {actions_text}",
+        context["market"],
+    )
+
+
+def update_overload_level(context: dict, now_ts: float) -> None:
+    """评估会话过载状态，升档立即生效，降档需持续恢复后逐级回退。"""
+    context["backlog_bytes"] = read_socket_backlog_bytes(context["sock"])
+    level = min(context["overload_level"], len(OVERLOAD_STEPS))
+    target = find_overload_target(context)
+    if target > level:
+        context["overload_calm_since"] = None
+        set_overload_level(context, target)
+    elif target < level:
+        if context["overload_calm_since"] is None:
+            context["overload_calm_since"] = now_ts
+        elif now_ts - context["overload_calm_since"] >= OVERLOAD_RECOVER_SECONDS:
+            context["overload_calm_since"] = now_ts
+            set_overload_level(context, level - 1)
+    else:
+        context["overload_calm_since"] = None
+
+
+def should_write_rt_ss(context: dict, snapshot: dict) -> bool:
+    """按当前降级动作判断快照是否写入rt_ss。"""
+    actions = context["overload_actions"]
+    if "disable_rt_ss" in actions:
+        return False
+    if "coalesce" in actions and snapshot["collect_ts"] - context["last_rt_ss_ts"] < OVERLOAD_COALESCE_MS:
+        return False
+    context["last_rt_ss_ts"] = snapshot["collect_ts"]
+    return True
+
+
+def write_session_records(context: dict, raw_records: list, snapshots: list, collect_ts: int) -> None:
+    """将会话输出写入三类订单簿文件，过载时按降级动作缩减rt_ss输出。"""
+    symbol = context["symbol"]
+    hour_str = hour_str_from_ms(collect_ts)
+    context["rt_writer"] = ensure_writer(context["rt_dir"], symbol, hour_str, context["rt_tag"], context["rt_writer"])
+    for raw_record in raw_records:
+        context["rt_writer"] = write_json_line(context["rt_writer"], raw_record)
+    for snapshot in snapshots:
+        if should_write_rt_ss(context, snapshot):
+            snapshot_hour = hour_str_from_ms(snapshot["collect_ts"])
+            context["rt_ss_writer"] = ensure_writer(context["rt_ss_dir"], symbol, snapshot_hour, context["rt_ss_tag"], context["rt_ss_writer"])
+            context["rt_ss_writer"] = write_json_line(context["rt_ss_writer"], snapshot)
+        second_bucket = int(snapshot["collect_ts"] / 1000)
+        if context["last_second"] is None:
+            context["last_second"] = second_bucket
+        if second_bucket != context["last_second"] and context["last_snapshot"]:
+            context["rt_ss_1s_writer"] = flush_second_snapshot(
+                context["last_snapshot"], context["rt_ss_1s_writer"], context["rt_ss_1s_dir"], context["rt_ss_1s_tag"], symbol
+            )
+            context["last_second"] = second_bucket
+        context["last_snapshot"] = snapshot
+
+
+def close_session_writers(context: dict) -> None:
+    """关闭会话持有的全部写入器。"""
+    context["rt_writer"], context["rt_ss_writer"], context["rt_ss_1s_writer"] = close_writers(
+        context["rt_writer"], context["rt_ss_writer"], context["rt_ss_1s_writer"]
+    )
+
+
+def handle_session_message(context: dict, raw: str) -> None:
+    """处理单条WS文本消息并按主备状态落盘。"""
+    if raw == "pong":
+        return
+    exchange = context["exchange"]
+    market = context["market"]
+    symbol = context["symbol"]
+    role = context["role"]
+    state = context["state"]
+    context["recv_count"] += 1
+    now_status_ts = time.monotonic()
+    if now_status_ts - context["last_status_ts"] >= WS_STATUS_INTERVAL_SECONDS:
+        update_overload_level(context, now_status_ts)
+        recv_count = context["recv_count"]
+        update_shared_status(state, exchange, market, symbol, role, connected=True, status_text=f"已连接 {recv_count}", recv_count=recv_count)
+        context["last_status_ts"] = now_status_ts
+    collect_ts = int(datetime.now(tz=timezone.utc).timestamp() * 1000)
+    message = json.loads(raw)
+    raw_records, snapshots = apply_exchange_message(context, message, collect_ts)
+    if not is_active_role(state, role):
+        close_session_writers(context)
+        return
+    if snapshots:
+        latency_ms = collect_ts - int(snapshots[-1]["ts"] or collect_ts)
+        record_message_latency(market, latency_ms)
+        record_session_lag(context, latency_ms)
+    write_session_records(context, raw_records, snapshots, collect_ts)
+
+
+def close_session_context(context: dict) -> None:
+    """结束会话时补写最后一秒快照并关闭写入器。"""
+    last_snapshot = context["last_snapshot"]
+    if last_snapshot and is_active_role(context["state"], context["role"]):
+        context["rt_ss_1s_writer"] = flush_second_snapshot(
+            last_snapshot, context["rt_ss_1s_writer"], context["rt_ss_1s_dir"], context["rt_ss_1s_tag"], context["symbol"]
+        )
+    close_session_writers(context)
+    if context["overload_level"]:
+        set_overload_level(context, 0)
+
+
 def run_session(exchange: str, market: str, symbol: str, role: str, ws_url: str, stop_event: threading.Event, state: dict) -> None:
     """运行单个角色的一次WS会话。"""
-    depth = ORDERBOOK_DEPTH_FUTURE if market == "future" else ORDERBOOK_DEPTH_SPOT
-    rt_dir, rt_ss_dir, rt_ss_1s_dir, rt_tag, rt_ss_tag, rt_ss_1s_tag = build_dirs(exchange, market)
     try:
         ws = connect_ws(ws_url)
-        send_subscribe(ws, exchange, market, symbol, depth)
+        send_subscribe(ws, exchange, market, symbol, market_depth(market))
         update_shared_status(state, exchange, market, symbol, role, connected=True, status_text="已连接 0", recv_count=0)
     except websocket.WebSocketException as exc:
-        update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="连接异常")
-        switch_active_role(state, exchange, market, symbol, role)
-        log(f"{exchange} {market} {symbol} {role_label(role)}连接异常，准备重连: {exc}", market)
+        handle_session_error(state, exchange, market, symbol, role, "连接异常", exc)
         return
     except TimeoutError as exc:
-        update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="连接超时")
-        switch_active_role(state, exchange, market, symbol, role)
-        log(f"{exchange} {market} {symbol} {role_label(role)}连接超时，准备重连: {exc}", market)
+        handle_session_error(state, exchange, market, symbol, role, "连接超时", exc)
         return
     except OSError as exc:
-        update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="网络错误")
-        switch_active_role(state, exchange, market, symbol, role)
-        log(f"{exchange} {market} {symbol} {role_label(role)}网络错误，准备重连: {exc}", market)
+        handle_session_error(state, exchange, market, symbol, role, "网络错误", exc)
         return
 
-    orderbook = {"bids": {}, "asks": {}}
-    rt_writer = None
-    rt_ss_writer = None
-    rt_ss_1s_writer = None
-    recv_count = 0
-    last_status_ts = time.monotonic()
-    last_second = None
-    last_snapshot = None
+    context = build_session_context(exchange, market, symbol, role, state)
+    context["sock"] = ws.sock
     heartbeat_closed = threading.Event()
 
     def keepalive() -> None:
@@ -1367,63 +1857,18 @@ def run_session(exchange: str, market: str, symbol: str, role: str, ws_url: str,
         try:
             raw = ws.recv()
         except websocket.WebSocketException as exc:
-            update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="连接异常")
-            switch_active_role(state, exchange, market, symbol, role)
-            log(f"{exchange} {market} {symbol} {role_label(role)}连接异常，准备重连: {exc}", market)
+            handle_session_error(state, exchange, market, symbol, role, "连接异常", exc)
             break
         except TimeoutError as exc:
-            update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="连接超时")
-            switch_active_role(state, exchange, market, symbol, role)
-            log(f"{exchange} {market} {symbol} {role_label(role)}连接超时，准备重连: {exc}", market)
+            handle_session_error(state, exchange, market, symbol, role, "连接超时", exc)
             break
         except OSError as exc:
-            update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="网络错误")
-            switch_active_role(state, exchange, market, symbol, role)
-            log(f"{exchange} {market} {symbol} {role_label(role)}网络错误，准备重连: {exc}", market)
+            handle_session_error(state, exchange, market, symbol, role, "网络错误", exc)
             break
-        if raw == "pong":
-            continue
-        recv_count += 1
-        now_status_ts = time.monotonic()
-        if now_status_ts - last_status_ts >= WS_STATUS_INTERVAL_SECONDS:
-            update_shared_status(state, exchange, market, symbol, role, connected=True, status_text=f"已连接 {recv_count}", recv_count=recv_count)
-            last_status_ts = now_status_ts
-        collect_ts = int(datetime.now(tz=timezone.utc).timestamp() * 1000)
-        message = json.loads(raw)
-        snapshots = []
-        if exchange == "binance":
-            raw_record, snapshot = apply_binance_message(orderbook, symbol, message, collect_ts, depth)
-            raw_records = [raw_record]
-            snapshots.append(snapshot)
-        elif exchange == "bitget":
-            raw_records, snapshots = apply_bitget_message(orderbook, symbol, message, collect_ts, depth)
-        else:
-            raw_records, snapshots = apply_okx_message(orderbook, symbol, message, collect_ts, depth)
-
-        if not is_active_role(state, role):
-            rt_writer, rt_ss_writer, rt_ss_1s_writer = close_writers(rt_writer, rt_ss_writer, rt_ss_1s_writer)
-            continue
-
-        hour_str = hour_str_from_ms(collect_ts)
-        rt_writer = ensure_writer(rt_dir, symbol, hour_str, rt_tag, rt_writer)
-        for raw_record in raw_records:
-            rt_writer = write_json_line(rt_writer, raw_record)
-        for snapshot in snapshots:
-            snapshot_hour = hour_str_from_ms(snapshot["collect_ts"])
-            rt_ss_writer = ensure_writer(rt_ss_dir, symbol, snapshot_hour, rt_ss_tag, rt_ss_writer)
-            rt_ss_writer = write_json_line(rt_ss_writer, snapshot)
-            second_bucket = int(snapshot["collect_ts"] / 1000)
-            if last_second is None:
-                last_second = second_bucket
-            if second_bucket != last_second and last_snapshot:
-                rt_ss_1s_writer = flush_second_snapshot(last_snapshot, rt_ss_1s_writer, rt_ss_1s_dir, rt_ss_1s_tag, symbol)
-                last_second = second_bucket
-            last_snapshot = snapshot
+        handle_session_message(context, raw)
 
     heartbeat_closed.set()
-    if last_snapshot and is_active_role(state, role):
-        rt_ss_1s_writer = flush_second_snapshot(last_snapshot, rt_ss_1s_writer, rt_ss_1s_dir, rt_ss_1s_tag, symbol)
-    rt_writer, rt_ss_writer, rt_ss_1s_writer = close_writers(rt_writer, rt_ss_writer, rt_ss_1s_writer)
+    close_session_context(context)
     ws.close()
     update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="连接关闭")
     switch_active_role(state, exchange, market, symbol, role)
@@ -1470,7 +1915,7 @@ def sleep_with_exit(seconds: int | float) -> None:
     """按秒等待并响应退出事件。"""
     deadline = time.time() + max(0.0, float(seconds))
     while not EXIT_REQUESTED.is_set():
-        if reload_wss_config_if_needed():
+        if activate_pending_wss_config_now():
             return
         remaining = deadline - time.time()
         if remaining <= 0:
@@ -1489,7 +1934,7 @@ def run_exchange_supervisor(exchange: str, market: str) -> None:
     workers: dict[str, tuple[threading.Event, threading.Thread]] = {}
     fallback_symbols = get_future_symbols(exchange) if market == "future" else get_spot_symbols(exchange)
     while not EXIT_REQUESTED.is_set():
-        reload_wss_config_if_needed()
+        activate_pending_wss_config_now()
         try:
             desired_symbols = resolve_symbols(exchange, market)
         except NetworkRequestError as exc:
@@ -1513,6 +1958,12 @@ def run_exchange_supervisor(exchange: str, market: str) -> None:
 
 def run_market_ws(market: str) -> None:
     """运行指定市场的多交易所订单簿WS。"""
+    if WS_PROCESS_MODE:
+        run_market_processes(market)
+        return
+    if WS_ENGINE == "asyncio":
+        asyncio.run(run_market_ws_async(market))
+        return
     supervisors = []
     for exchange in list_exchanges():
         thread = threading.Thread(target=run_exchange_supervisor, args=(exchange, market), daemon=True)
@@ -1523,6 +1974,258 @@ def run_market_ws(market: str) -> None:
             thread.join(timeout=1.0)
 
 
+async def sleep_with_exit_async(seconds: int | float) -> None:
+    """在事件循环内按秒等待并响应退出事件。"""
+    deadline = time.time() + max(0.0, float(seconds))
+    while not EXIT_REQUESTED.is_set():
+        if activate_pending_wss_config_now():
+            return
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(1.0, remaining))
+
+
+async def keepalive_async(ws, exchange: str) -> None:
+    """后台协程发送心跳包。"""
+    from websockets.exceptions import WebSocketException
+
+    payload = ping_payload(exchange)
+    if payload is None:
+        return
+    while not EXIT_REQUESTED.is_set():
+        await asyncio.sleep(WS_PING_INTERVAL_SECONDS)
+        try:
+            await ws.send(payload)
+        except WebSocketException:
+            return
+        except TimeoutError:
+            return
+        except OSError:
+            return
+
+
+async def run_session_async(exchange: str, market: str, symbol: str, role: str, ws_url: str, state: dict) -> None:
+    """运行单个角色的一次异步WS会话，会话上下文构建、消息处理与收尾均含落盘，经线程执行以免阻塞事件循环。"""
+    from websockets.asyncio.client import connect
+    from websockets.exceptions import WebSocketException
+
+    try:
+        ws = await connect(ws_url, open_timeout=WS_TIMEOUT_SECONDS, ping_interval=None, max_size=None)
+        payload = build_subscribe_payload(exchange, market, symbol, market_depth(market))
+        if payload is not None:
+            await ws.send(payload)
+        update_shared_status(state, exchange, market, symbol, role, connected=True, status_text="已连接 0", recv_count=0)
+    except WebSocketException as exc:
+        handle_session_error(state, exchange, market, symbol, role, "连接异常", exc)
+        return
+    except TimeoutError as exc:
+        handle_session_error(state, exchange, market, symbol, role, "连接超时", exc)
+        return
+    except OSError as exc:
+        handle_session_error(state, exchange, market, symbol, role, "网络错误", exc)
+        return
+
+    context = await asyncio.to_thread(build_session_context, exchange, market, symbol, role, state)
+    context["sock"] = ws.transport.get_extra_info("socket")
+    keepalive_task = asyncio.create_task(keepalive_async(ws, exchange))
+    try:
+        while not EXIT_REQUESTED.is_set():
+            try:
+                raw = await asyncio.wait_for(ws.recv(), WS_RECV_TIMEOUT_SECONDS)
+            except WebSocketException as exc:
+                handle_session_error(state, exchange, market, symbol, role, "连接异常", exc)
+                break
+            except TimeoutError as exc:
+                handle_session_error(state, exchange, market, symbol, role, "连接超时", exc)
+                break
+            except OSError as exc:
+                handle_session_error(state, exchange, market, symbol, role, "网络错误", exc)
+                break
+            if isinstance(raw, bytes):
+                raw = raw.decode("utf-8")
+            await asyncio.to_thread(handle_session_message, context, raw)
+    finally:
+        keepalive_task.cancel()
+        await asyncio.to_thread(close_session_context, context)
+        update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="连接关闭")
+        switch_active_role(state, exchange, market, symbol, role)
+        await ws.close()
+
+
+async def run_role_loop_async(exchange: str, market: str, symbol: str, role: str, ws_url: str, state: dict) -> None:
+    """持续维护单个角色的异步WS连接。"""
+    update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="准备连接", recv_count=0)
+    try:
+        while not EXIT_REQUESTED.is_set():
+            await run_session_async(exchange, market, symbol, role, ws_url, state)
+            if EXIT_REQUESTED.is_set():
+                break
+            await asyncio.sleep(WS_RECONNECT_INTERVAL_SECONDS)
+    finally:
+        update_shared_status(state, exchange, market, symbol, role, connected=False, status_text="已停止")
+
+
+async def run_symbol_loop_async(exchange: str, market: str, symbol: str) -> None:
+    """持续维护单个交易对的主备异步WS连接。"""
+    state = build_session_state()
+    primary_url, backup_url = build_ws_urls(exchange, market, symbol)
+    try:
+        await asyncio.gather(
+            run_role_loop_async(exchange, market, symbol, PRIMARY_ROLE, primary_url, state),
+            run_role_loop_async(exchange, market, symbol, BACKUP_ROLE, backup_url, state),
+        )
+    finally:
+        status_update(exchange, market, symbol, None)
+        log(f"{exchange} {market} {symbol} 主备订阅停止", market)
+
+
+async def run_exchange_supervisor_async(exchange: str, market: str) -> None:
+    """按交易所维护全部交易对协程。"""
+    dataset_id = "D10002-4" if market == "future" else "D10006-8"
+    if not is_supported(dataset_id, exchange):
+        symbol_list = get_future_symbols(exchange) if market == "future" else get_spot_symbols(exchange)
+        for symbol in symbol_list:
+            status_update(exchange, market, symbol, "未支持")
+        return
+    workers: dict[str, asyncio.Task] = {}
+    fallback_symbols = get_future_symbols(exchange) if market == "future" else get_spot_symbols(exchange)
+    while not EXIT_REQUESTED.is_set():
+        activate_pending_wss_config_now()
+        try:
+            desired_symbols = await asyncio.to_thread(resolve_symbols, exchange, market)
+        except NetworkRequestError as exc:
+            desired_symbols = fallback_symbols
+            log(f"{exchange} {market} 动态合约刷新失败，继续使用静态列表: {exc}", market)
+        desired_set = set(desired_symbols)
+        for symbol in sorted(desired_set - set(workers)):
+            workers[symbol] = asyncio.create_task(run_symbol_loop_async(exchange, market, symbol), name=f"{exchange}-{market}-{symbol}")
+        for symbol in sorted(set(workers) - desired_set):
+            workers.pop(symbol).cancel()
+        wait_seconds = DELIVERY_REFRESH_SECONDS if market == "future" else max(DELIVERY_REFRESH_SECONDS, 60)
+        await sleep_with_exit_async(wait_seconds)
+    for symbol in sorted(workers):
+        workers.pop(symbol).cancel()
+
+
+async def run_market_ws_async(market: str) -> None:
+    """在单个事件循环内运行全部交易所监督协程。"""
+    await asyncio.gather(*(run_exchange_supervisor_async(exchange, market) for exchange in list_exchanges()))
+
+
+def run_worker_metrics_loop(market: str) -> None:
+    """在子进程内周期上报线程与延迟观测。"""
+    while not EXIT_REQUESTED.wait(WORKER_METRICS_INTERVAL_SECONDS):
+        WORKER_EVENT_QUEUE.put(("metrics", market, {"latency": get_market_latency_snapshot(market), "thread_count": threading.active_count()}))
+
+
+def run_worker_stop_listener(control_queue) -> None:
+    """在子进程内等待主进程的退出通知。"""
+    control_queue.get()
+    EXIT_REQUESTED.set()
+
+
+def run_exchange_worker(exchange: str, market: str, data_storage_mode: str, ws_engine: str, event_queue, control_queue) -> None:
+    """子进程入口，按主进程选择的采集引擎运行单个交易所的采集监督。"""
+    global DATA_STORAGE_MODE, WS_ENGINE, WORKER_EVENT_QUEUE
+    DATA_STORAGE_MODE = data_storage_mode
+    WS_ENGINE = ws_engine
+    WORKER_EVENT_QUEUE = event_queue
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    start_wss_config_watcher()
+    threading.Thread(target=run_worker_stop_listener, args=(control_queue,), daemon=True).start()
+    threading.Thread(target=run_worker_metrics_loop, args=(market,), daemon=True).start()
+    if WS_ENGINE == "asyncio":
+        asyncio.run(run_exchange_supervisor_async(exchange, market))
+    else:
+        run_exchange_supervisor(exchange, market)
+    event_queue.put(("exit",))
+
+
+def pump_worker_events(worker: dict) -> None:
+    """在主进程内消费子进程事件并转发到状态、日志与上传。"""
+    while True:
+        try:
+            event, *payload = worker["event_queue"].get(timeout=WORKER_EVENT_POLL_SECONDS)
+        except queue.Empty:
+            if not worker["process"].is_alive():
+                break
+            continue
+        if event == "status":
+            task_id, key, value = payload
+            if value is None:
+                STATUS_COUNTS[task_id].pop(key, None)
+            else:
+                STATUS_COUNTS[task_id][key] = value
+            STATUS_TIMES[task_id] = time.time()
+        elif event == "log":
+            log(payload[1], payload[0])
+        elif event == "metrics":
+            WORKER_METRICS[worker["name"]] = {"market": payload[0], **payload[1]}
+        elif event == "upload":
+            enqueue_file_for_s3_upload(Path(payload[0]))
+        elif event == "exit":
+            break
+    WORKER_METRICS.pop(worker["name"], None)
+
+
+def start_exchange_worker(exchange: str, market: str) -> dict:
+    """启动单个交易所的采集子进程。"""
+    name = f"ws-{market}-{exchange}"
+    event_queue = PROCESS_CONTEXT.Queue()
+    control_queue = PROCESS_CONTEXT.Queue()
+    process = PROCESS_CONTEXT.Process(
+        target=run_exchange_worker,
+        args=(exchange, market, DATA_STORAGE_MODE, WS_ENGINE, event_queue, control_queue),
+        name=name,
+        daemon=True,
+    )
+    process.start()
+    worker = {"name": name, "process": process, "event_queue": event_queue, "control_queue": control_queue}
+    worker["pump_thread"] = threading.Thread(target=pump_worker_events, args=(worker,), daemon=True)
+    worker["pump_thread"].start()
+    return worker
+
+
+def stop_exchange_worker(worker: dict) -> None:
+    """通知子进程优雅退出，超时后强制结束。"""
+    worker["control_queue"].put("stop")
+    worker["process"].join(timeout=WORKER_STOP_TIMEOUT_SECONDS)
+    if worker["process"].is_alive():
+        worker["process"].terminate()
+        worker["process"].join()
+    worker["pump_thread"].join(timeout=WORKER_STOP_TIMEOUT_SECONDS)
+
+
+def run_exchange_process_supervisor(exchange: str, market: str) -> None:
+    """按交易所维护采集子进程并在异常退出后重启。"""
+    dataset_id = "D10002-4" if market == "future" else "D10006-8"
+    if not is_supported(dataset_id, exchange):
+        run_exchange_supervisor(exchange, market)
+        return
+    worker = None
+    while not EXIT_REQUESTED.is_set():
+        if worker is None or not worker["process"].is_alive():
+            if worker is not None:
+                log(f"{exchange} {market} 采集进程退出，退出码 {worker['process'].exitcode}，准备重启", market)
+                worker["pump_thread"].join(timeout=WORKER_EVENT_POLL_SECONDS)
+            worker = start_exchange_worker(exchange, market)
+        EXIT_REQUESTED.wait(1.0)
+    if worker is not None:
+        stop_exchange_worker(worker)
+
+
+def run_market_processes(market: str) -> None:
+    """按交易所多进程运行指定市场的订单簿WS。"""
+    supervisors = []
+    for exchange in list_exchanges():
+        thread = threading.Thread(target=run_exchange_process_supervisor, args=(exchange, market), daemon=True)
+        supervisors.append(thread)
+        thread.start()
+    for thread in supervisors:
+        thread.join()
+
+
 def build_ws_section_lines(task_id: str, exchange: str) -> list[str]:
     """构造单个交易所的WSS状态行。"""
     bucket = STATUS_COUNTS.get(task_id, {})
@@ -1544,6 +2247,21 @@ def build_ws_section_lines(task_id: str, exchange: str) -> list[str]:
     return lines
 
 
+def build_overload_text() -> str:
+    """构造各交易对过载降级档位汇总文本。"""
+    if not OVERLOAD_ENABLED:
+        return "过载降级: 关闭"
+    level_counts = [0] * len(OVERLOAD_STEPS)
+    for bucket in STATUS_COUNTS.values():
+        for value in list(bucket.values()):
+            if isinstance(value, tuple) and len(value) >= 3 and 0 < int(value[2]) <= len(level_counts):
+                level_counts[int(value[2]) - 1] += 1
+    levels_text = " | ".join(
+        f"L{index + 1} {OVERLOAD_ACTION_LABELS[step['action']]} {count}" for index, (step, count) in enumerate(zip(OVERLOAD_STEPS, level_counts))
+    )
+    return f"过载降级: {levels_text or '-'}"
+
+
 def build_runtime_observe_text() -> str:
     """构造运行时观测文本。"""
     now_ts = time.time()
@@ -1559,7 +2277,19 @@ def build_runtime_observe_text() -> str:
         f" | 待上传 {upload_snapshot['pending_count']}"
         f" | 速度 {format_speed_text(upload_snapshot['speed_bytes_per_second'])}"
     )
-    text = f"内存: {rss_text} | 峰值: {peak_text} | {upload_text}"
+    future_latency = merge_worker_latency("future")
+    spot_latency = merge_worker_latency("spot")
+    worker_metrics = list(WORKER_METRICS.values())
+    thread_count = threading.active_count() + sum(int(metrics["thread_count"]) for metrics in worker_metrics)
+    engine_text = (
+        f"引擎 {WS_ENGINE}"
+        f" | 进程 {1 + len(worker_metrics)}"
+        f" | 线程 {thread_count}"
+        f" | CPU {read_process_cpu_percent():.1f}%"
+        f" | 延迟 future {future_latency['ewma_ms']:.0f}/{future_latency['max_ms']}ms"
+        f" spot {spot_latency['ewma_ms']:.0f}/{spot_latency['max_ms']}ms"
+    )
+    text = f"内存: {rss_text} | 峰值: {peak_text} | {engine_text} | {upload_text}"
     RUNTIME_OBSERVE_CACHE["ts"] = now_ts
     RUNTIME_OBSERVE_CACHE["text"] = text
     return text
@@ -1616,6 +2346,7 @@ def build_summary_lines() -> list[str]:
     lines.append("")
     lines.append(f"==== DLH WSS 状态摘要 | 存储: {DATA_STORAGE_MODE} | {time.strftime('%Y-%m-%d %H:%M:%S')} ====")
     lines.append(build_runtime_observe_text())
+    lines.append(build_overload_text())
     lines.append("期货 WSS")
     for exchange in list_exchanges():
         if not is_supported("D10002-4", exchange):
@@ -1664,8 +2395,10 @@ def build_tasks() -> list[Task]:
 def main() -> None:
     """启动单文件WSS程序。"""
     apply_storage_mode_from_argv()
+    apply_ws_engine_from_argv()
     install_exception_hooks()
     signal.signal(signal.SIGINT, handle_sigint)
+    start_wss_config_watcher()
     if has_remove_flag():
         write_console_line("DLH WSS | 清理本地数据")
         clear_local_data(DATA_ROOT)